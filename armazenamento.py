@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+
+from database import get_connection
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_HASH = 16
+TAMANHO_BLOCO = 64 * 1024
+CARENCIA_PADRAO = 3600  # segundos: arquivos mais novos que isso nunca são coletados
+PROTEGIDOS = {'default.jpg'}
+
+# <hash>.<ext> é o arquivo base; <hash>_<variante>.webp pertence ao <hash>.webp
+_NOME_CONTEUDO = re.compile(r'^(?P<hash>[0-9a-f]{%d})(?:_(?P<variante>[a-z]+))?\.(?P<ext>webp|jpg|png|gif)$'
+                            % TAMANHO_HASH)
+
+
+def gravar_temporario(fluxo, pasta, inicio=b''):
+    """Copia o fluxo para um temporário na pasta calculando o hash no caminho; retorna (caminho, hash)"""
+    descritor, temporario = tempfile.mkstemp(dir=pasta, prefix='.envio-')
+    resumo = hashlib.sha256(inicio)
+    try:
+        with os.fdopen(descritor, 'wb') as destino:
+            destino.write(inicio)
+            for bloco in iter(lambda: fluxo.read(TAMANHO_BLOCO), b''):
+                resumo.update(bloco)
+                destino.write(bloco)
+    except BaseException:
+        os.remove(temporario)
+        raise
+    return temporario, resumo.hexdigest()[:TAMANHO_HASH]
+
+
+def nome_base(arquivo):
+    """Arquivo base a que um arquivo da pasta pertence (variantes apontam para o original)"""
+    encontrado = _NOME_CONTEUDO.match(arquivo)
+    if encontrado and encontrado.group('variante'):
+        return f"{encontrado.group('hash')}.webp"
+    return arquivo
+
+
+class ArmazemUploads:
+    """Pasta de uploads endereçada por conteúdo, com contagem de referências pelo banco.
+
+    O banco é a fonte da verdade: um arquivo é referenciado por pontos_turisticos.imagem
+    ou usuarios.foto_perfil ('uploads/<arquivo>'). Arquivos sem referência são removidos
+    só depois da carência, para não apagar um envio cujo registro ainda não foi gravado.
+    variantes são os sufixos dos arquivos <hash>_<variante>.webp gerados para cada envio.
+    """
+
+    def __init__(self, pasta, carencia=CARENCIA_PADRAO, variantes=()):
+        self.pasta = pasta
+        self.carencia = carencia
+        self.variantes = tuple(variantes)
+
+    def referencias(self):
+        """Contagem de referências por arquivo base"""
+        conn = get_connection()
+        rows = conn.execute('''
+            SELECT imagem, COUNT(*) FROM pontos_turisticos WHERE imagem IS NOT NULL GROUP BY imagem
+            UNION ALL
+            SELECT substr(foto_perfil, 9), COUNT(*) FROM usuarios
+            WHERE foto_perfil LIKE 'uploads/%' GROUP BY foto_perfil
+        ''').fetchall()
+        conn.close()
+        contagem = Counter()
+        for arquivo, quantidade in rows:
+            contagem[arquivo] += quantidade
+        return contagem
+
+    def contar_referencias(self, arquivo):
+        conn = get_connection()
+        quantidade = conn.execute('''
+            SELECT (SELECT COUNT(*) FROM pontos_turisticos WHERE imagem = ?)
+                 + (SELECT COUNT(*) FROM usuarios WHERE foto_perfil = ?)
+        ''', (arquivo, f'uploads/{arquivo}')).fetchone()[0]
+        conn.close()
+        return quantidade
+
+    def tocar(self, arquivo):
+        """Renova a carência de um arquivo reaproveitado por um novo envio"""
+        os.utime(os.path.join(self.pasta, arquivo))
+
+    def _arquivos(self):
+        """Agrupa os arquivos da pasta por arquivo base: {base: [(nome, tamanho, mtime)]}"""
+        grupos = {}
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file():
+                    continue
+                info = entrada.stat()
+                grupos.setdefault(nome_base(entrada.name), []).append((entrada.name, info.st_size, info.st_mtime))
+        return grupos
+
+    def _grupo(self, arquivo):
+        """Arquivo base e variantes existentes, sem listar a pasta: [(nome, tamanho, mtime)]"""
+        nomes = [arquivo]
+        encontrado = _NOME_CONTEUDO.match(arquivo)
+        if encontrado and not encontrado.group('variante') and encontrado.group('ext') == 'webp':
+            nomes += [f"{encontrado.group('hash')}_{variante}.webp" for variante in self.variantes]
+        grupo = []
+        for nome in nomes:
+            try:
+                info = os.stat(os.path.join(self.pasta, nome))
+            except FileNotFoundError:
+                continue
+            grupo.append((nome, info.st_size, info.st_mtime))
+        return grupo
+
+    def _remover(self, arquivos, limite, simular):
+        """Remove os arquivos do grupo se todos forem mais antigos que o limite; retorna bytes liberados"""
+        if any(mtime > limite for _, _, mtime in arquivos):
+            return None
+        liberados = 0
+        for nome, tamanho, _ in arquivos:
+            if not simular:
+                try:
+                    os.remove(os.path.join(self.pasta, nome))
+                except FileNotFoundError:
+                    continue
+                except OSError:
+                    logger.exception("Falha ao remover o upload %s", nome)
+                    continue
+            liberados += tamanho
+        return liberados
+
+    def liberar(self, arquivo):
+        """Remove um arquivo (e variantes) que ficou sem referências; retorna bytes liberados.
+
+        Só confere os nomes esperados; sobras de outras configurações ficam para coletar().
+        """
+        if not arquivo or arquivo in PROTEGIDOS or os.sep in arquivo or self.contar_referencias(arquivo):
+            return 0
+        return self._remover(self._grupo(arquivo), time.time() - self.carencia, simular=False) or 0
+
+    def coletar(self, simular=False):
+        """Remove arquivos órfãos e temporários abandonados mais antigos que a carência"""
+        limite = time.time() - self.carencia
+        referencias = self.referencias()
+        relatorio = {'arquivos': 0, 'referenciados': 0, 'removidos': 0, 'em_carencia': 0,
+                     'bytes_liberados': 0, 'simulacao': simular}
+        for base, arquivos in self._arquivos().items():
+            relatorio['arquivos'] += len(arquivos)
+            if base in PROTEGIDOS or referencias.get(base):
+                relatorio['referenciados'] += len(arquivos)
+                continue
+            liberados = self._remover(arquivos, limite, simular)
+            if liberados is None:
+                relatorio['em_carencia'] += len(arquivos)
+            else:
+                relatorio['removidos'] += len(arquivos)
+                relatorio['bytes_liberados'] += liberados
+        return relatorio
+
+    def uso(self):
+        """Espaço ocupado e quantas referências compartilham o mesmo conteúdo"""
+        referencias = self.referencias()
+        grupos = self._arquivos()
+        return {
+            'arquivos': sum(len(arquivos) for arquivos in grupos.values()),
+            'bytes': sum(tamanho for arquivos in grupos.values() for _, tamanho, _ in arquivos),
+            'referencias': sum(referencias.values()),
+            'referencias_deduplicadas': sum(quantidade - 1 for quantidade in referencias.values() if quantidade > 1)
+        }
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class CacheLRU:
+    """Cache em memória com expiração (TTL), descarte LRU e invalidação por tags.
+
+    Cada item pode declarar tags das quais depende (ex.: 'catalogo', 'avaliacoes');
+    invalidar uma tag remove só os itens que dependem dela.
+    """
+
+    def __init__(self, max_itens=128, ttl=60):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()  # chave -> (expira_em, valor, tags)
+        self._chaves_por_tag = defaultdict(set)
+        # Versão de cada tag: um valor calculado antes de uma invalidação não é gravado
+        self._versoes = defaultdict(int)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, chave, default=None):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self._misses += 1
+                return default
+            if item[0] < time.monotonic():
+                self._remover(chave)
+                self._misses += 1
+                return default
+            self._itens.move_to_end(chave)
+            self._hits += 1
+            return item[1]
+
+    def set(self, chave, valor, ttl=None, tags=(), versoes=None):
+        with self._lock:
+            if versoes is not None and any(self._versoes[tag] != versao for tag, versao in versoes.items()):
+                return False
+            self._remover(chave)
+            expira_em = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._itens[chave] = (expira_em, valor, tuple(tags))
+            for tag in tags:
+                self._chaves_por_tag[tag].add(chave)
+            while len(self._itens) > self.max_itens:
+                mais_antiga = next(iter(self._itens))
+                self._remover(mais_antiga)
+                self._evictions += 1
+            return True
+
+    def get_or_set(self, chave, fabrica, ttl=None, tags=()):
+        """Retorna o valor em cache ou calcula com fabrica() e armazena"""
+        ausente = object()
+        valor = self.get(chave, ausente)
+        if valor is not ausente:
+            return valor
+        with self._lock:
+            versoes = {tag: self._versoes[tag] for tag in tags}
+        valor = fabrica()
+        self.set(chave, valor, ttl=ttl, tags=tags, versoes=versoes)
+        return valor
+
+    def invalidar(self, *tags):
+        """Remove todos os itens que dependem de alguma das tags"""
+        with self._lock:
+            for tag in tags:
+                self._versoes[tag] += 1
+                for chave in list(self._chaves_por_tag.pop(tag, ())):
+                    self._remover(chave)
+                    self._invalidations += 1
+
+    def remover(self, chave):
+        with self._lock:
+            self._remover(chave)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._chaves_por_tag.clear()
+            for tag in list(self._versoes):
+                self._versoes[tag] += 1
+
+    def _remover(self, chave):
+        item = self._itens.pop(chave, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            chaves = self._chaves_por_tag.get(tag)
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._chaves_por_tag[tag]
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'size': len(self._itens),
+                'max_size': self.max_itens,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / total, 4) if total else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations
+            }
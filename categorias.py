@@ -0,0 +1,146 @@
+import random
+import re
+import time
+import unicodedata
+
+from texto import normalize_text
+
+DEFAULT_FILTER_CATEGORY = 'Cultura/Entretenimento'
+CATEGORIA_FILTRO_EXATA = {
+    'monumento': 'Religioso/Histórico',
+    'religioso': 'Religioso/Histórico',
+    'religioso historico': 'Religioso/Histórico',
+    'religioso histórico': 'Religioso/Histórico',
+    'historico': 'Religioso/Histórico',
+    'histórico': 'Religioso/Histórico',
+    'patrimonio': 'Religioso/Histórico',
+    'patrimônio': 'Religioso/Histórico',
+    'paisagem': 'Natureza/Panorâmico',
+    'paisagismo': 'Natureza/Panorâmico',
+    'paisagistico': 'Natureza/Panorâmico',
+    'parque': 'Natureza/Panorâmico',
+    'jardim botanico': 'Natureza/Panorâmico',
+    'jardim botânico': 'Natureza/Panorâmico',
+    'zoologico': 'Natureza/Panorâmico',
+    'zoológico': 'Natureza/Panorâmico',
+    'aquario': 'Natureza/Panorâmico',
+    'aquário': 'Natureza/Panorâmico',
+    'praia': 'Praia/Recreação',
+    'praia/recreacao': 'Praia/Recreação',
+    'praia/recreação': 'Praia/Recreação',
+    'balneario': 'Praia/Recreação',
+    'balneário': 'Praia/Recreação',
+    'parque tematico': 'Cultura/Entretenimento',
+    'parque temático': 'Cultura/Entretenimento',
+    'centro cultural': 'Cultura/Entretenimento',
+    'museu': 'Cultura/Entretenimento'
+}
+FILTER_CATEGORY_KEYWORDS = [
+    ('Religioso/Histórico', ['religios', 'igreja', 'santu', 'convento', 'mosteir', 'basil', 'monumento', 'monument', 'histor', 'patrimon', 'forte', 'castel', 'martir', 'catedral']),
+    ('Natureza/Panorâmico', ['parque', 'trilha', 'cachoeira', 'montanha', 'morro', 'morros', 'paisagem', 'panoram', 'mirante', 'reserva natural', 'floresta', 'serra', 'vale', 'bondinho', 'tirolesa', 'natureza', 'jardim', 'botanic', 'zoo', 'ecologic', 'ecotur', 'fauna', 'flora', 'viveiro', 'observatorio', 'planetario', 'aquar', 'museu de ciencias', 'ciência']),
+    ('Praia/Recreação', ['praia', 'mar', 'ilha', 'balne', 'recrea', 'lazer', 'orla', 'surf', 'banho de mar', 'areia']),
+    ('Cultura/Entretenimento', ['museu', 'arte', 'cultura', 'teatro', 'memorial', 'centro cultural', 'entretenimento', 'evento', 'galeria', 'cinem', 'show', 'exposi', 'historia da arte'])
+]
+
+
+def compilar_palavras_chave(grupos=None):
+    """Uma regex por grupo, na ordem de prioridade: cada grupo é testado numa única passada"""
+    return [
+        (filtro, re.compile('|'.join(re.escape(keyword) for keyword in keywords)))
+        for filtro, keywords in (grupos or FILTER_CATEGORY_KEYWORDS)
+    ]
+
+
+# Recompilar (ou chamar compilar_palavras_chave de novo) se FILTER_CATEGORY_KEYWORDS mudar
+_PALAVRAS_CHAVE_COMPILADAS = compilar_palavras_chave()
+
+
+def map_categoria_para_filtro(categoria, nome='', descricao=''):
+    partes = [parte for parte in [categoria, nome, descricao] if parte]
+    if not partes:
+        return DEFAULT_FILTER_CATEGORY
+    categoria_normalizada = normalize_text(categoria)
+    if categoria_normalizada in CATEGORIA_FILTRO_EXATA:
+        return CATEGORIA_FILTRO_EXATA[categoria_normalizada]
+    # A normalização é caractere a caractere, então normalizar as partes e juntar dá o mesmo texto
+    normalized = ' '.join(normalize_text(parte) for parte in partes)
+    for filtro, padrao in _PALAVRAS_CHAVE_COMPILADAS:
+        if padrao.search(normalized):
+            return filtro
+    return DEFAULT_FILTER_CATEGORY
+
+
+def _normalizar_por_caractere(value):
+    if not value:
+        return ''
+    normalized = unicodedata.normalize('NFD', value)
+    return ''.join(ch for ch in normalized if unicodedata.category(ch) != 'Mn').lower()
+
+
+def _classificar_por_laco(categoria, nome='', descricao=''):
+    """Implementação anterior (substring a substring, sem memoização), referência do benchmark"""
+    texto_referencia = ' '.join([parte for parte in [categoria, nome, descricao] if parte])
+    if not texto_referencia:
+        return DEFAULT_FILTER_CATEGORY
+    categoria_normalizada = _normalizar_por_caractere(categoria)
+    if categoria_normalizada in CATEGORIA_FILTRO_EXATA:
+        return CATEGORIA_FILTRO_EXATA[categoria_normalizada]
+    normalized = _normalizar_por_caractere(texto_referencia)
+    for filtro, keywords in FILTER_CATEGORY_KEYWORDS:
+        for keyword in keywords:
+            if keyword in normalized:
+                return filtro
+    return DEFAULT_FILTER_CATEGORY
+
+
+def _catalogo_sintetico(quantidade, semente):
+    gerador = random.Random(semente)
+    palavras = ('área', 'visitação', 'história', 'família', 'região', 'cidade', 'centro', 'antigo',
+                'passeio', 'vista', 'rua', 'bairro', 'clássico', 'turístico', 'famoso', 'conhecido')
+    palavras_chave = [keyword for _, keywords in FILTER_CATEGORY_KEYWORDS for keyword in keywords]
+    categorias = list(CATEGORIA_FILTRO_EXATA) + ['Gastronomia', 'Compras', 'Natureza/Educativo', '']
+    catalogo = []
+    for indice in range(quantidade):
+        descricao = [gerador.choice(palavras) for _ in range(gerador.randint(10, 60))]
+        if gerador.random() < 0.7:
+            descricao.insert(gerador.randrange(len(descricao)), gerador.choice(palavras_chave))
+        catalogo.append((
+            gerador.choice(categorias).title(),
+            f'Ponto {indice} {gerador.choice(palavras).title()}',
+            ' '.join(descricao).capitalize() + '.'
+        ))
+    return catalogo
+
+
+def comparar_classificadores(quantidade=20000, semente=7):
+    """Micro-benchmark: laço de substrings x regex compilada num catálogo sintético"""
+    catalogo = _catalogo_sintetico(quantidade, semente)
+
+    inicio = time.perf_counter()
+    esperado = [_classificar_por_laco(*ponto) for ponto in catalogo]
+    tempo_laco = time.perf_counter() - inicio
+
+    normalize_text.cache_clear()
+    inicio = time.perf_counter()
+    obtido = [map_categoria_para_filtro(*ponto) for ponto in catalogo]
+    tempo_compilado = time.perf_counter() - inicio
+
+    return {
+        'pontos': quantidade,
+        'divergencias': sum(1 for a, b in zip(esperado, obtido) if a != b),
+        'laco_ms': round(tempo_laco * 1000, 1),
+        'compilado_ms': round(tempo_compilado * 1000, 1),
+        'aceleracao': round(tempo_laco / tempo_compilado, 2) if tempo_compilado else None
+    }
+
+
+def reclassificar_pontos(cursor):
+    """Recalcula categoria_filtro de todos os pontos; retorna quantos mudaram"""
+    cursor.execute('SELECT id, categoria, nome, descricao, categoria_filtro FROM pontos_turisticos')
+    alterados = []
+    for ponto_id, categoria, nome, descricao, atual in cursor.fetchall():
+        nova = map_categoria_para_filtro(categoria, nome, descricao)
+        if nova != atual:
+            alterados.append((nova, ponto_id))
+    cursor.executemany('UPDATE pontos_turisticos SET categoria_filtro = ? WHERE id = ?', alterados)
+    return len(alterados)
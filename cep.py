@@ -0,0 +1,401 @@
+import http.client
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib import request as urlrequest
+
+from cache import CacheLRU
+from database import get_connection, write_transaction
+
+logger = logging.getLogger(__name__)
+
+VIACEP_URL = 'https://viacep.com.br/ws/{cep}/json/'
+
+# Validade dos registros: endereços mudam raramente; CEPs inexistentes são revistos antes
+CEP_TTL = 30 * 24 * 3600
+CEP_TTL_NEGATIVO = 24 * 3600
+# Após expirar, o registro ainda é servido por este período enquanto é atualizado em segundo plano
+CEP_JANELA_OBSOLETA = 7 * 24 * 3600
+
+
+class CEPNaoEncontrado(ValueError):
+    """Erro definitivo para o CEP (inexistente ou incompleto); pode ficar em cache"""
+
+
+class CircuitoAberto(ValueError):
+    """O ViaCEP falhou repetidamente e as consultas estão suspensas"""
+
+
+class DisjuntorCircuito:
+    """Circuit breaker: abre após falhas seguidas e libera uma tentativa após o tempo de recuperação"""
+
+    def __init__(self, limite_falhas=5, tempo_recuperacao=30):
+        self.limite_falhas = limite_falhas
+        self.tempo_recuperacao = tempo_recuperacao
+        self._lock = threading.Lock()
+        self._falhas = 0
+        self._aberto_em = None
+        self._testando = False
+        self._aberturas = 0
+        self._rejeicoes = 0
+
+    @property
+    def estado(self):
+        if self._aberto_em is None:
+            return 'fechado'
+        if time.monotonic() - self._aberto_em >= self.tempo_recuperacao:
+            return 'meio_aberto'
+        return 'aberto'
+
+    def permitir(self):
+        """Indica se uma chamada pode seguir; no estado meio aberto só uma por vez"""
+        with self._lock:
+            estado = self.estado
+            if estado == 'fechado':
+                return True
+            if estado == 'meio_aberto' and not self._testando:
+                self._testando = True
+                return True
+            self._rejeicoes += 1
+            return False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._aberto_em = None
+            self._testando = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._testando or self._falhas >= self.limite_falhas:
+                if self._aberto_em is None or self._testando:
+                    self._aberturas += 1
+                self._aberto_em = time.monotonic()
+            self._testando = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.estado,
+                'consecutive_failures': self._falhas,
+                'opened': self._aberturas,
+                'rejected': self._rejeicoes
+            }
+
+
+def sanitize_cep(cep):
+    if not cep:
+        return ''
+    return re.sub(r'\D', '', cep)
+
+
+def fetch_address_by_cep(cep, url=VIACEP_URL, timeout=5):
+    """Consulta o ViaCEP diretamente, sem cache"""
+    cep_digits = sanitize_cep(cep)
+    if len(cep_digits) != 8:
+        raise ValueError("CEP inválido. Informe 8 dígitos.")
+
+    try:
+        with urlrequest.urlopen(url.format(cep=cep_digits), timeout=timeout) as response:
+            if response.status != 200:
+                raise ValueError("Erro ao consultar o CEP informado.")
+            raw_data = response.read().decode('utf-8')
+    except (OSError, http.client.HTTPException):
+        # URLError e TimeoutError são OSError; conexão derrubada no meio da resposta
+        # (RemoteDisconnected, IncompleteRead, ConnectionResetError) também cai aqui
+        raise ValueError("Não foi possível consultar o CEP. Tente novamente.")
+
+    try:
+        data = json.loads(raw_data)
+    except json.JSONDecodeError:
+        raise ValueError("Resposta inválida da consulta de CEP.")
+    if data.get('erro'):
+        raise CEPNaoEncontrado("CEP não encontrado.")
+
+    logradouro = data.get('logradouro', '').strip()
+    bairro = data.get('bairro', '').strip()
+    localidade = data.get('localidade', '').strip()
+    uf = data.get('uf', '').strip()
+
+    if not localidade or not uf:
+        raise CEPNaoEncontrado("Endereço incompleto para o CEP informado.")
+
+    partes = [logradouro, bairro]
+    partes = [parte for parte in partes if parte]
+    endereco_formatado = ', '.join(partes) if partes else ''
+    cidade_estado = f"{localidade} - {uf}"
+
+    if endereco_formatado:
+        endereco_formatado = f"{endereco_formatado}, {cidade_estado}"
+    else:
+        endereco_formatado = cidade_estado
+
+    return {
+        'endereco': endereco_formatado,
+        'uf': uf
+    }
+
+
+class CacheCEP:
+    """Cache de CEPs em duas camadas: memória (LRU) na frente da tabela cep_cache.
+
+    Guarda também respostas negativas ("CEP não encontrado") e, depois de
+    expirado, continua servindo o registro antigo enquanto o atualiza em
+    segundo plano (stale-while-revalidate).
+    """
+
+    def __init__(self, url=VIACEP_URL, ttl=CEP_TTL, ttl_negativo=CEP_TTL_NEGATIVO,
+                 janela_obsoleta=CEP_JANELA_OBSOLETA, timeout=5, max_itens_memoria=4096,
+                 disjuntor=None):
+        self.url = url
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.janela_obsoleta = janela_obsoleta
+        self.timeout = timeout
+        self.disjuntor = disjuntor or DisjuntorCircuito()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cep-revalidacao')
+        # A validade é conferida pelo próprio registro; o TTL da memória só limita a retenção
+        self._memoria = CacheLRU(max_itens=max_itens_memoria, ttl=ttl + janela_obsoleta)
+        self._lock = threading.Lock()
+        self._atualizando = set()
+        self._contadores = {
+            'hits': 0,
+            'negative_hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'upstream_requests': 0,
+            'upstream_errors': 0,
+            'circuit_rejections': 0
+        }
+
+    def _contar(self, chave):
+        with self._lock:
+            self._contadores[chave] += 1
+
+    def consultar(self, cep):
+        """Endereço do CEP ({'endereco', 'uf'}); levanta ValueError como fetch_address_by_cep"""
+        cep_digits = sanitize_cep(cep)
+        if len(cep_digits) != 8:
+            raise ValueError("CEP inválido. Informe 8 dígitos.")
+
+        registro = self._ler(cep_digits)
+        agora = time.time()
+        if registro is not None:
+            idade = agora - registro['atualizado_em']
+            validade = self.ttl_negativo if registro['erro'] else self.ttl
+            if idade <= validade:
+                self._contar('negative_hits' if registro['erro'] else 'hits')
+                return self._resultado(registro)
+            if idade <= validade + self.janela_obsoleta:
+                self._contar('stale_hits')
+                self._atualizar_em_segundo_plano(cep_digits)
+                return self._resultado(registro)
+
+        self._contar('misses')
+        try:
+            return self._resultado(self._buscar_e_gravar(cep_digits))
+        except CEPNaoEncontrado:
+            raise
+        except ValueError:
+            # ViaCEP indisponível: um registro antigo ainda é melhor que nada
+            if registro is not None and not registro['erro']:
+                return self._resultado(registro)
+            raise
+
+    def pre_aquecer(self, ceps, forcar=False):
+        """Carrega uma lista de CEPs no cache; retorna quantos foram consultados, ignorados e falharam"""
+        resumo = {'consultados': 0, 'ignorados': 0, 'falhas': 0}
+        for cep in ceps:
+            cep_digits = sanitize_cep(cep)
+            if len(cep_digits) != 8:
+                resumo['falhas'] += 1
+                continue
+            registro = self._ler(cep_digits)
+            if not forcar and registro is not None and time.time() - registro['atualizado_em'] <= self.ttl:
+                resumo['ignorados'] += 1
+                continue
+            try:
+                self._buscar_e_gravar(cep_digits)
+                resumo['consultados'] += 1
+            except CEPNaoEncontrado:
+                resumo['consultados'] += 1
+            except ValueError:
+                resumo['falhas'] += 1
+        return resumo
+
+    def stats(self):
+        with self._lock:
+            contadores = dict(self._contadores)
+        atendidos = contadores['hits'] + contadores['negative_hits'] + contadores['stale_hits']
+        total = atendidos + contadores['misses']
+        contadores['hit_ratio'] = round(atendidos / total, 4) if total else 0.0
+        contadores['memory'] = self._memoria.stats()
+        contadores['circuit'] = self.disjuntor.stats()
+        return contadores
+
+    def _resultado(self, registro):
+        if registro['erro']:
+            raise CEPNaoEncontrado(registro['erro'])
+        return {'endereco': registro['endereco'], 'uf': registro['uf']}
+
+    def _ler(self, cep_digits):
+        registro = self._memoria.get(cep_digits)
+        if registro is not None:
+            return registro
+
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT endereco, uf, erro, atualizado_em FROM cep_cache WHERE cep = ?', (cep_digits,))
+        row = cursor.fetchone()
+        conn.close()
+        if row is None:
+            return None
+
+        registro = {'endereco': row[0], 'uf': row[1], 'erro': row[2], 'atualizado_em': row[3]}
+        self._memoria.set(cep_digits, registro)
+        return registro
+
+    def _buscar_e_gravar(self, cep_digits):
+        if not self.disjuntor.permitir():
+            self._contar('circuit_rejections')
+            raise CircuitoAberto("Consulta de CEP temporariamente indisponível.")
+
+        self._contar('upstream_requests')
+        try:
+            dados = fetch_address_by_cep(cep_digits, url=self.url, timeout=self.timeout)
+            registro = {'endereco': dados['endereco'], 'uf': dados['uf'], 'erro': None}
+        except CEPNaoEncontrado as exc:
+            registro = {'endereco': None, 'uf': None, 'erro': str(exc)}
+        except Exception:
+            # Qualquer erro conta como falha: sem isso, uma sondagem no estado meio aberto
+            # deixaria o disjuntor esperando um resultado para sempre
+            self._contar('upstream_errors')
+            self.disjuntor.registrar_falha()
+            raise
+        self.disjuntor.registrar_sucesso()
+        registro['atualizado_em'] = time.time()
+
+        with write_transaction() as conn:
+            conn.execute('''
+                INSERT INTO cep_cache (cep, endereco, uf, erro, atualizado_em)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(cep) DO UPDATE SET
+                    endereco = excluded.endereco,
+                    uf = excluded.uf,
+                    erro = excluded.erro,
+                    atualizado_em = excluded.atualizado_em
+            ''', (cep_digits, registro['endereco'], registro['uf'], registro['erro'], registro['atualizado_em']))
+        self._memoria.set(cep_digits, registro)
+        return registro
+
+    def _atualizar_em_segundo_plano(self, cep_digits):
+        with self._lock:
+            if cep_digits in self._atualizando:
+                return
+            self._atualizando.add(cep_digits)
+
+        def atualizar():
+            try:
+                self._buscar_e_gravar(cep_digits)
+            except ValueError:
+                pass  # Continua servindo o registro antigo até a próxima tentativa
+            finally:
+                with self._lock:
+                    self._atualizando.discard(cep_digits)
+
+        self._executor.submit(atualizar)
+
+    def encerrar(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class ResolvedorEnderecos:
+    """Resolve o CEP informado no login e grava o endereço do usuário fora da requisição.
+
+    A concorrência é limitada pelo número de workers e a fila por max_pendentes;
+    acima disso novos pedidos são descartados (o endereço anterior continua valendo).
+    """
+
+    def __init__(self, cache_cep, max_workers=4, max_pendentes=100, tentativas=3,
+                 espera_inicial=0.5, ao_atualizar=None):
+        self.cache_cep = cache_cep
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+        self.ao_atualizar = ao_atualizar
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cep-login')
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self._lock = threading.Lock()
+        self._contadores = {
+            'scheduled': 0,
+            'completed': 0,
+            'failed': 0,
+            'retries': 0,
+            'dropped': 0,
+            'pending': 0
+        }
+
+    def _contar(self, chave, delta=1):
+        with self._lock:
+            self._contadores[chave] += delta
+
+    def agendar(self, usuario_id, cep):
+        """Enfileira a atualização; retorna False se a fila estiver cheia"""
+        if not self._vagas.acquire(blocking=False):
+            self._contar('dropped')
+            return False
+        self._contar('scheduled')
+        self._contar('pending')
+        try:
+            self._executor.submit(self._executar, usuario_id, cep)
+        except RuntimeError:
+            # Executor já encerrado
+            self._vagas.release()
+            self._contar('pending', -1)
+            self._contar('dropped')
+            return False
+        return True
+
+    def _executar(self, usuario_id, cep):
+        try:
+            endereco_info = self._resolver(cep)
+            if endereco_info is None:
+                self._contar('failed')
+                return
+            with write_transaction() as conn:
+                conn.execute('UPDATE usuarios SET endereco = ? WHERE id = ?',
+                             (endereco_info['endereco'], usuario_id))
+            if self.ao_atualizar is not None:
+                self.ao_atualizar(usuario_id)
+            self._contar('completed')
+        except Exception:
+            logger.exception("Falha ao atualizar o endereço do usuário %s", usuario_id)
+            self._contar('failed')
+        finally:
+            self._contar('pending', -1)
+            self._vagas.release()
+
+    def _resolver(self, cep):
+        espera = self.espera_inicial
+        for tentativa in range(self.tentativas):
+            try:
+                return self.cache_cep.consultar(cep)
+            except (CEPNaoEncontrado, CircuitoAberto):
+                return None
+            except ValueError:
+                if tentativa + 1 == self.tentativas:
+                    return None
+                self._contar('retries')
+                time.sleep(espera)
+                espera *= 2
+        return None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._contadores)
+
+    def encerrar(self, wait=True):
+        self._executor.shutdown(wait=wait)
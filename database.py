@@ -1,11 +1,368 @@
 import sqlite3
 import os
-import hashlib
+import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-def init_database():
+from flask import g, has_app_context
+
+from texto import normalize_text
+from categorias import map_categoria_para_filtro, reclassificar_pontos
+from senhas import gerar_hash, precisa_rehash, verificar_senha
+
+DATABASE_PATH = 'turismo.db'
+
+# Configuração padrão do pool de conexões (pode ser sobrescrita via app.config)
+POOL_MAX_SIZE = 8
+POOL_TIMEOUT = 10  # segundos aguardando uma conexão livre
+CACHED_STATEMENTS = 256  # statements preparados mantidos por conexão
+
+# Pragmas de desempenho. journal_mode é persistido no arquivo e aplicado em
+# init_database(); os demais valem por conexão e são aplicados ao conectar.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # seguro com WAL: só a última transação pode se perder numa queda de energia
+    'cache_size': -16000,  # valores negativos são KiB (~16 MB por conexão)
+    'mmap_size': 128 * 1024 * 1024,
+    'busy_timeout': 5000,  # ms
+    'temp_store': 'MEMORY'
+}
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_LEVELS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+TEMP_STORES = {'DEFAULT', 'FILE', 'MEMORY'}
+
+
+def normalize_pragmas(pragmas=None):
+    """Combina os pragmas informados com os padrões, validando os valores"""
+    resultado = dict(DEFAULT_PRAGMAS)
+    resultado.update({chave: valor for chave, valor in (pragmas or {}).items() if valor is not None})
+
+    for chave, permitidos in (('journal_mode', JOURNAL_MODES), ('synchronous', SYNCHRONOUS_LEVELS),
+                              ('temp_store', TEMP_STORES)):
+        resultado[chave] = str(resultado[chave]).upper()
+        if resultado[chave] not in permitidos:
+            raise ValueError(f"Valor inválido para PRAGMA {chave}: {resultado[chave]}")
+    for chave in ('cache_size', 'mmap_size', 'busy_timeout'):
+        resultado[chave] = int(resultado[chave])
+    return resultado
+
+
+def apply_connection_pragmas(conn, pragmas):
+    """Aplica os pragmas que valem por conexão"""
+    conn.execute(f"PRAGMA synchronous = {pragmas['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {pragmas['cache_size']}")
+    conn.execute(f"PRAGMA mmap_size = {pragmas['mmap_size']}")
+    conn.execute(f"PRAGMA busy_timeout = {pragmas['busy_timeout']}")
+    conn.execute(f"PRAGMA temp_store = {pragmas['temp_store']}")
+
+
+class PooledConnection:
+    """Conexão emprestada do pool; close() devolve a conexão em vez de fechá-la"""
+
+    def __init__(self, pool, conn, bound=False):
+        self._pool = pool
+        self._conn = conn
+        # Conexões vinculadas ao contexto da aplicação só voltam ao pool no teardown
+        self._bound = bound
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Conexão já devolvida ao pool.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._bound:
+            # Mesmo efeito de fechar: descarta o que não foi confirmado
+            if self._conn.in_transaction:
+                self._conn.rollback()
+            return
+        self.release()
+
+    def release(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """Pool de conexões SQLite reaproveitadas entre requisições e threads"""
+
+    def __init__(self, path=DATABASE_PATH, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT,
+                 cached_statements=CACHED_STATEMENTS, pragmas=None):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = normalize_pragmas(pragmas)
+        self._idle = []  # LIFO: a conexão usada por último tem o cache de páginas mais quente
+        self._size = 0
+        self._cond = threading.Condition()
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        apply_connection_pragmas(conn, self.pragmas)
+        return conn
+
+    def acquire(self, bound=False):
+        """Empresta uma conexão, criando uma nova enquanto o pool não estiver cheio"""
+        inicio_espera = None
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._hits += 1
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._misses += 1
+                    break
+                if inicio_espera is None:
+                    inicio_espera = time.monotonic()
+                    self._waits += 1
+                restante = self.timeout - (time.monotonic() - inicio_espera)
+                if restante <= 0:
+                    self._timeouts += 1
+                    raise sqlite3.OperationalError("Pool de conexões esgotado.")
+                self._cond.wait(restante)
+            if inicio_espera is not None:
+                self._wait_time += time.monotonic() - inicio_espera
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._discard()
+                raise
+        return PooledConnection(self, conn, bound=bound)
+
+    def release(self, conn):
+        """Devolve a conexão ao pool, descartando transações pendentes"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            self._discard()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        """Fecha as conexões ociosas (as emprestadas são fechadas ao retornar)"""
+        with self._cond:
+            ociosas, self._idle = self._idle, []
+            self._size -= len(ociosas)
+        for conn in ociosas:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            total = self._hits + self._misses
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / total, 4) if total else 0.0,
+                'waits': self._waits,
+                'wait_time_total': round(self._wait_time, 6),
+                'timeouts': self._timeouts
+            }
+
+
+class SerializedWriter:
+    """Caminho único de escrita do processo: uma conexão dedicada protegida por um lock.
+
+    Cada transação começa com BEGIN IMMEDIATE, que reserva o lock de escrita do
+    SQLite logo no início. Assim, entre processos, quem chega depois espera pelo
+    busy_timeout em vez de falhar com "database is locked" ao tentar promover
+    uma leitura a escrita no meio da transação.
+
+    Uma transação aberta dentro de outra, na mesma thread, vira um SAVEPOINT da
+    externa: um erro no bloco interno desfaz só o que ele gravou.
+    """
+
+    def __init__(self, path=DATABASE_PATH, timeout=POOL_TIMEOUT, pragmas=None):
+        self.path = path
+        self.timeout = timeout
+        self.pragmas = normalize_pragmas(pragmas)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._depth = 0  # só é alterado pela thread que segura o lock
+        self._transactions = 0
+        self._rollbacks = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                check_same_thread=False,
+                isolation_level=None,
+                cached_statements=CACHED_STATEMENTS
+            )
+            apply_connection_pragmas(self._conn, self.pragmas)
+        return self._conn
+
+    @contextmanager
+    def transaction(self):
+        """Executa o bloco numa transação de escrita serializada (commit ao sair, rollback em erro)"""
+        inicio = time.monotonic()
+        if not self._lock.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("Tempo esgotado aguardando a fila de escrita.")
+        try:
+            if self._depth:
+                with self._savepoint() as conn:
+                    yield conn
+                return
+            espera = time.monotonic() - inicio
+            if espera > 0.001:
+                self._waits += 1
+                self._wait_time += espera
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            self._depth = 1
+            try:
+                yield conn
+            except BaseException:
+                self._rollbacks += 1
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+                self._transactions += 1
+            finally:
+                self._depth = 0
+        finally:
+            self._lock.release()
+
+    @contextmanager
+    def _savepoint(self):
+        """Transação aninhada: savepoint dentro da transação externa desta thread"""
+        nome = f'escrita_{self._depth}'
+        conn = self._conn
+        conn.execute(f'SAVEPOINT {nome}')
+        self._depth += 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f'ROLLBACK TO {nome}')
+            conn.execute(f'RELEASE {nome}')
+            raise
+        else:
+            conn.execute(f'RELEASE {nome}')
+        finally:
+            self._depth -= 1
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        return {
+            'transactions': self._transactions,
+            'rollbacks': self._rollbacks,
+            'waits': self._waits,
+            'wait_time_total': round(self._wait_time, 6)
+        }
+
+
+_pool = ConnectionPool()
+_writer = SerializedWriter()
+
+
+def configure_database(path=DATABASE_PATH, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT,
+                       cached_statements=CACHED_STATEMENTS, pragmas=None):
+    """Substitui o pool e o escritor globais pelas configurações informadas"""
+    global _pool, _writer
+    pool_antigo, writer_antigo = _pool, _writer
+    _pool = ConnectionPool(path, max_size, timeout, cached_statements, pragmas)
+    _writer = SerializedWriter(path, timeout, pragmas)
+    pool_antigo.close_all()
+    writer_antigo.close()
+    return _pool
+
+
+def init_app(app):
+    """Configura o banco a partir de app.config e devolve as conexões ao fim de cada contexto"""
+    configure_database(
+        path=app.config.get('DATABASE', DATABASE_PATH),
+        max_size=app.config.get('DB_POOL_MAX_SIZE', POOL_MAX_SIZE),
+        timeout=app.config.get('DB_POOL_TIMEOUT', POOL_TIMEOUT),
+        cached_statements=app.config.get('DB_CACHED_STATEMENTS', CACHED_STATEMENTS),
+        pragmas={
+            'journal_mode': app.config.get('DB_JOURNAL_MODE'),
+            'synchronous': app.config.get('DB_SYNCHRONOUS'),
+            'cache_size': app.config.get('DB_CACHE_SIZE'),
+            'mmap_size': app.config.get('DB_MMAP_SIZE'),
+            'busy_timeout': app.config.get('DB_BUSY_TIMEOUT')
+        }
+    )
+    app.teardown_appcontext(release_connection)
+
+
+def write_transaction():
+    """Transação de escrita pelo caminho serializado: `with write_transaction() as conn:`"""
+    return _writer.transaction()
+
+
+def release_connection(exc=None):
+    """Devolve ao pool a conexão vinculada ao contexto atual"""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.release()
+
+
+def get_pool_stats():
+    """Métricas do pool: acertos, esperas e tamanho"""
+    return _pool.stats()
+
+
+def get_writer_stats():
+    """Métricas da fila de escrita"""
+    return _writer.stats()
+
+
+def init_database(journal_mode=None, parametros_senha=None):
     """Inicializa o banco de dados SQLite3"""
-    conn = sqlite3.connect('turismo.db')
+    pragmas = normalize_pragmas(dict(_pool.pragmas, journal_mode=journal_mode or _pool.pragmas['journal_mode']))
+    conn = sqlite3.connect(_pool.path, timeout=_pool.timeout)
+    conn.execute(f"PRAGMA journal_mode = {pragmas['journal_mode']}")
+    apply_connection_pragmas(conn, pragmas)
     cursor = conn.cursor()
     
     # Tabela de usuários
@@ -71,6 +428,9 @@ def init_database():
         )
     ''')
 
+    # Aplicar migrações pendentes antes de inserir os dados iniciais
+    migrate(conn)
+
     # Inserir dados iniciais de pontos turísticos do Rio de Janeiro
     pontos_turisticos = [
         {
@@ -142,28 +502,40 @@ def init_database():
     
     # Inserir pontos turísticos se não existirem
     for ponto in pontos_turisticos:
+        estado, cidade = parse_estado_cidade(ponto['endereco'])
+        categoria_filtro = map_categoria_para_filtro(ponto['categoria'], ponto['nome'], ponto['descricao'])
         cursor.execute('''
             INSERT OR IGNORE INTO pontos_turisticos 
             (nome, descricao, endereco, latitude, longitude, imagem, categoria, 
-             horario_funcionamento, preco_entrada, telefone_contato, site_oficial)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             horario_funcionamento, preco_entrada, telefone_contato, site_oficial, estado, cidade,
+             categoria_filtro)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             ponto['nome'], ponto['descricao'], ponto['endereco'], 
             ponto['latitude'], ponto['longitude'], ponto['imagem'], 
             ponto['categoria'], ponto['horario_funcionamento'], 
-            ponto['preco_entrada'], ponto['telefone_contato'], ponto['site_oficial']
+            ponto['preco_entrada'], ponto['telefone_contato'], ponto['site_oficial'],
+            estado, cidade, categoria_filtro
         ))
     
     admin_nome = 'admin'
     admin_email = 'admin@turismo.com'
-    admin_senha_hash = hashlib.sha256('0000'.encode()).hexdigest()
     admin_endereco = 'Endereço Admin'
     admin_telefone = '00000000000'
     admin_cpf = '00000000000'
 
-    cursor.execute('SELECT id FROM usuarios WHERE nome = ?', (admin_nome,))
+    cursor.execute('SELECT id, senha FROM usuarios WHERE nome = ?', (admin_nome,))
     admin_row = cursor.fetchone()
 
+    # Só gera um hash novo (caro) se o atual não confere ou está num formato antigo;
+    # parametros_senha é o esquema/custo configurado (ServicoSenhas.parametros)
+    parametros_senha = parametros_senha or {}
+    if (admin_row and verificar_senha('0000', admin_row[1])
+            and not precisa_rehash(admin_row[1], **parametros_senha)):
+        admin_senha_hash = admin_row[1]
+    else:
+        admin_senha_hash = gerar_hash('0000', **parametros_senha)
+
     if admin_row:
         cursor.execute('''
             UPDATE usuarios
@@ -189,9 +561,547 @@ def init_database():
     conn.commit()
     conn.close()
 
+
+# Colunas indexadas pela busca textual, na ordem dos pesos de FTS_WEIGHTS
+FTS_COLUMNS = ('nome', 'categoria', 'cidade', 'descricao', 'endereco')
+FTS_WEIGHTS = (10.0, 4.0, 3.0, 1.0, 2.0)
+_FTS_TOKEN = re.compile(r'\w+')
+
+
+def fts_match_expression(termo, colunas=None):
+    """Converte o termo digitado numa expressão MATCH: todos os tokens, como prefixo"""
+    tokens = _FTS_TOKEN.findall(normalize_text(termo))
+    if not tokens:
+        return None
+    expressao = ' '.join(f'"{token}"*' for token in tokens)
+    if colunas:
+        expressao = f"{{{' '.join(colunas)}}} : ({expressao})"
+    return expressao
+
+
+def rebuild_search_index(cursor):
+    """Reconstrói o índice FTS a partir de pontos_turisticos"""
+    cursor.execute("INSERT INTO pontos_busca (pontos_busca) VALUES ('rebuild')")
+
+
+def rebuild_geo_index(cursor):
+    """Reconstrói o índice R*Tree de coordenadas a partir de pontos_turisticos"""
+    cursor.execute('DELETE FROM pontos_geo')
+    cursor.execute('''
+        INSERT INTO pontos_geo (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT id, latitude, latitude, longitude, longitude FROM pontos_turisticos
+    ''')
+
+
+# Migrações versionadas do esquema. Cada item é (versão, descrição, passos); um passo
+# é um comando SQL ou uma função que recebe o cursor. A última versão aplicada fica
+# gravada em PRAGMA user_version.
+MIGRATIONS = [
+    (1, 'Índices das consultas de avaliações e visitas', [
+        # Avaliações recentes por ponto (ROW_NUMBER particionado por ponto, ordenado por data)
+        'CREATE INDEX IF NOT EXISTS idx_avaliacoes_ponto_data ON avaliacoes (ponto_turistico_id, data_avaliacao DESC)',
+        # Minhas avaliações
+        'CREATE INDEX IF NOT EXISTS idx_avaliacoes_usuario_data ON avaliacoes (usuario_id, data_avaliacao DESC)',
+        # Listagem de avaliações do /adm
+        'CREATE INDEX IF NOT EXISTS idx_avaliacoes_data ON avaliacoes (data_avaliacao DESC)',
+        # COUNT(DISTINCT usuario_id) do /adm, total e por origem
+        'CREATE INDEX IF NOT EXISTS idx_visitas_usuario ON visitas_pontos (usuario_id)',
+        'CREATE INDEX IF NOT EXISTS idx_visitas_origem_usuario ON visitas_pontos (origem_sudeste, usuario_id)'
+    ]),
+    (2, 'Índice de cobertura para médias e contagens de notas por ponto', [
+        'CREATE INDEX IF NOT EXISTS idx_avaliacoes_ponto_nota ON avaliacoes (ponto_turistico_id, nota)'
+    ]),
+    (3, 'Agregados de notas materializados por ponto turístico', [
+        '''
+        CREATE TABLE IF NOT EXISTS pontos_agregados (
+            ponto_turistico_id INTEGER PRIMARY KEY,
+            total_avaliacoes INTEGER NOT NULL DEFAULT 0,
+            soma_notas INTEGER NOT NULL DEFAULT 0,
+            media_avaliacoes REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY (ponto_turistico_id) REFERENCES pontos_turisticos (id)
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_agregados_ranking
+        ON pontos_agregados (media_avaliacoes DESC, total_avaliacoes DESC)
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_agregados_ponto_insert
+        AFTER INSERT ON pontos_turisticos
+        BEGIN
+            INSERT OR IGNORE INTO pontos_agregados (ponto_turistico_id) VALUES (NEW.id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_agregados_ponto_delete
+        AFTER DELETE ON pontos_turisticos
+        BEGIN
+            DELETE FROM pontos_agregados WHERE ponto_turistico_id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_agregados_avaliacao_insert
+        AFTER INSERT ON avaliacoes
+        BEGIN
+            INSERT OR IGNORE INTO pontos_agregados (ponto_turistico_id) VALUES (NEW.ponto_turistico_id);
+            UPDATE pontos_agregados
+            SET total_avaliacoes = total_avaliacoes + 1,
+                soma_notas = soma_notas + NEW.nota,
+                media_avaliacoes = ROUND((soma_notas + NEW.nota) * 1.0 / (total_avaliacoes + 1), 1)
+            WHERE ponto_turistico_id = NEW.ponto_turistico_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_agregados_avaliacao_delete
+        AFTER DELETE ON avaliacoes
+        BEGIN
+            UPDATE pontos_agregados
+            SET total_avaliacoes = total_avaliacoes - 1,
+                soma_notas = soma_notas - OLD.nota,
+                media_avaliacoes = CASE WHEN total_avaliacoes > 1
+                                        THEN ROUND((soma_notas - OLD.nota) * 1.0 / (total_avaliacoes - 1), 1)
+                                        ELSE 0 END
+            WHERE ponto_turistico_id = OLD.ponto_turistico_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_agregados_avaliacao_update
+        AFTER UPDATE OF nota, ponto_turistico_id ON avaliacoes
+        BEGIN
+            UPDATE pontos_agregados
+            SET total_avaliacoes = total_avaliacoes - 1,
+                soma_notas = soma_notas - OLD.nota,
+                media_avaliacoes = CASE WHEN total_avaliacoes > 1
+                                        THEN ROUND((soma_notas - OLD.nota) * 1.0 / (total_avaliacoes - 1), 1)
+                                        ELSE 0 END
+            WHERE ponto_turistico_id = OLD.ponto_turistico_id;
+            INSERT OR IGNORE INTO pontos_agregados (ponto_turistico_id) VALUES (NEW.ponto_turistico_id);
+            UPDATE pontos_agregados
+            SET total_avaliacoes = total_avaliacoes + 1,
+                soma_notas = soma_notas + NEW.nota,
+                media_avaliacoes = ROUND((soma_notas + NEW.nota) * 1.0 / (total_avaliacoes + 1), 1)
+            WHERE ponto_turistico_id = NEW.ponto_turistico_id;
+        END
+        ''',
+        lambda cursor: rebuild_rating_aggregates(cursor)
+    ]),
+    (4, 'Estado (UF) e cidade normalizados em pontos_turisticos', [
+        'ALTER TABLE pontos_turisticos ADD COLUMN estado TEXT',
+        'ALTER TABLE pontos_turisticos ADD COLUMN cidade TEXT',
+        lambda cursor: backfill_estado_cidade(cursor),
+        'CREATE INDEX IF NOT EXISTS idx_pontos_estado ON pontos_turisticos (estado)'
+    ]),
+    (5, 'Índice de busca textual FTS5 sobre pontos_turisticos', [
+        # unicode61 com remove_diacritics 2 faz a mesma dobra de normalize_text:
+        # minúsculas e sem acentos, então "sao paulo" encontra "São Paulo"
+        f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS pontos_busca USING fts5(
+            {', '.join(FTS_COLUMNS)},
+            content='pontos_turisticos',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_ponto_insert
+        AFTER INSERT ON pontos_turisticos
+        BEGIN
+            INSERT INTO pontos_busca (rowid, {', '.join(FTS_COLUMNS)})
+            VALUES (NEW.id, {', '.join('NEW.' + coluna for coluna in FTS_COLUMNS)});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_ponto_delete
+        AFTER DELETE ON pontos_turisticos
+        BEGIN
+            INSERT INTO pontos_busca (pontos_busca, rowid, {', '.join(FTS_COLUMNS)})
+            VALUES ('delete', OLD.id, {', '.join('OLD.' + coluna for coluna in FTS_COLUMNS)});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_ponto_update
+        AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON pontos_turisticos
+        BEGIN
+            INSERT INTO pontos_busca (pontos_busca, rowid, {', '.join(FTS_COLUMNS)})
+            VALUES ('delete', OLD.id, {', '.join('OLD.' + coluna for coluna in FTS_COLUMNS)});
+            INSERT INTO pontos_busca (rowid, {', '.join(FTS_COLUMNS)})
+            VALUES (NEW.id, {', '.join('NEW.' + coluna for coluna in FTS_COLUMNS)});
+        END
+        ''',
+        "INSERT INTO pontos_busca (pontos_busca) VALUES ('rebuild')"
+    ]),
+    (6, 'Cache persistente de consultas de CEP', [
+        '''
+        CREATE TABLE IF NOT EXISTS cep_cache (
+            cep TEXT PRIMARY KEY,
+            endereco TEXT,
+            uf TEXT,
+            erro TEXT,
+            atualizado_em REAL NOT NULL
+        ) WITHOUT ROWID
+        '''
+    ]),
+    (7, 'Rollups de visitas para o painel administrativo', [
+        # Pares chave/valor de controle (ex.: último id de visitas_pontos já agregado)
+        '''
+        CREATE TABLE IF NOT EXISTS metadados (
+            chave TEXT PRIMARY KEY,
+            valor TEXT
+        ) WITHOUT ROWID
+        ''',
+        # Visitas e visitantes distintos por dia, ponto e origem
+        '''
+        CREATE TABLE IF NOT EXISTS visitas_diarias (
+            dia TEXT NOT NULL,
+            ponto_turistico_id INTEGER NOT NULL,
+            origem_sudeste INTEGER NOT NULL,
+            visitas INTEGER NOT NULL DEFAULT 0,
+            visitantes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, ponto_turistico_id, origem_sudeste)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_visitas_diarias_ponto ON visitas_diarias (ponto_turistico_id, dia)',
+        # Um registro por visitante distinto em cada dia/ponto/origem (base das contagens por período)
+        '''
+        CREATE TABLE IF NOT EXISTS visitantes_ponto_dia (
+            ponto_turistico_id INTEGER NOT NULL,
+            dia TEXT NOT NULL,
+            origem_sudeste INTEGER NOT NULL,
+            usuario_id INTEGER NOT NULL,
+            PRIMARY KEY (ponto_turistico_id, dia, origem_sudeste, usuario_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_visitantes_dia ON visitantes_ponto_dia (dia, origem_sudeste, usuario_id)',
+        # Um registro por usuário que já visitou algum ponto (totais do /adm)
+        '''
+        CREATE TABLE IF NOT EXISTS visitantes_unicos (
+            usuario_id INTEGER PRIMARY KEY,
+            visitou_sudeste INTEGER NOT NULL DEFAULT 0,
+            primeira_visita TEXT,
+            ultima_visita TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_visitantes_unicos_sudeste ON visitantes_unicos (visitou_sudeste)',
+        "INSERT OR IGNORE INTO metadados (chave, valor) VALUES ('visitas_ultimo_id', '0')"
+    ]),
+    (8, 'Sketches HyperLogLog de visitantes distintos', [
+        # ponto_turistico_id = 0 agrega todos os pontos; dia = '' agrega todo o histórico
+        '''
+        CREATE TABLE IF NOT EXISTS sketches_visitantes (
+            ponto_turistico_id INTEGER NOT NULL,
+            dia TEXT NOT NULL,
+            origem_sudeste INTEGER NOT NULL,
+            registros BLOB NOT NULL,
+            PRIMARY KEY (ponto_turistico_id, dia, origem_sudeste)
+        ) WITHOUT ROWID
+        ''',
+        "INSERT OR IGNORE INTO metadados (chave, valor) VALUES ('sketches_ultimo_id', '0')"
+    ]),
+    (9, 'Índice para a paginação de usuários no painel administrativo', [
+        'CREATE INDEX IF NOT EXISTS idx_usuarios_cadastro ON usuarios (data_cadastro DESC)'
+    ]),
+    (10, 'Categoria do filtro calculada na gravação', [
+        'ALTER TABLE pontos_turisticos ADD COLUMN categoria_filtro TEXT',
+        lambda cursor: reclassificar_pontos(cursor),
+        'CREATE INDEX IF NOT EXISTS idx_pontos_categoria_filtro ON pontos_turisticos (categoria_filtro)'
+    ]),
+    (11, 'Índice espacial R*Tree de latitude/longitude', [
+        # Cada ponto é um retângulo degenerado; a distância exata é refinada por haversine
+        'CREATE VIRTUAL TABLE IF NOT EXISTS pontos_geo USING rtree(id, min_lat, max_lat, min_lon, max_lon)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_geo_ponto_insert
+        AFTER INSERT ON pontos_turisticos
+        BEGIN
+            INSERT INTO pontos_geo (id, min_lat, max_lat, min_lon, max_lon)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_geo_ponto_delete
+        AFTER DELETE ON pontos_turisticos
+        BEGIN
+            DELETE FROM pontos_geo WHERE id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_geo_ponto_update
+        AFTER UPDATE OF latitude, longitude ON pontos_turisticos
+        BEGIN
+            UPDATE pontos_geo
+            SET min_lat = NEW.latitude, max_lat = NEW.latitude,
+                min_lon = NEW.longitude, max_lon = NEW.longitude
+            WHERE id = NEW.id;
+        END
+        ''',
+        lambda cursor: rebuild_geo_index(cursor)
+    ]),
+    (12, 'Remove as estatísticas do ANALYZE gravadas pela versão 2', [
+        lambda cursor: clear_planner_stats(cursor)
+    ])
+]
+
+
+UFS_BRASIL = {
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO'
+}
+NOMES_ESTADOS = {
+    'rio de janeiro': 'RJ',
+    'sao paulo': 'SP',
+    'minas gerais': 'MG',
+    'espirito santo': 'ES'
+}
+_CIDADE_UF = re.compile(r'^(.*?)\s*[-–/]\s*([A-Za-z]{2})$')
+_SIGLA_UF = re.compile(r'\b([A-Z]{2})\b')
+
+
+def parse_estado_cidade(endereco):
+    """Extrai (UF, cidade) de endereços no formato '..., Cidade - UF'"""
+    if not endereco:
+        return None, None
+
+    partes = [parte.strip() for parte in endereco.split(',') if parte.strip()]
+    if not partes:
+        return None, None
+
+    # Formato usual: última parte "Cidade - UF"
+    match = _CIDADE_UF.match(partes[-1])
+    if match and match.group(2).upper() in UFS_BRASIL:
+        return match.group(2).upper(), match.group(1).strip() or None
+
+    # "..., Cidade, UF"
+    if partes[-1].upper() in UFS_BRASIL:
+        cidade = partes[-2] if len(partes) > 1 else None
+        return partes[-1].upper(), cidade
+
+    # Sigla em maiúsculas em qualquer posição (evita casar "es" dentro de palavras)
+    siglas = [sigla for sigla in _SIGLA_UF.findall(endereco) if sigla in UFS_BRASIL]
+    if siglas:
+        return siglas[-1], None
+
+    normalizado = normalize_text(endereco)
+    for nome, uf in NOMES_ESTADOS.items():
+        if nome in normalizado:
+            return uf, None
+    return None, None
+
+
+def backfill_estado_cidade(cursor):
+    """Preenche estado e cidade dos pontos já cadastrados"""
+    cursor.execute('SELECT id, endereco FROM pontos_turisticos')
+    valores = [parse_estado_cidade(endereco) + (ponto_id,) for ponto_id, endereco in cursor.fetchall()]
+    cursor.executemany('UPDATE pontos_turisticos SET estado = ?, cidade = ? WHERE id = ?', valores)
+
+
+def rebuild_rating_aggregates(cursor):
+    """Recalcula pontos_agregados a partir de avaliacoes; retorna quantos pontos estavam divergentes"""
+    cursor.execute('''
+        CREATE TEMP TABLE agregados_calculados AS
+        SELECT pt.id AS ponto_turistico_id,
+               COUNT(a.id) AS total_avaliacoes,
+               COALESCE(SUM(a.nota), 0) AS soma_notas,
+               COALESCE(ROUND(AVG(a.nota), 1), 0) AS media_avaliacoes
+        FROM pontos_turisticos pt
+        LEFT JOIN avaliacoes a ON pt.id = a.ponto_turistico_id
+        GROUP BY pt.id
+    ''')
+    cursor.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT ponto_turistico_id, total_avaliacoes, soma_notas, media_avaliacoes FROM agregados_calculados
+            EXCEPT
+            SELECT ponto_turistico_id, total_avaliacoes, soma_notas, media_avaliacoes FROM pontos_agregados
+        )
+    ''')
+    divergentes = cursor.fetchone()[0]
+    cursor.execute('DELETE FROM pontos_agregados')
+    cursor.execute('''
+        INSERT INTO pontos_agregados (ponto_turistico_id, total_avaliacoes, soma_notas, media_avaliacoes)
+        SELECT ponto_turistico_id, total_avaliacoes, soma_notas, media_avaliacoes FROM agregados_calculados
+    ''')
+    cursor.execute('DROP TABLE agregados_calculados')
+    return divergentes
+
+
+def clear_planner_stats(cursor):
+    """Apaga as estatísticas do ANALYZE, que ninguém atualiza e ficam defasadas quando as
+    tabelas crescem; sem elas o planejador escolhe pelos índices, como num banco novo"""
+    for tabela in ('sqlite_stat1', 'sqlite_stat4'):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,))
+        if cursor.fetchone():
+            cursor.execute(f'DELETE FROM {tabela}')
+
+
+def get_schema_version(conn):
+    """Versão do esquema já aplicada ao banco"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=None):
+    """Aplica as migrações pendentes em ordem, cada uma em sua própria transação"""
+    if conn.in_transaction:
+        conn.commit()
+
+    atual = get_schema_version(conn)
+    aplicadas = []
+    for versao, descricao, passos in MIGRATIONS:
+        if versao <= atual or (target is not None and versao > target):
+            continue
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for passo in passos:
+                if callable(passo):
+                    passo(cursor)
+                else:
+                    cursor.execute(passo)
+            cursor.execute(f'PRAGMA user_version = {int(versao)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        aplicadas.append((versao, descricao))
+    return aplicadas
+
+
+# Consultas quentes e parâmetros representativos; check_query_plans() exige que
+# nenhuma delas faça varredura completa de tabela.
+HOT_QUERIES = {
+    'avaliacoes_recentes_por_ponto': ('''
+        SELECT ponto_id, nome_usuario, nota, comentario, data_avaliacao
+        FROM (
+            SELECT a.ponto_turistico_id AS ponto_id, u.nome AS nome_usuario, a.nota, a.comentario,
+                   a.data_avaliacao,
+                   ROW_NUMBER() OVER (PARTITION BY a.ponto_turistico_id ORDER BY a.data_avaliacao DESC) AS rn
+            FROM avaliacoes a
+            JOIN usuarios u ON a.usuario_id = u.id
+            WHERE a.ponto_turistico_id IN (?, ?)
+        )
+        WHERE rn <= ?
+    ''', (1, 2, 5)),
+    'minhas_avaliacoes': ('''
+        SELECT a.*, pt.nome as ponto_nome
+        FROM avaliacoes a
+        JOIN pontos_turisticos pt ON a.ponto_turistico_id = pt.id
+        WHERE a.usuario_id = ?
+        ORDER BY a.data_avaliacao DESC
+    ''', (1,)),
+    'adm_avaliacoes': ('''
+        SELECT a.id, u.nome, pt.nome, a.nota, a.comentario, a.data_avaliacao
+        FROM avaliacoes a
+        JOIN usuarios u ON a.usuario_id = u.id
+        JOIN pontos_turisticos pt ON a.ponto_turistico_id = pt.id
+        WHERE (a.data_avaliacao, a.id) < (?, ?)
+        ORDER BY a.data_avaliacao DESC, a.id DESC
+        LIMIT ?
+    ''', ('2025-01-01 00:00:00', 1000, 51)),
+    'adm_avaliacoes_por_usuario': ('''
+        SELECT a.id, a.nota, a.data_avaliacao
+        FROM avaliacoes a
+        WHERE a.usuario_id = ? AND (a.data_avaliacao, a.id) < (?, ?)
+        ORDER BY a.data_avaliacao DESC, a.id DESC
+        LIMIT ?
+    ''', (1, '2025-01-01 00:00:00', 1000, 51)),
+    'adm_usuarios': ('''
+        SELECT * FROM usuarios
+        WHERE (data_cadastro, id) < (?, ?)
+        ORDER BY data_cadastro DESC, id DESC
+        LIMIT ?
+    ''', ('2025-01-01 00:00:00', 1000, 51)),
+    # CROSS JOIN fixa pontos_agregados no laço externo: lido na ordem de idx_agregados_ranking
+    'ranking_pontos': ('''
+        SELECT pt.id, pt.nome, ag.media_avaliacoes, ag.total_avaliacoes
+        FROM pontos_agregados ag
+        CROSS JOIN pontos_turisticos pt ON pt.id = ag.ponto_turistico_id
+        ORDER BY ag.media_avaliacoes DESC, ag.total_avaliacoes DESC, pt.nome
+        LIMIT ?
+    ''', (8,)),
+    'pontos_por_estado': ('''
+        SELECT estado, COUNT(*) FROM pontos_turisticos WHERE estado IN (?, ?, ?, ?) GROUP BY estado
+    ''', ('RJ', 'SP', 'MG', 'ES')),
+    'adm_total_visitantes': ('SELECT COUNT(*) FROM visitantes_unicos', ()),
+    'pontos_proximos': ('''
+        SELECT pt.id, pt.nome, pt.latitude, pt.longitude
+        FROM pontos_geo g
+        JOIN pontos_turisticos pt ON pt.id = g.id
+        WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ? AND g.id != ?
+    ''', (-23.1, -22.8, -43.4, -43.0, 1)),
+    'sketches_por_periodo': ('''
+        SELECT registros FROM sketches_visitantes
+        WHERE ponto_turistico_id = ? AND dia BETWEEN ? AND ?
+    ''', (0, '2025-01-01', '2025-01-31')),
+    'adm_visitantes_sudeste': ('SELECT COUNT(*) FROM visitantes_unicos WHERE visitou_sudeste = 1', ()),
+    'visitantes_por_periodo': (
+        'SELECT COUNT(DISTINCT usuario_id) FROM visitantes_ponto_dia WHERE dia BETWEEN ? AND ?',
+        ('2025-01-01', '2025-01-31')
+    ),
+    'visitas_por_ponto_periodo': ('''
+        SELECT dia, origem_sudeste, visitas, visitantes
+        FROM visitas_diarias
+        WHERE ponto_turistico_id = ? AND dia BETWEEN ? AND ?
+    ''', (1, '2025-01-01', '2025-01-31'))
+}
+
+# 'SCAN x' (SQLite >= 3.36) ou 'SCAN TABLE x' (anteriores), com alias opcional. Varrer um índice
+# ('USING [COVERING] INDEX'), uma tabela virtual pelo índice do módulo (FTS, R*Tree), uma
+# subconsulta ou a linha constante não conta como varredura completa, exceto o índice
+# percorrido inteiro no lado interno de um join: ele é relido para cada linha do laço externo
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(?!SUBQUERY\b|CONSTANT ROW\b)(\w+)(?: AS \w+)?(?: |$)')
+_INDEX_SCAN = re.compile(r'^SCAN (?:TABLE )?\w+(?: AS \w+)? USING (?:COVERING )?INDEX ')
+
+
+def is_full_scan(detalhe, interno=False):
+    """True se o passo do plano varre uma tabela inteira; interno=True para laços internos de um join"""
+    if _FULL_SCAN.match(detalhe) is None or ' VIRTUAL TABLE INDEX ' in detalhe:
+        return False
+    if ' USING ' not in detalhe:
+        return True
+    return interno and _INDEX_SCAN.match(detalhe) is not None
+
+
+def explain_query_plan(conn, sql, params=()):
+    """Linhas de detalhe do EXPLAIN QUERY PLAN da consulta"""
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def full_scans(conn, sql, params=()):
+    """Passos do plano da consulta que varrem uma tabela inteira"""
+    varreduras = []
+    com_laco = set()  # nós do plano que já têm um laço externo
+    for _, pai, _, detalhe in conn.execute('EXPLAIN QUERY PLAN ' + sql, params):
+        if not detalhe.startswith(('SCAN ', 'SEARCH ')):
+            continue
+        if is_full_scan(detalhe, interno=pai in com_laco):
+            varreduras.append(detalhe)
+        com_laco.add(pai)
+    return varreduras
+
+
+def check_query_plans(conn=None, queries=None):
+    """Retorna {consulta: passos} das consultas quentes que caíram em varredura completa"""
+    propria = conn is None
+    if propria:
+        conn = get_connection()
+    try:
+        problemas = {}
+        for nome, (sql, params) in (queries or HOT_QUERIES).items():
+            varreduras = full_scans(conn, sql, params)
+            if varreduras:
+                problemas[nome] = varreduras
+        return problemas
+    finally:
+        if propria:
+            conn.close()
+
+
 def get_connection():
-    """Retorna uma conexão com o banco de dados"""
-    return sqlite3.connect('turismo.db')
+    """Retorna uma conexão do pool; dentro de um contexto Flask, reaproveita a conexão do contexto"""
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None:
+            conn = g._db_conn = _pool.acquire(bound=True)
+        return conn
+    return _pool.acquire()
 
 if __name__ == '__main__':
     init_database()
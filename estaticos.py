@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import os
+import re
+import threading
+
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só são gerados os .gz
+    brotli = None
+
+from armazenamento import TAMANHO_BLOCO
+
+TAMANHO_IMPRESSAO = 12
+CACHE_IMUTAVEL = 365 * 24 * 3600
+EXTENSOES_COMPRIMIVEIS = ('.css', '.js', '.svg', '.html', '.json', '.txt', '.map')
+# Codificação aceita -> extensão do arquivo pré-comprimido, em ordem de preferência
+PRE_COMPRIMIDOS = (('br', '.br'), ('gzip', '.gz'))
+
+# css/estilo.3f2a9c1b0d4e.css -> (css/estilo, 3f2a9c1b0d4e, .css)
+_NOME_IMPRESSO = re.compile(r'^(?P<raiz>.+)\.(?P<impressao>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % TAMANHO_IMPRESSAO)
+
+
+class ManifestoEstaticos:
+    """Impressões digitais (hash do conteúdo) dos arquivos estáticos, calculadas sob demanda.
+
+    A URL de um arquivo passa a carregar a impressão no nome (estilo.css -> estilo.<hash>.css):
+    quando o conteúdo muda, a URL muda, então a resposta pode ser cacheada como imutável.
+    Vale também para os uploads: o nome deles deriva do envio original, não dos bytes
+    servidos (as variantes mudam com a configuração). Com revalidar=True (modo debug)
+    a data de modificação é conferida a cada uso; senão, o hash calculado vale até reiniciar.
+    """
+
+    def __init__(self, pasta, revalidar=False):
+        self.pasta = pasta
+        self.revalidar = revalidar
+        self._impressoes = {}  # arquivo -> (mtime_ns, tamanho, impressao)
+        self._lock = threading.Lock()
+
+    def _caminho(self, arquivo):
+        return safe_join(self.pasta, arquivo)
+
+    def impressao(self, arquivo):
+        """Hash curto do conteúdo do arquivo, ou None se ele não existir"""
+        with self._lock:
+            item = self._impressoes.get(arquivo)
+        if item is not None and not self.revalidar:
+            return item[2]
+        caminho = self._caminho(arquivo)
+        try:
+            info = os.stat(caminho) if caminho else None
+        except OSError:
+            info = None
+        if info is None or not os.path.isfile(caminho):
+            return None
+        if item is not None and item[:2] == (info.st_mtime_ns, info.st_size):
+            return item[2]
+        resumo = hashlib.sha256()
+        with open(caminho, 'rb') as origem:
+            for bloco in iter(lambda: origem.read(TAMANHO_BLOCO), b''):
+                resumo.update(bloco)
+        impressao = resumo.hexdigest()[:TAMANHO_IMPRESSAO]
+        with self._lock:
+            self._impressoes[arquivo] = (info.st_mtime_ns, info.st_size, impressao)
+        return impressao
+
+    def url(self, arquivo):
+        """Nome a usar na URL: com a impressão digital, ou o original se não der para calculá-la"""
+        impressao = self.impressao(arquivo)
+        if impressao is None:
+            return arquivo
+        raiz, ext = os.path.splitext(arquivo)
+        return f'{raiz}.{impressao}{ext}'
+
+    def resolver(self, nome):
+        """Arquivo real de uma URL e se a resposta pode ser cacheada como imutável"""
+        encontrado = _NOME_IMPRESSO.match(nome)
+        if encontrado:
+            arquivo = encontrado.group('raiz') + encontrado.group('ext')
+            impressao = self.impressao(arquivo)
+            if impressao is not None:
+                # Impressão antiga (deploy novo): entrega o atual, mas sem prometer imutabilidade
+                return arquivo, impressao == encontrado.group('impressao')
+        return nome, False
+
+    def pre_comprimido(self, arquivo, aceitas):
+        """(arquivo comprimido, codificação) se houver um irmão .br/.gz atualizado e aceito"""
+        caminho = self._caminho(arquivo)
+        if not caminho or not arquivo.endswith(EXTENSOES_COMPRIMIVEIS):
+            return None, None
+        try:
+            mtime_original = os.stat(caminho).st_mtime_ns
+        except OSError:
+            return None, None
+        for codificacao, extensao in PRE_COMPRIMIDOS:
+            if codificacao not in aceitas:
+                continue
+            try:
+                if os.stat(caminho + extensao).st_mtime_ns >= mtime_original:
+                    return arquivo + extensao, codificacao
+            except OSError:
+                continue
+        return None, None
+
+    def comprimir(self):
+        """Gera irmãos .gz (e .br, se houver brotli) dos arquivos comprimíveis; retorna quantos"""
+        gerados = 0
+        for raiz, _, arquivos in os.walk(self.pasta):
+            for nome in arquivos:
+                if not nome.endswith(EXTENSOES_COMPRIMIVEIS):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                with open(caminho, 'rb') as origem:
+                    dados = origem.read()
+                # mtime=0: o mesmo conteúdo gera sempre o mesmo .gz
+                saidas = [('.gz', lambda: gzip.compress(dados, compresslevel=9, mtime=0))]
+                if brotli is not None:
+                    saidas.append(('.br', lambda: brotli.compress(dados, quality=11)))
+                for extensao, comprimir in saidas:
+                    destino = caminho + extensao
+                    if os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(caminho):
+                        continue
+                    comprimido = comprimir()
+                    if len(comprimido) >= len(dados):
+                        continue
+                    temporario = destino + '.tmp'
+                    with open(temporario, 'wb') as saida:
+                        saida.write(comprimido)
+                    os.replace(temporario, destino)
+                    gerados += 1
+        return gerados
+
+    def stats(self):
+        with self._lock:
+            return {'impressoes': len(self._impressoes), 'brotli': brotli is not None}
@@ -0,0 +1,307 @@
+from collections import defaultdict
+
+from database import get_connection, write_transaction
+from hyperloglog import HyperLogLog, PRECISAO_PADRAO
+
+# visitas_pontos só recebe INSERTs, então o último id agregado basta como marca d'água
+CHAVE_MARCA_VISITAS = 'visitas_ultimo_id'
+CHAVE_MARCA_SKETCHES = 'sketches_ultimo_id'
+LOTE_ROLLUP = 50000
+
+# Escopos agregados em sketches_visitantes
+TODOS_OS_PONTOS = 0
+TODO_O_PERIODO = ''
+
+
+def ler_metadado(conn, chave, padrao=None):
+    row = conn.execute('SELECT valor FROM metadados WHERE chave = ?', (chave,)).fetchone()
+    return row[0] if row else padrao
+
+
+def gravar_metadado(conn, chave, valor):
+    conn.execute('''
+        INSERT INTO metadados (chave, valor) VALUES (?, ?)
+        ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor
+    ''', (chave, str(valor)))
+
+
+def _agregar_intervalo(conn, inicio, fim):
+    """Soma nas tabelas de rollup as visitas com inicio < id <= fim"""
+    intervalo = (inicio, fim)
+    conn.execute('''
+        INSERT INTO visitas_diarias (dia, ponto_turistico_id, origem_sudeste, visitas)
+        SELECT date(data_visita), ponto_turistico_id, origem_sudeste, COUNT(*)
+        FROM visitas_pontos
+        WHERE id > ? AND id <= ?
+        GROUP BY 1, 2, 3
+        ON CONFLICT (dia, ponto_turistico_id, origem_sudeste)
+        DO UPDATE SET visitas = visitas + excluded.visitas
+    ''', intervalo)
+    conn.execute('''
+        INSERT OR IGNORE INTO visitantes_ponto_dia (ponto_turistico_id, dia, origem_sudeste, usuario_id)
+        SELECT DISTINCT ponto_turistico_id, date(data_visita), origem_sudeste, usuario_id
+        FROM visitas_pontos
+        WHERE id > ? AND id <= ?
+    ''', intervalo)
+    # Recontagem só dos grupos tocados, pela chave primária de visitantes_ponto_dia
+    conn.execute('''
+        UPDATE visitas_diarias
+        SET visitantes = (
+            SELECT COUNT(*) FROM visitantes_ponto_dia v
+            WHERE v.ponto_turistico_id = visitas_diarias.ponto_turistico_id
+              AND v.dia = visitas_diarias.dia
+              AND v.origem_sudeste = visitas_diarias.origem_sudeste
+        )
+        WHERE (dia, ponto_turistico_id, origem_sudeste) IN (
+            SELECT date(data_visita), ponto_turistico_id, origem_sudeste
+            FROM visitas_pontos
+            WHERE id > ? AND id <= ?
+        )
+    ''', intervalo)
+    conn.execute('''
+        INSERT INTO visitantes_unicos (usuario_id, visitou_sudeste, primeira_visita, ultima_visita)
+        SELECT usuario_id, MAX(origem_sudeste), MIN(data_visita), MAX(data_visita)
+        FROM visitas_pontos
+        WHERE id > ? AND id <= ?
+        GROUP BY usuario_id
+        ON CONFLICT (usuario_id) DO UPDATE SET
+            visitou_sudeste = MAX(visitou_sudeste, excluded.visitou_sudeste),
+            primeira_visita = MIN(primeira_visita, excluded.primeira_visita),
+            ultima_visita = MAX(ultima_visita, excluded.ultima_visita)
+    ''', intervalo)
+
+
+def _processar_em_lotes(chave_marca, agregar, lote):
+    """Aplica agregar(conn, inicio, fim) às visitas acima da marca d'água, lote a lote"""
+    processadas = 0
+    while True:
+        with write_transaction() as conn:
+            marca = int(ler_metadado(conn, chave_marca, 0))
+            fim, quantidade = conn.execute('''
+                SELECT MAX(id), COUNT(*) FROM (
+                    SELECT id FROM visitas_pontos WHERE id > ? ORDER BY id LIMIT ?
+                )
+            ''', (marca, lote)).fetchone()
+            if not quantidade:
+                return processadas
+            agregar(conn, marca, fim)
+            gravar_metadado(conn, chave_marca, fim)
+        processadas += quantidade
+
+
+def atualizar_rollups(lote=LOTE_ROLLUP):
+    """Agrega as visitas gravadas depois da marca d'água; retorna quantas foram processadas"""
+    return _processar_em_lotes(CHAVE_MARCA_VISITAS, _agregar_intervalo, lote)
+
+
+def reconstruir_rollups():
+    """Apaga os rollups e agrega todo o histórico de visitas novamente"""
+    with write_transaction() as conn:
+        conn.execute('DELETE FROM visitas_diarias')
+        conn.execute('DELETE FROM visitantes_ponto_dia')
+        conn.execute('DELETE FROM visitantes_unicos')
+        gravar_metadado(conn, CHAVE_MARCA_VISITAS, 0)
+    return atualizar_rollups()
+
+
+def _sketches_intervalo(conn, inicio, fim):
+    """Adiciona os visitantes com inicio < id <= fim aos sketches de cada escopo"""
+    novos = defaultdict(set)
+    cursor = conn.execute('''
+        SELECT ponto_turistico_id, date(data_visita), origem_sudeste, usuario_id
+        FROM visitas_pontos
+        WHERE id > ? AND id <= ?
+    ''', (inicio, fim))
+    for ponto_id, dia, origem, usuario_id in cursor:
+        for escopo_ponto in (ponto_id, TODOS_OS_PONTOS):
+            for escopo_dia in (dia, TODO_O_PERIODO):
+                novos[(escopo_ponto, escopo_dia, origem)].add(usuario_id)
+
+    alterados = []
+    for chave, usuarios in novos.items():
+        row = conn.execute('''
+            SELECT registros FROM sketches_visitantes
+            WHERE ponto_turistico_id = ? AND dia = ? AND origem_sudeste = ?
+        ''', chave).fetchone()
+        sketch = HyperLogLog.desserializar(row[0]) if row else HyperLogLog(PRECISAO_PADRAO)
+        mudou = row is None
+        for usuario_id in usuarios:
+            mudou = sketch.adicionar(usuario_id) or mudou
+        if mudou:
+            alterados.append(chave + (sketch.serializar(),))
+    conn.executemany('''
+        INSERT INTO sketches_visitantes (ponto_turistico_id, dia, origem_sudeste, registros)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (ponto_turistico_id, dia, origem_sudeste) DO UPDATE SET registros = excluded.registros
+    ''', alterados)
+
+
+def atualizar_sketches(lote=LOTE_ROLLUP):
+    """Atualiza os sketches HyperLogLog com as visitas novas; retorna quantas foram processadas"""
+    return _processar_em_lotes(CHAVE_MARCA_SKETCHES, _sketches_intervalo, lote)
+
+
+def reconstruir_sketches():
+    with write_transaction() as conn:
+        conn.execute('DELETE FROM sketches_visitantes')
+        gravar_metadado(conn, CHAVE_MARCA_SKETCHES, 0)
+    return atualizar_sketches()
+
+
+def contar_visitantes_aproximado(inicio=None, fim=None, ponto_id=None, origem_sudeste=None):
+    """Estimativa de visitantes distintos mesclando os sketches do escopo pedido.
+
+    Sem período usa os sketches de todo o histórico, então o custo não cresce com o volume de visitas.
+    """
+    filtros = ['ponto_turistico_id = ?']
+    params = [TODOS_OS_PONTOS if ponto_id is None else ponto_id]
+    if inicio is None and fim is None:
+        filtros.append('dia = ?')
+        params.append(TODO_O_PERIODO)
+    else:
+        filtros.append('dia BETWEEN ? AND ?')
+        params.extend([inicio or '0000-00-00', fim or '9999-99-99'])
+    if origem_sudeste is not None:
+        filtros.append('origem_sudeste = ?')
+        params.append(origem_sudeste)
+
+    conn = get_connection()
+    cursor = conn.execute(
+        f"SELECT registros FROM sketches_visitantes WHERE {' AND '.join(filtros)}", params
+    )
+    total = HyperLogLog(PRECISAO_PADRAO)
+    for (registros,) in cursor:
+        total.mesclar(HyperLogLog.desserializar(registros))
+    conn.close()
+    return total.estimar()
+
+
+def comparar_sketches_com_exato():
+    """Estimativas dos sketches ao lado das contagens exatas em visitas_pontos, por escopo"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    escopos = [('todos os pontos', None, None)]
+    cursor.execute('SELECT DISTINCT ponto_turistico_id FROM visitas_pontos ORDER BY 1')
+    escopos.extend((f'ponto {row[0]}', row[0], None) for row in cursor.fetchall())
+    escopos.append(('origem sudeste', None, 1))
+    escopos.append(('outras origens', None, 0))
+
+    linhas = []
+    for nome, ponto_id, origem in escopos:
+        filtros, params = ['1 = 1'], []
+        if ponto_id is not None:
+            filtros.append('ponto_turistico_id = ?')
+            params.append(ponto_id)
+        if origem is not None:
+            filtros.append('origem_sudeste = ?')
+            params.append(origem)
+        cursor.execute(
+            f"SELECT COUNT(DISTINCT usuario_id) FROM visitas_pontos WHERE {' AND '.join(filtros)}", params
+        )
+        exato = cursor.fetchone()[0]
+        estimado = contar_visitantes_aproximado(ponto_id=ponto_id, origem_sudeste=origem)
+        linhas.append({
+            'escopo': nome,
+            'exato': exato,
+            'estimado': estimado,
+            'erro_relativo': round(abs(estimado - exato) / exato, 4) if exato else 0.0
+        })
+    conn.close()
+    return linhas
+
+
+def resumo_visitantes(aproximado=False):
+    """Visitantes distintos no total e por origem, como exibido no /adm"""
+    if aproximado:
+        total = contar_visitantes_aproximado()
+        # Limitado ao total para não exibir percentual acima de 100% por erro de estimativa
+        sudeste = min(contar_visitantes_aproximado(origem_sudeste=1), total)
+    else:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM visitantes_unicos')
+        total = cursor.fetchone()[0] or 0
+        cursor.execute('SELECT COUNT(*) FROM visitantes_unicos WHERE visitou_sudeste = 1')
+        sudeste = cursor.fetchone()[0] or 0
+        conn.close()
+
+    outros = total - sudeste
+    return {
+        'total_visitantes': total,
+        'visitantes_sudeste': sudeste,
+        'visitantes_outros': outros,
+        'percentual_sudeste': round(sudeste / total * 100, 2) if total else 0.0,
+        'percentual_outros': round(outros / total * 100, 2) if total else 0.0
+    }
+
+
+def visitas_por_periodo(inicio, fim, ponto_id=None):
+    """Visitas e visitantes distintos entre as datas (YYYY-MM-DD, inclusive), por dia e por ponto"""
+    filtro = 'dia BETWEEN ? AND ?'
+    params = [inicio, fim]
+    if ponto_id is not None:
+        filtro = 'ponto_turistico_id = ? AND ' + filtro
+        params.insert(0, ponto_id)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT COUNT(DISTINCT usuario_id),
+               COUNT(DISTINCT CASE WHEN origem_sudeste = 1 THEN usuario_id END)
+        FROM visitantes_ponto_dia
+        WHERE {filtro}
+    ''', params)
+    visitantes, visitantes_sudeste = cursor.fetchone()
+
+    cursor.execute(f'''
+        SELECT dia, COUNT(DISTINCT usuario_id)
+        FROM visitantes_ponto_dia
+        WHERE {filtro}
+        GROUP BY dia
+    ''', params)
+    visitantes_por_dia = dict(cursor.fetchall())
+
+    cursor.execute(f'''
+        SELECT ponto_turistico_id, COUNT(DISTINCT usuario_id)
+        FROM visitantes_ponto_dia
+        WHERE {filtro}
+        GROUP BY ponto_turistico_id
+    ''', params)
+    visitantes_por_ponto = dict(cursor.fetchall())
+
+    cursor.execute(f'''
+        SELECT dia, SUM(visitas)
+        FROM visitas_diarias
+        WHERE {filtro}
+        GROUP BY dia
+        ORDER BY dia
+    ''', params)
+    por_dia = [
+        {'dia': dia, 'visitas': visitas, 'visitantes': visitantes_por_dia.get(dia, 0)}
+        for dia, visitas in cursor.fetchall()
+    ]
+
+    cursor.execute(f'''
+        SELECT d.ponto_turistico_id, pt.nome, SUM(d.visitas)
+        FROM visitas_diarias d
+        LEFT JOIN pontos_turisticos pt ON pt.id = d.ponto_turistico_id
+        WHERE {filtro.replace('ponto_turistico_id', 'd.ponto_turistico_id')}
+        GROUP BY d.ponto_turistico_id
+        ORDER BY SUM(d.visitas) DESC
+    ''', params)
+    por_ponto = [
+        {'ponto_id': row[0], 'nome': row[1], 'visitas': row[2], 'visitantes': visitantes_por_ponto.get(row[0], 0)}
+        for row in cursor.fetchall()
+    ]
+    conn.close()
+
+    return {
+        'inicio': inicio,
+        'fim': fim,
+        'ponto_id': ponto_id,
+        'visitas': sum(item['visitas'] for item in por_dia),
+        'visitantes': visitantes or 0,
+        'visitantes_sudeste': visitantes_sudeste or 0,
+        'por_dia': por_dia,
+        'por_ponto': por_ponto
+    }
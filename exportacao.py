@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from database import get_connection
+
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+# tabela -> colunas sempre exportadas, colunas pessoais (só com pii=True) e coluna de data dos filtros.
+# A senha nunca é exportada.
+EXPORTACOES = {
+    'avaliacoes': {
+        'tabela': 'avaliacoes',
+        'colunas': ('id', 'usuario_id', 'ponto_turistico_id', 'nota', 'comentario', 'data_avaliacao'),
+        'colunas_pii': (),
+        'coluna_data': 'data_avaliacao'
+    },
+    'usuarios': {
+        'tabela': 'usuarios',
+        'colunas': ('id', 'nome', 'data_cadastro'),
+        'colunas_pii': ('email', 'endereco', 'telefone', 'cpf', 'passaporte'),
+        'coluna_data': 'data_cadastro'
+    },
+    'visitas': {
+        'tabela': 'visitas_pontos',
+        'colunas': ('id', 'usuario_id', 'ponto_turistico_id', 'origem_sudeste', 'data_visita'),
+        'colunas_pii': (),
+        'coluna_data': 'data_visita'
+    }
+}
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def _validar_data(valor):
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError("Data inválida. Use o formato AAAA-MM-DD.")
+
+
+def preparar_exportacao(nome, formato='csv', pii=False, desde=None, ate=None, apos_id=None):
+    """Valida os parâmetros e retorna a especificação usada por gerar_exportacao"""
+    if nome not in EXPORTACOES:
+        raise ValueError("Exportação desconhecida.")
+    if formato not in FORMATOS:
+        raise ValueError("Formato inválido. Use csv ou ndjson.")
+    definicao = EXPORTACOES[nome]
+    colunas = definicao['colunas'] + (definicao['colunas_pii'] if pii else ())
+
+    filtros, params = [], []
+    desde = _validar_data(desde)
+    ate = _validar_data(ate)
+    if desde:
+        filtros.append(f"{definicao['coluna_data']} >= ?")
+        params.append(desde)
+    if ate:
+        # Data final inclusiva
+        filtros.append(f"{definicao['coluna_data']} < date(?, '+1 day')")
+        params.append(ate)
+
+    return {
+        'tabela': definicao['tabela'],
+        'colunas': colunas,
+        'formato': formato,
+        'filtros': filtros,
+        'params': params,
+        'apos_id': int(apos_id or 0)
+    }
+
+
+def _linhas(spec, tamanho_lote):
+    """Percorre a tabela em ordem de id, um lote por consulta (sem transação longa aberta)"""
+    sql = (
+        f"SELECT {', '.join(spec['colunas'])} FROM {spec['tabela']} "
+        f"WHERE {' AND '.join(['id > ?'] + spec['filtros'])} ORDER BY id LIMIT ?"
+    )
+    ultimo_id = spec['apos_id']
+    while True:
+        conn = get_connection()
+        lote = conn.execute(sql, [ultimo_id] + spec['params'] + [tamanho_lote]).fetchall()
+        conn.close()
+        if not lote:
+            return
+        yield lote
+        if len(lote) < tamanho_lote:
+            return
+        ultimo_id = lote[-1][0]
+
+
+def gerar_exportacao(spec, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """Gera o arquivo em pedaços de texto, um por lote; a memória não cresce com o total de linhas.
+
+    A primeira coluna é sempre o id: para retomar, use o último id recebido como apos_id.
+    """
+    colunas = spec['colunas']
+    if spec['formato'] == 'csv':
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(colunas)
+        for lote in _linhas(spec, tamanho_lote):
+            escritor.writerows(lote)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        for lote in _linhas(spec, tamanho_lote):
+            yield ''.join(
+                json.dumps(dict(zip(colunas, row)), ensure_ascii=False) + '\n' for row in lote
+            )
@@ -0,0 +1,100 @@
+import math
+
+from database import get_connection
+
+RAIO_TERRA_KM = 6371.0088
+# Derivado do mesmo raio do haversine: com outro valor a caixa fica menor que o círculo
+KM_POR_GRAU_LATITUDE = math.radians(1) * RAIO_TERRA_KM
+RAIO_INICIAL_KM = 5.0
+RAIO_MAXIMO_KM = 20038.0  # meia circunferência: cobre o planeta inteiro
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distância em km pelo círculo máximo"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def caixa_envolvente(latitude, longitude, raio_km):
+    """Retângulo (min_lat, max_lat, min_lon, max_lon) que contém o círculo do raio"""
+    delta_lat = raio_km / KM_POR_GRAU_LATITUDE
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if min_lat <= -90 or max_lat >= 90 or cos_lat <= 1e-9:
+        # Círculo alcança um polo: todas as longitudes
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    delta_lon = raio_km / (KM_POR_GRAU_LATITUDE * cos_lat)
+    if delta_lon >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    min_lon, max_lon = longitude - delta_lon, longitude + delta_lon
+    if min_lon < -180 or max_lon > 180:
+        # Cruza o antimeridiano; simplificação: todas as longitudes
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def _candidatos(cursor, latitude, longitude, raio_km, excluir_id):
+    """Pontos da caixa envolvente do raio com a distância exata, do mais próximo ao mais distante"""
+    min_lat, max_lat, min_lon, max_lon = caixa_envolvente(latitude, longitude, raio_km)
+    cursor.execute('''
+        SELECT pt.id, pt.nome, pt.categoria, pt.cidade, pt.estado, pt.latitude, pt.longitude, pt.imagem
+        FROM pontos_geo g
+        JOIN pontos_turisticos pt ON pt.id = g.id
+        WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?
+          AND g.id != ?
+    ''', (min_lat, max_lat, min_lon, max_lon, excluir_id or 0))
+    resultado = [(haversine_km(latitude, longitude, row[5], row[6]), row) for row in cursor.fetchall()]
+    resultado.sort(key=lambda item: (item[0], item[1][0]))
+    return resultado
+
+
+def pontos_proximos(latitude, longitude, raio_km=None, limite=10, excluir_id=None, raio_maximo_km=RAIO_MAXIMO_KM):
+    """Pontos num raio (km) ou, sem raio, os `limite` mais próximos; ordenados por distância.
+
+    O k-vizinhos amplia o raio em dobro até achar `limite` pontos dentro dele: como a caixa
+    contém o círculo, os encontrados são de fato os mais próximos. Para de crescer quando a
+    caixa já traz o catálogo inteiro ou o raio chega a raio_maximo_km.
+    """
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Coordenadas inválidas.")
+    conn = get_connection()
+    cursor = conn.cursor()
+    if raio_km is not None:
+        # Refinamento exato: a caixa do R*Tree é só um filtro grosso
+        encontrados = [item for item in _candidatos(cursor, latitude, longitude, raio_km, excluir_id)
+                       if item[0] <= raio_km]
+    else:
+        raio = min(RAIO_INICIAL_KM, raio_maximo_km)
+        total = None
+        while True:
+            candidatos = _candidatos(cursor, latitude, longitude, raio, excluir_id)
+            encontrados = [item for item in candidatos if item[0] <= raio]
+            if len(encontrados) >= limite or raio >= raio_maximo_km:
+                break
+            if total is None:
+                cursor.execute('SELECT COUNT(*) FROM pontos_turisticos WHERE id != ?', (excluir_id or 0,))
+                total = cursor.fetchone()[0]
+            if len(candidatos) >= total:
+                # A caixa já trouxe todos os pontos: um raio maior não acharia nenhum outro
+                encontrados = [item for item in candidatos if item[0] <= raio_maximo_km]
+                break
+            raio = min(raio * 2, raio_maximo_km)
+    conn.close()
+
+    return [
+        {
+            'id': row[0],
+            'nome': row[1],
+            'categoria': row[2],
+            'cidade': row[3],
+            'estado': row[4],
+            'latitude': row[5],
+            'longitude': row[6],
+            'imagem': row[7],
+            'distancia_km': round(distancia, 2)
+        }
+        for distancia, row in encontrados[:limite]
+    ]
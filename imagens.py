@@ -0,0 +1,234 @@
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:  # Pillow é opcional: sem ele as imagens são só validadas e renomeadas
+    Image = None
+
+from armazenamento import TAMANHO_HASH, gravar_temporario
+
+logger = logging.getLogger(__name__)
+
+# Variantes geradas para cada envio: maior lado em pixels. A 'completa' usa o nome base.
+VARIANTES = {
+    'miniatura': 320,
+    'card': 640,
+    'completa': 1600
+}
+QUALIDADE_WEBP = 80
+MAX_PIXELS = 40_000_000  # recusa "bombas" de descompressão
+MAX_SUBSTITUTOS = 1024
+
+# Assinaturas (magic bytes) dos formatos aceitos; a extensão e o Content-Type do envio são ignorados
+ASSINATURAS = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+_NOME_PROCESSADO = re.compile(r'^(?P<prefixo>(?:.*/)?)(?P<hash>[0-9a-f]{%d})\.(?P<ext>webp|jpg|png|gif)$' % TAMANHO_HASH)
+
+
+def detectar_formato(cabecalho):
+    """Formato da imagem pelos primeiros bytes; ValueError se não for uma imagem aceita"""
+    for assinatura, formato in ASSINATURAS:
+        if cabecalho.startswith(assinatura):
+            return formato
+    if cabecalho[:4] == b'RIFF' and cabecalho[8:12] == b'WEBP':
+        return 'webp'
+    raise ValueError("Formato de imagem não suportado. Envie JPEG, PNG, GIF ou WebP.")
+
+
+def nome_variante(nome, variante):
+    """Nome do arquivo de uma variante; nomes antigos (fora do pipeline) são devolvidos como estão"""
+    if not nome or variante == 'completa':
+        return nome
+    encontrado = _NOME_PROCESSADO.match(nome)
+    if not encontrado or encontrado.group('ext') != 'webp':
+        return nome
+    return f"{encontrado.group('prefixo')}{encontrado.group('hash')}_{variante}.webp"
+
+
+def _gravar_atomico(pasta, nome, gravar):
+    descritor, temporario = tempfile.mkstemp(dir=pasta, prefix='.variante-')
+    os.close(descritor)
+    try:
+        gravar(temporario)
+        os.replace(temporario, os.path.join(pasta, nome))
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+
+def gerar_variantes(origem, pasta, hash_conteudo):
+    """Gera as variantes WebP sem metadados (EXIF, GPS, ICC) a partir do arquivo original"""
+    with Image.open(origem) as imagem:
+        if imagem.width * imagem.height > MAX_PIXELS:
+            raise ValueError("Imagem grande demais.")
+        # Aplica a rotação do EXIF antes de descartá-lo
+        imagem = ImageOps.exif_transpose(imagem)
+        if imagem.mode not in ('RGB', 'RGBA'):
+            transparente = imagem.mode in ('LA', 'PA') or 'transparency' in imagem.info
+            imagem = imagem.convert('RGBA' if transparente else 'RGB')
+        for variante, lado in VARIANTES.items():
+            copia = imagem.copy()
+            copia.thumbnail((lado, lado), Image.LANCZOS)
+            nome = nome_variante(f'{hash_conteudo}.webp', variante)
+            _gravar_atomico(pasta, nome, lambda caminho: copia.save(
+                caminho, 'WEBP', quality=QUALIDADE_WEBP, method=4))
+
+
+class ProcessadorImagens:
+    """Recebe envios de imagem e gera as variantes num pool de threads.
+
+    enviar() só valida e grava o arquivo recebido (calculando o hash em fluxo) e devolve o
+    nome definitivo, derivado do conteúdo; o redimensionamento roda no pool. Envios repetidos
+    do mesmo arquivo reaproveitam as variantes já geradas.
+
+    Se as variantes não puderem ser geradas, o original é mantido como <hash>.<formato> e
+    ao_falhar(nome, substituto) é chamado para corrigir os registros que já usam o nome;
+    substituto(nome) informa a troca a quem ainda vai gravar o nome.
+    """
+
+    def __init__(self, pasta, max_workers=2, max_pendentes=16, espera=5.0, armazem=None, ao_falhar=None):
+        self.pasta = pasta
+        self.armazem = armazem
+        self.ao_falhar = ao_falhar
+        self._substitutos = OrderedDict()  # nome sem variantes -> original mantido
+        self.espera = espera
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='imagens')
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self._lock = threading.Lock()
+        self._pendentes = set()
+        self._contadores = {'enviadas': 0, 'processadas': 0, 'reaproveitadas': 0, 'falhas': 0, 'tempo_total': 0.0}
+        if Image is None:
+            logger.warning("Pillow não instalado: imagens serão gravadas sem variantes nem remoção de metadados")
+
+    def _receber(self, fluxo):
+        """Grava o envio num arquivo temporário; retorna (caminho, formato, hash)"""
+        cabecalho = fluxo.read(16)
+        formato = detectar_formato(cabecalho)
+        temporario, hash_conteudo = gravar_temporario(fluxo, self.pasta, inicio=cabecalho)
+        return temporario, formato, hash_conteudo
+
+    def _validar(self, caminho):
+        # Lê só o cabeçalho: detecta arquivos corrompidos antes de aceitar o envio
+        try:
+            with Image.open(caminho) as imagem:
+                largura, altura = imagem.size
+        except (UnidentifiedImageError, OSError):
+            raise ValueError("Arquivo de imagem inválido ou corrompido.")
+        if largura * altura > MAX_PIXELS:
+            raise ValueError("Imagem grande demais.")
+
+    def enviar(self, fluxo):
+        """Valida e enfileira um envio; retorna o nome do arquivo (variante completa)"""
+        temporario, formato, hash_conteudo = self._receber(fluxo)
+        try:
+            if Image is None:
+                nome = f'{hash_conteudo}.{formato}'
+                os.replace(temporario, os.path.join(self.pasta, nome))
+                with self._lock:
+                    self._contadores['enviadas'] += 1
+                return nome
+
+            self._validar(temporario)
+            nome = f'{hash_conteudo}.webp'
+            with self._lock:
+                self._contadores['enviadas'] += 1
+                if nome in self._substitutos:
+                    # Já falhou antes com este conteúdo: reaproveita o original mantido
+                    self._contadores['reaproveitadas'] += 1
+                    os.remove(temporario)
+                    return self._substitutos[nome]
+                if hash_conteudo in self._pendentes or os.path.exists(os.path.join(self.pasta, nome)):
+                    self._contadores['reaproveitadas'] += 1
+                    os.remove(temporario)
+                    if self.armazem is not None and hash_conteudo not in self._pendentes:
+                        self.armazem.tocar(nome)
+                    return nome
+            if not self._vagas.acquire(timeout=self.espera):
+                raise ValueError("Muitas imagens em processamento. Tente novamente em instantes.")
+            with self._lock:
+                self._pendentes.add(hash_conteudo)
+            self._executor.submit(self._processar, temporario, hash_conteudo, formato)
+            return nome
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def _processar(self, temporario, hash_conteudo, formato):
+        inicio = time.perf_counter()
+        nome = f'{hash_conteudo}.webp'
+        substituto = None
+        try:
+            gerar_variantes(temporario, self.pasta, hash_conteudo)
+            os.remove(temporario)
+            with self._lock:
+                self._contadores['processadas'] += 1
+        except Exception:
+            logger.exception("Falha ao gerar as variantes da imagem %s; mantendo o original", hash_conteudo)
+            # O temporário é a única cópia do envio: vira o arquivo definitivo, sem variantes
+            substituto = f'{hash_conteudo}.{formato}'
+            os.replace(temporario, os.path.join(self.pasta, substituto))
+            with self._lock:
+                self._contadores['falhas'] += 1
+                self._substitutos[nome] = substituto
+                while len(self._substitutos) > MAX_SUBSTITUTOS:
+                    self._substitutos.popitem(last=False)
+        finally:
+            self._vagas.release()
+            with self._lock:
+                self._pendentes.discard(hash_conteudo)
+                self._contadores['tempo_total'] += time.perf_counter() - inicio
+        if substituto and self.ao_falhar is not None:
+            try:
+                self.ao_falhar(nome, substituto)
+            except Exception:
+                logger.exception("Falha ao trocar %s por %s nos registros", nome, substituto)
+
+    def substituto(self, nome):
+        """Nome a gravar no lugar de nome (aceita prefixo, ex.: 'uploads/'), se as variantes falharam"""
+        if not nome:
+            return nome
+        prefixo, barra, arquivo = nome.rpartition('/')
+        with self._lock:
+            novo = self._substitutos.get(arquivo)
+        return f'{prefixo}{barra}{novo}' if novo else nome
+
+    def processar_arquivo(self, caminho):
+        """Converte um arquivo já existente (ex.: upload antigo) de forma síncrona; retorna o novo nome"""
+        with open(caminho, 'rb') as fluxo:
+            temporario, formato, hash_conteudo = self._receber(fluxo)
+        if Image is None:
+            nome = f'{hash_conteudo}.{formato}'
+            os.replace(temporario, os.path.join(self.pasta, nome))
+            return nome
+        try:
+            if not os.path.exists(os.path.join(self.pasta, f'{hash_conteudo}.webp')):
+                gerar_variantes(temporario, self.pasta, hash_conteudo)
+        finally:
+            os.remove(temporario)
+        return f'{hash_conteudo}.webp'
+
+    def stats(self):
+        with self._lock:
+            contadores = dict(self._contadores)
+            contadores['pendentes'] = len(self._pendentes)
+        tempo_total = contadores.pop('tempo_total')
+        contadores['ms_medio'] = (round(tempo_total / contadores['processadas'] * 1000, 1)
+                                  if contadores['processadas'] else 0.0)
+        contadores['pillow'] = Image is not None
+        return contadores
+
+    def encerrar(self, wait=True):
+        self._executor.shutdown(wait=wait)
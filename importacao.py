@@ -0,0 +1,187 @@
+import csv
+import io
+import json
+import time
+
+from categorias import map_categoria_para_filtro
+from database import get_connection, parse_estado_cidade, write_transaction
+
+TAMANHO_LOTE_IMPORTACAO = 500
+# Nomes por consulta IN (...): fica abaixo do limite de variáveis do SQLite para qualquer lote
+NOMES_POR_CONSULTA = 500
+MAX_ERROS_RELATADOS = 50
+
+CAMPOS_OBRIGATORIOS = ('nome', 'descricao', 'endereco', 'latitude', 'longitude', 'categoria')
+CAMPOS_OPCIONAIS = ('imagem', 'horario_funcionamento', 'preco_entrada', 'telefone_contato', 'site_oficial')
+
+# Upsert pelo nome (UNIQUE). Os triggers mantêm busca FTS e agregados; campos opcionais
+# ausentes no arquivo (NULL) não apagam o valor já cadastrado.
+UPSERT_PONTO = '''
+    INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, categoria,
+                                   imagem, horario_funcionamento, preco_entrada, telefone_contato,
+                                   site_oficial, estado, cidade, categoria_filtro)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (nome) DO UPDATE SET
+        descricao = excluded.descricao,
+        endereco = excluded.endereco,
+        latitude = excluded.latitude,
+        longitude = excluded.longitude,
+        categoria = excluded.categoria,
+        imagem = COALESCE(excluded.imagem, pontos_turisticos.imagem),
+        horario_funcionamento = COALESCE(excluded.horario_funcionamento, pontos_turisticos.horario_funcionamento),
+        preco_entrada = COALESCE(excluded.preco_entrada, pontos_turisticos.preco_entrada),
+        telefone_contato = COALESCE(excluded.telefone_contato, pontos_turisticos.telefone_contato),
+        site_oficial = COALESCE(excluded.site_oficial, pontos_turisticos.site_oficial),
+        estado = excluded.estado,
+        cidade = excluded.cidade,
+        categoria_filtro = excluded.categoria_filtro
+'''
+
+
+def formato_do_arquivo(nome_arquivo, formato=None):
+    formato = (formato or nome_arquivo.rsplit('.', 1)[-1]).lower()
+    if formato not in ('csv', 'json', 'ndjson', 'jsonl'):
+        raise ValueError("Formato inválido. Use csv, json ou ndjson.")
+    return 'ndjson' if formato == 'jsonl' else formato
+
+
+def ler_registros(arquivo, formato):
+    """Gera (linha, registro) a partir de um arquivo texto; CSV e NDJSON são lidos em fluxo"""
+    if formato == 'csv':
+        for linha, registro in enumerate(csv.DictReader(arquivo), start=2):
+            yield linha, registro
+    elif formato == 'ndjson':
+        for linha, texto in enumerate(arquivo, start=1):
+            if texto.strip():
+                try:
+                    yield linha, json.loads(texto)
+                except ValueError:
+                    yield linha, None
+    else:
+        try:
+            registros = json.load(arquivo)
+        except ValueError:
+            raise ValueError("JSON inválido.")
+        if not isinstance(registros, list):
+            raise ValueError("O JSON deve ser uma lista de pontos turísticos.")
+        for linha, registro in enumerate(registros, start=1):
+            yield linha, registro
+
+
+def abrir_texto(fluxo_binario):
+    """Adapta um arquivo binário (ex.: upload) para leitura de texto UTF-8 em fluxo"""
+    return io.TextIOWrapper(fluxo_binario, encoding='utf-8-sig', newline='')
+
+
+def _texto(valor):
+    # 0 e 0.0 são coordenadas válidas no JSON: só a ausência (None) vira texto vazio
+    return ('' if valor is None else str(valor)).strip()
+
+
+def validar_ponto(registro):
+    """Normaliza um registro do arquivo; levanta ValueError com o motivo se for inválido"""
+    if not isinstance(registro, dict):
+        raise ValueError("registro mal formado")
+    valores = {campo: _texto(registro.get(campo)) for campo in CAMPOS_OBRIGATORIOS}
+    faltando = [campo for campo, valor in valores.items() if not valor]
+    if faltando:
+        raise ValueError(f"campos obrigatórios ausentes: {', '.join(faltando)}")
+    try:
+        latitude = float(valores['latitude'].replace(',', '.'))
+        longitude = float(valores['longitude'].replace(',', '.'))
+    except ValueError:
+        raise ValueError("latitude/longitude devem ser numéricas")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("latitude/longitude fora do intervalo válido")
+
+    opcionais = {campo: _texto(registro.get(campo)) or None for campo in CAMPOS_OPCIONAIS}
+    estado, cidade = parse_estado_cidade(valores['endereco'])
+    return {
+        'nome': valores['nome'],
+        'descricao': valores['descricao'],
+        'endereco': valores['endereco'],
+        'latitude': latitude,
+        'longitude': longitude,
+        'categoria': valores['categoria'],
+        **opcionais,
+        'estado': estado,
+        'cidade': cidade,
+        'categoria_filtro': map_categoria_para_filtro(valores['categoria'], valores['nome'], valores['descricao'])
+    }
+
+
+def _gravar_lote(lote, simular, simulados):
+    """Grava um lote (upsert por nome); retorna (inseridos, atualizados)"""
+    # Último registro de cada nome vence, como aconteceria com upserts sucessivos
+    por_nome = {ponto['nome']: ponto for ponto in lote}
+    nomes = list(por_nome)
+
+    def existentes(conn):
+        encontrados = set()
+        for inicio in range(0, len(nomes), NOMES_POR_CONSULTA):
+            parte = nomes[inicio:inicio + NOMES_POR_CONSULTA]
+            cursor = conn.execute(
+                f"SELECT nome FROM pontos_turisticos WHERE nome IN ({','.join(['?'] * len(parte))})", parte)
+            encontrados.update(row[0] for row in cursor.fetchall())
+        return encontrados
+
+    if simular:
+        conn = get_connection()
+        ja_cadastrados = existentes(conn) | (simulados & set(nomes))
+        conn.close()
+        # Nomes "inseridos" em lotes anteriores da simulação contam como atualização depois
+        simulados.update(nomes)
+        return len(nomes) - len(ja_cadastrados), len(ja_cadastrados)
+
+    with write_transaction() as conn:
+        ja_cadastrados = existentes(conn)
+        conn.executemany(UPSERT_PONTO, [
+            (
+                ponto['nome'], ponto['descricao'], ponto['endereco'], ponto['latitude'], ponto['longitude'],
+                ponto['categoria'],
+                ponto['imagem'] or (None if ponto['nome'] in ja_cadastrados else 'default.jpg'),
+                ponto['horario_funcionamento'], ponto['preco_entrada'], ponto['telefone_contato'],
+                ponto['site_oficial'], ponto['estado'], ponto['cidade'], ponto['categoria_filtro']
+            )
+            for ponto in por_nome.values()
+        ])
+    return len(nomes) - len(ja_cadastrados), len(ja_cadastrados)
+
+
+def importar_pontos(registros, lote=TAMANHO_LOTE_IMPORTACAO, simular=False):
+    """Valida e grava (linha, registro) em lotes, cada um numa transação; retorna o relatório.
+
+    Com simular=True nada é gravado: o relatório mostra o que seria inserido ou atualizado.
+    """
+    inicio = time.perf_counter()
+    relatorio = {'lidos': 0, 'validos': 0, 'invalidos': 0, 'inseridos': 0, 'atualizados': 0,
+                 'lotes': 0, 'simulacao': simular, 'erros': []}
+    pendentes = []
+    simulados = set()
+
+    def descarregar():
+        inseridos, atualizados = _gravar_lote(pendentes, simular, simulados)
+        relatorio['inseridos'] += inseridos
+        relatorio['atualizados'] += atualizados
+        relatorio['lotes'] += 1
+        pendentes.clear()
+
+    for linha, registro in registros:
+        relatorio['lidos'] += 1
+        try:
+            pendentes.append(validar_ponto(registro))
+        except ValueError as exc:
+            relatorio['invalidos'] += 1
+            if len(relatorio['erros']) < MAX_ERROS_RELATADOS:
+                relatorio['erros'].append({'linha': linha, 'erro': str(exc)})
+            continue
+        relatorio['validos'] += 1
+        if len(pendentes) >= lote:
+            descarregar()
+    if pendentes:
+        descarregar()
+
+    segundos = time.perf_counter() - inicio
+    relatorio['segundos'] = round(segundos, 3)
+    relatorio['registros_por_segundo'] = round(relatorio['lidos'] / segundos, 1) if segundos else None
+    return relatorio
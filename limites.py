@@ -0,0 +1,227 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Contador de janela deslizante aproximado: guarda só a contagem da janela fixa atual e da
+# anterior por chave, e estima a janela deslizante ponderando a anterior pela fração que
+# ainda se sobrepõe. Memória constante por chave, sem lista de timestamps.
+
+
+def _estimar(inicio, atual, anterior, janela, agora):
+    inicio_atual = agora // janela * janela
+    if inicio == inicio_atual:
+        recente, antiga = atual, anterior
+    elif inicio == inicio_atual - janela:
+        recente, antiga = 0, atual
+    else:
+        return 0.0
+    peso = 1 - (agora - inicio_atual) / janela
+    return recente + antiga * peso
+
+
+def _espera(inicio, atual, anterior, janela, agora, limite):
+    """Segundos até a estimativa cair abaixo do limite (aproximação)"""
+    inicio_atual = agora // janela * janela
+    if inicio != inicio_atual:
+        return 1
+    if atual >= limite:
+        return max(1, int(inicio_atual + janela - agora) + 1)
+    # A contagem antiga perde peso linearmente: tempo até sobrar limite - atual - 1
+    excedente = anterior - (limite - atual - 1)
+    return max(1, int(excedente / anterior * janela - (agora - inicio_atual)) + 1) if anterior else 1
+
+
+class ArmazemMemoria:
+    """Contadores no processo; descarta as chaves menos usadas acima de max_chaves"""
+
+    def __init__(self, max_chaves=100000):
+        self.max_chaves = max_chaves
+        self._janelas = OrderedDict()  # chave -> [inicio, atual, anterior]
+        self._lock = threading.Lock()
+
+    def _contadores(self, chave, janela, agora):
+        inicio_atual = int(agora // janela * janela)
+        item = self._janelas.get(chave)
+        if item is None:
+            return [inicio_atual, 0, 0]
+        inicio, atual, anterior = item
+        if inicio == inicio_atual:
+            return item
+        return [inicio_atual, 0, atual if inicio == inicio_atual - janela else 0]
+
+    def consultar(self, chave, janela, agora):
+        with self._lock:
+            return tuple(self._contadores(chave, janela, agora))
+
+    def incrementar(self, chave, janela, agora):
+        with self._lock:
+            item = self._contadores(chave, janela, agora)
+            item[1] += 1
+            self._janelas[chave] = item
+            self._janelas.move_to_end(chave)
+            while len(self._janelas) > self.max_chaves:
+                self._janelas.popitem(last=False)
+            return tuple(item)
+
+    def limpar(self, chave):
+        with self._lock:
+            self._janelas.pop(chave, None)
+
+    def stats(self):
+        with self._lock:
+            return {'tipo': 'memoria', 'chaves': len(self._janelas)}
+
+
+class ArmazemSQLite:
+    """Contadores num arquivo SQLite próprio, compartilhado entre processos (vários workers).
+
+    Cada incremento é um único UPSERT atômico; o arquivo é separado do banco principal para
+    não disputar a fila de escrita da aplicação.
+    """
+
+    LIMPEZA_A_CADA = 1000
+
+    def __init__(self, caminho, timeout=1.0):
+        self.caminho = caminho
+        self.timeout = timeout
+        self._local = threading.local()
+        self._operacoes = 0
+        conn = self._conexao()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS limites_taxa (
+                chave TEXT PRIMARY KEY,
+                inicio INTEGER NOT NULL,
+                atual INTEGER NOT NULL,
+                anterior INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            self._local.conn = conn
+        return conn
+
+    def consultar(self, chave, janela, agora):
+        row = self._conexao().execute(
+            'SELECT inicio, atual, anterior FROM limites_taxa WHERE chave = ?', (chave,)
+        ).fetchone()
+        if row is None:
+            return int(agora // janela * janela), 0, 0
+        return row
+
+    def incrementar(self, chave, janela, agora):
+        inicio_atual = int(agora // janela * janela)
+        # No UPDATE, as colunas à direita valem o conteúdo antigo da linha
+        row = self._conexao().execute('''
+            INSERT INTO limites_taxa (chave, inicio, atual, anterior) VALUES (?, ?, 1, 0)
+            ON CONFLICT (chave) DO UPDATE SET
+                anterior = CASE
+                    WHEN inicio = excluded.inicio THEN anterior
+                    WHEN inicio = excluded.inicio - ? THEN atual
+                    ELSE 0 END,
+                atual = CASE WHEN inicio = excluded.inicio THEN atual + 1 ELSE 1 END,
+                inicio = excluded.inicio
+            RETURNING inicio, atual, anterior
+        ''', (chave, inicio_atual, int(janela))).fetchone()
+        self._operacoes += 1
+        if self._operacoes % self.LIMPEZA_A_CADA == 0:
+            # Janelas com mais de um dia não influenciam nenhuma regra configurada
+            self._conexao().execute('DELETE FROM limites_taxa WHERE inicio < ?', (int(agora) - 86400,))
+        return row
+
+    def limpar(self, chave):
+        self._conexao().execute('DELETE FROM limites_taxa WHERE chave = ?', (chave,))
+
+    def stats(self):
+        chaves = self._conexao().execute('SELECT COUNT(*) FROM limites_taxa').fetchone()[0]
+        return {'tipo': 'sqlite', 'chaves': chaves}
+
+
+class BaldeFichas:
+    """Token bucket por chave (no processo): absorve rajadas curtas acima da taxa média"""
+
+    def __init__(self, capacidade=5, por_segundo=1.0, max_chaves=100000):
+        self.capacidade = capacidade
+        self.por_segundo = por_segundo
+        self.max_chaves = max_chaves
+        self._baldes = OrderedDict()  # chave -> [fichas, atualizado_em]
+        self._lock = threading.Lock()
+
+    def consumir(self, chave, agora=None):
+        """Retira uma ficha; retorna 0 se permitido ou os segundos até a próxima ficha"""
+        agora = time.monotonic() if agora is None else agora
+        with self._lock:
+            fichas, atualizado = self._baldes.pop(chave, (self.capacidade, agora))
+            fichas = min(self.capacidade, fichas + (agora - atualizado) * self.por_segundo)
+            espera = 0
+            if fichas >= 1:
+                fichas -= 1
+            else:
+                espera = max(1, int((1 - fichas) / self.por_segundo) + 1)
+            self._baldes[chave] = (fichas, agora)
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+            return espera
+
+
+class LimitadorTaxa:
+    """Regras nomeadas (limite por janela em segundos) aplicadas por chave, ex.: IP ou usuário.
+
+    permitir() conta a tentativa e diz se passou; bloqueado() só consulta, para regras que
+    contam apenas falhas (registradas depois com registrar()).
+    """
+
+    def __init__(self, regras, armazem=None, rajada=None):
+        self.regras = dict(regras)  # nome -> (limite, janela)
+        self.armazem = armazem or ArmazemMemoria()
+        self.rajada = rajada
+        self._lock = threading.Lock()
+        self._recusas = {nome: 0 for nome in self.regras}
+        self._recusas['rajada'] = 0
+
+    def _recusar(self, nome):
+        with self._lock:
+            self._recusas[nome] += 1
+
+    def permitir(self, nome, chave):
+        """Conta a tentativa; retorna 0 se permitida ou os segundos sugeridos de espera"""
+        if self.rajada is not None:
+            espera = self.rajada.consumir(f'{nome}:{chave}')
+            if espera:
+                self._recusar('rajada')
+                return espera
+        limite, janela = self.regras[nome]
+        agora = time.time()
+        inicio, atual, anterior = self.armazem.incrementar(f'{nome}:{chave}', janela, agora)
+        if _estimar(inicio, atual, anterior, janela, agora) > limite:
+            self._recusar(nome)
+            return _espera(inicio, atual, anterior, janela, agora, limite + 1)
+        return 0
+
+    def bloqueado(self, nome, chave):
+        """Consulta sem contar; retorna 0 ou os segundos sugeridos de espera"""
+        limite, janela = self.regras[nome]
+        agora = time.time()
+        inicio, atual, anterior = self.armazem.consultar(f'{nome}:{chave}', janela, agora)
+        if _estimar(inicio, atual, anterior, janela, agora) >= limite:
+            self._recusar(nome)
+            return _espera(inicio, atual, anterior, janela, agora, limite)
+        return 0
+
+    def registrar(self, nome, chave):
+        limite, janela = self.regras[nome]
+        self.armazem.incrementar(f'{nome}:{chave}', janela, time.time())
+
+    def limpar(self, nome, chave):
+        self.armazem.limpar(f'{nome}:{chave}')
+
+    def stats(self):
+        with self._lock:
+            recusas = dict(self._recusas)
+        return {'armazem': self.armazem.stats(), 'recusas': recusas}
@@ -1,61 +1,316 @@
-from flask import Flask, render_template, redirect, request, flash, get_flashed_messages, session, url_for, jsonify
+from flask import (Flask, render_template, redirect, request, flash, get_flashed_messages, session, url_for, jsonify,
+                   Response, stream_with_context, g, send_from_directory)
+import atexit
+import click
+import mimetypes
 import sqlite3
 import os
-import hashlib
 import time
 from datetime import datetime
-import unicodedata
 import re
-import json
-from urllib import request as urlrequest, error as urlerror
-from werkzeug.utils import secure_filename
-from database import init_database, get_connection
+from database import (init_app, init_database, get_connection, write_transaction, get_pool_stats,
+                      get_writer_stats, check_query_plans, rebuild_rating_aggregates, parse_estado_cidade,
+                      fts_match_expression, rebuild_search_index, rebuild_geo_index, FTS_WEIGHTS)
+from texto import normalize_text
+from categorias import DEFAULT_FILTER_CATEGORY, map_categoria_para_filtro, reclassificar_pontos, comparar_classificadores
+from sugestoes import IndicePrefixos
+from cache import CacheLRU
+from cep import CacheCEP, DisjuntorCircuito, ResolvedorEnderecos, sanitize_cep
+from senhas import ServicoSenhas, FilaDeHashCheia, medir_logins_por_segundo
+from limites import ArmazemMemoria, ArmazemSQLite, BaldeFichas, LimitadorTaxa
+from imagens import VARIANTES, ProcessadorImagens, nome_variante
+from armazenamento import ArmazemUploads
+from estaticos import ManifestoEstaticos, CACHE_IMUTAVEL, EXTENSOES_COMPRIMIVEIS
+from visitas import BufferVisitas
+from estatisticas import (atualizar_rollups, reconstruir_rollups, atualizar_sketches, reconstruir_sketches,
+                          resumo_visitantes, visitas_por_periodo, contar_visitantes_aproximado,
+                          comparar_sketches_com_exato)
+from hyperloglog import relatorio_precisao
+from paginacao import buscar_pagina, decodificar_cursor, tamanho_pagina
+from exportacao import FORMATOS, preparar_exportacao, gerar_exportacao
+from importacao import abrir_texto, formato_do_arquivo, importar_pontos, ler_registros
+from geo import pontos_proximos
 from collections import defaultdict
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'turismo_sudeste_2024'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['DATABASE'] = 'turismo.db'
+app.config['DB_POOL_MAX_SIZE'] = 8
+app.config['DB_JOURNAL_MODE'] = 'WAL'
+app.config['DB_SYNCHRONOUS'] = 'NORMAL'
+app.config['DB_CACHE_SIZE'] = -16000  # KiB
+app.config['DB_MMAP_SIZE'] = 128 * 1024 * 1024
+# Idade máxima do índice de sugestões; garante que edições feitas em outro processo apareçam
+app.config['SUGESTOES_RECARGA_SEGUNDOS'] = 300
+# Consulta de CEP (a URL pode apontar para um servidor local em testes)
+app.config['VIACEP_URL'] = 'https://viacep.com.br/ws/{cep}/json/'
+app.config['CEP_TTL'] = 30 * 24 * 3600
+app.config['CEP_TTL_NEGATIVO'] = 24 * 3600
+# Resolução do CEP do login em segundo plano e circuit breaker do ViaCEP
+app.config['CEP_WORKERS'] = 4
+app.config['CEP_MAX_PENDENTES'] = 100
+app.config['CEP_TENTATIVAS'] = 3
+app.config['CEP_DISJUNTOR_FALHAS'] = 5
+app.config['CEP_DISJUNTOR_RECUPERACAO'] = 30
+# Gravação em lote das visitas às páginas de detalhe
+app.config['VISITAS_TAMANHO_LOTE'] = 200
+app.config['VISITAS_INTERVALO'] = 2.0
+app.config['VISITAS_MAX_PENDENTES'] = 10000
+# Totais de visitantes do /adm estimados por HyperLogLog (custo constante) em vez de contagem exata
+app.config['VISITANTES_APROXIMADOS'] = True
+# Hash de senhas: esquema ('pbkdf2_sha256' ou 'scrypt'), custo e pool de threads do cálculo
+app.config['SENHA_ESQUEMA'] = 'pbkdf2_sha256'
+app.config['SENHA_PBKDF2_ITERACOES'] = 600000
+app.config['SENHA_SCRYPT_N'] = 2 ** 14
+app.config['SENHA_WORKERS'] = 2
+app.config['SENHA_MAX_PENDENTES'] = 32
+# Limites de tentativas: (quantidade, janela em segundos). Login por IP conta toda tentativa;
+# por usuário, só as falhas. LIMITES_ARMAZEM aponta um SQLite compartilhado entre workers
+# (None = contadores em memória, por processo)
+app.config['LIMITE_LOGIN_IP'] = (30, 60)
+app.config['LIMITE_LOGIN_USUARIO'] = (5, 900)
+app.config['LIMITE_CADASTRO_IP'] = (10, 3600)
+app.config['LIMITE_RAJADA'] = (5, 1.0)  # fichas, reposição por segundo
+app.config['LIMITES_ARMAZEM'] = None
+# Pool que gera as variantes (miniatura, card, completa) das imagens enviadas
+app.config['IMAGENS_WORKERS'] = 2
+app.config['IMAGENS_MAX_PENDENTES'] = 16
+# Uploads sem referência no banco só são removidos depois desta carência (segundos)
+app.config['UPLOADS_CARENCIA'] = 3600
+# Confere a data dos estáticos a cada url_for (útil em desenvolvimento); senão o hash vale até reiniciar
+app.config['ESTATICOS_REVALIDAR'] = False
+# Cache dos dados do usuário logado (cabeçalho das páginas)
+app.config['CACHE_USUARIOS_TTL'] = 60
+app.config['CACHE_USUARIOS_MAX_ITENS'] = 1024
+# Cache dos dados da página inicial e do dashboard
+app.config['CACHE_PAGINAS_TTL'] = 300
+app.config['CACHE_PAGINAS_MAX_ITENS'] = 64
+# Quanto a média de avaliações reforça a relevância BM25 na busca (0 = só relevância)
+app.config['BUSCA_PESO_AVALIACAO'] = 0.5
+# Distância máxima dos "pontos próximos" mostrados na página de detalhe
+app.config['PROXIMOS_RAIO_MAXIMO_KM'] = 200
 
 # Criar pasta de uploads se não existir
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Inicializar banco de dados
-init_database()
+# Hashes de senha calculados fora das threads de requisição, com fila limitada
+servico_senhas = ServicoSenhas(
+    max_workers=app.config['SENHA_WORKERS'],
+    max_pendentes=app.config['SENHA_MAX_PENDENTES'],
+    esquema=app.config['SENHA_ESQUEMA'],
+    iteracoes=app.config['SENHA_PBKDF2_ITERACOES'],
+    n=app.config['SENHA_SCRYPT_N']
+)
+atexit.register(servico_senhas.encerrar, wait=False)
+
+# Hash de uma senha aleatória no mesmo esquema: nome desconhecido também paga uma
+# verificação, para o tempo de resposta não revelar quais usuários existem
+SENHA_FICTICIA = servico_senhas.gerar(os.urandom(16).hex())
+
+# Inicializar banco de dados e pool de conexões (o admin recebe o hash no esquema configurado)
+init_app(app)
+init_database(parametros_senha=servico_senhas.parametros)
+
+# Índice de prefixos do autocompletar, mantido em memória
+indice_sugestoes = IndicePrefixos(limite=8)
+
+
+def carregar_indice_sugestoes():
+    """(Re)constrói o índice de sugestões a partir de pontos_turisticos"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, nome, categoria, endereco, cidade FROM pontos_turisticos')
+    pontos = [
+        {'id': row[0], 'nome': row[1], 'categoria': row[2], 'endereco': row[3], 'cidade': row[4]}
+        for row in cursor.fetchall()
+    ]
+    conn.close()
+    indice_sugestoes.reconstruir(pontos)
+
+
+carregar_indice_sugestoes()
+
+# Dados de página que não dependem do usuário; invalidados pelas tags 'catalogo'
+# (pontos turísticos) e 'avaliacoes'
+cache_paginas = CacheLRU(max_itens=app.config['CACHE_PAGINAS_MAX_ITENS'], ttl=app.config['CACHE_PAGINAS_TTL'])
+
+# Cache de CEPs (memória + SQLite) na frente do ViaCEP
+cep_cache = CacheCEP(
+    url=app.config['VIACEP_URL'],
+    ttl=app.config['CEP_TTL'],
+    ttl_negativo=app.config['CEP_TTL_NEGATIVO'],
+    disjuntor=DisjuntorCircuito(
+        limite_falhas=app.config['CEP_DISJUNTOR_FALHAS'],
+        tempo_recuperacao=app.config['CEP_DISJUNTOR_RECUPERACAO']
+    )
+)
+
+# Dados do usuário por id; a tag 'usuario:<id>' é invalidada quando o cadastro muda
+cache_usuarios = CacheLRU(max_itens=app.config['CACHE_USUARIOS_MAX_ITENS'], ttl=app.config['CACHE_USUARIOS_TTL'])
+
+
+def invalidar_cache_usuario(usuario_id):
+    cache_usuarios.invalidar(f'usuario:{usuario_id}')
+
+
+# O endereço do usuário é atualizado a partir do CEP depois que o login já respondeu
+resolvedor_enderecos = ResolvedorEnderecos(
+    cep_cache,
+    max_workers=app.config['CEP_WORKERS'],
+    max_pendentes=app.config['CEP_MAX_PENDENTES'],
+    tentativas=app.config['CEP_TENTATIVAS'],
+    ao_atualizar=invalidar_cache_usuario
+)
+atexit.register(resolvedor_enderecos.encerrar, wait=False)
+atexit.register(cep_cache.encerrar, wait=False)
+
+# Visitas são enfileiradas na requisição e gravadas em lote por uma thread própria
+buffer_visitas = BufferVisitas(
+    tamanho_lote=app.config['VISITAS_TAMANHO_LOTE'],
+    intervalo=app.config['VISITAS_INTERVALO'],
+    max_pendentes=app.config['VISITAS_MAX_PENDENTES']
+)
+atexit.register(buffer_visitas.encerrar)
+
+# A variante 'completa' usa o nome base
+armazem_uploads = ArmazemUploads(app.config['UPLOAD_FOLDER'], carencia=app.config['UPLOADS_CARENCIA'],
+                                 variantes=[variante for variante in VARIANTES if variante != 'completa'])
+
+def usar_imagem_sem_variantes(nome, substituto):
+    """As variantes falharam: os registros que já gravaram o nome passam a usar o original"""
+    with write_transaction() as write_conn:
+        write_conn.execute('UPDATE pontos_turisticos SET imagem = ? WHERE imagem = ?', (substituto, nome))
+        write_conn.execute('UPDATE usuarios SET foto_perfil = ? WHERE foto_perfil = ?',
+                           (f'uploads/{substituto}', f'uploads/{nome}'))
+    invalidar_cache_catalogo()
+    cache_usuarios.limpar()
+
+processador_imagens = ProcessadorImagens(
+    app.config['UPLOAD_FOLDER'],
+    max_workers=app.config['IMAGENS_WORKERS'],
+    max_pendentes=app.config['IMAGENS_MAX_PENDENTES'],
+    armazem=armazem_uploads,
+    ao_falhar=usar_imagem_sem_variantes
+)
+atexit.register(processador_imagens.encerrar)
+
+@app.template_filter('variante')
+def filtro_variante(nome, variante='card'):
+    """Nos templates: {{ ponto.imagem|variante('miniatura') }}"""
+    return nome_variante(nome, variante)
+
+manifesto_estaticos = ManifestoEstaticos(app.static_folder, revalidar=app.config['ESTATICOS_REVALIDAR'])
+
+@app.url_defaults
+def impressao_estaticos(endpoint, values):
+    """url_for('static', ...) gera o nome com a impressão digital do conteúdo"""
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = manifesto_estaticos.url(values['filename'])
+
+def servir_estatico(filename):
+    """Substitui a rota static: cache imutável para nomes com impressão e pré-comprimidos .br/.gz"""
+    arquivo, imutavel = manifesto_estaticos.resolver(filename)
+    # Sem impressão (max_age None): no-cache, o navegador revalida com o ETag e recebe 304
+    max_age = CACHE_IMUTAVEL if imutavel else None
+    comprimido, codificacao = manifesto_estaticos.pre_comprimido(arquivo, request.accept_encodings)
+    if comprimido:
+        resposta = send_from_directory(app.static_folder, comprimido, max_age=max_age,
+                                       mimetype=mimetypes.guess_type(arquivo)[0] or 'application/octet-stream')
+        resposta.headers['Content-Encoding'] = codificacao
+    else:
+        resposta = send_from_directory(app.static_folder, arquivo, max_age=max_age)
+    if arquivo.endswith(EXTENSOES_COMPRIMIVEIS):
+        resposta.vary.add('Accept-Encoding')
+    if imutavel:
+        resposta.cache_control.immutable = True
+    return resposta
+
+app.view_functions['static'] = servir_estatico
+
+# Recusa tentativas em excesso antes de qualquer consulta, hash ou chamada externa
+limitador = LimitadorTaxa(
+    regras={
+        'login_ip': app.config['LIMITE_LOGIN_IP'],
+        'login_usuario': app.config['LIMITE_LOGIN_USUARIO'],
+        'cadastro_ip': app.config['LIMITE_CADASTRO_IP']
+    },
+    armazem=(ArmazemSQLite(app.config['LIMITES_ARMAZEM']) if app.config['LIMITES_ARMAZEM']
+             else ArmazemMemoria()),
+    rajada=BaldeFichas(*app.config['LIMITE_RAJADA'])
+)
+
+def recusar_tentativa(espera):
+    """Resposta para tentativas acima do limite, com Retry-After"""
+    flash(f"Muitas tentativas. Tente novamente em {espera} segundos.")
+    resposta = redirect(url_for('login'))
+    resposta.headers['Retry-After'] = str(espera)
+    return resposta
 
 def hash_password(password):
-    """Criptografa a senha"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Criptografa a senha (com salt, no esquema configurado)"""
+    return servico_senhas.gerar(password)
 
 def is_logged_in():
     """Verifica se o usuário está logado"""
     return 'user_id' in session
 
-def get_current_user():
-    """Retorna dados do usuário atual"""
-    if not is_logged_in():
-        return None
-    
+def carregar_usuario(usuario_id):
+    """Lê o cadastro do usuário (sem a senha)"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM usuarios WHERE id = ?', (session['user_id'],))
+    cursor.execute('''
+        SELECT id, nome, email, endereco, telefone, cpf, passaporte, foto_perfil
+        FROM usuarios WHERE id = ?
+    ''', (usuario_id,))
     user = cursor.fetchone()
     conn.close()
-    
+
     if user:
         return {
             'id': user[0],
             'nome': user[1],
             'email': user[2],
-            'endereco': user[4],
-            'telefone': user[5],
-            'cpf': user[6],
-            'passaporte': user[7],
-            'foto_perfil': user[8],
-            'is_admin': session.get('is_admin', False)
+            'endereco': user[3],
+            'telefone': user[4],
+            'cpf': user[5],
+            'passaporte': user[6],
+            'foto_perfil': user[7]
         }
     return None
 
+def get_current_user():
+    """Retorna dados do usuário atual"""
+    if not is_logged_in():
+        return None
+
+    # Memo da requisição: várias chamadas na mesma página não repetem nem a consulta ao cache
+    if '_usuario_atual' in g:
+        return g._usuario_atual
+
+    usuario_id = session['user_id']
+    # A versão gravada na sessão muda a cada login/atualização de perfil, então outros
+    # processos não servem uma cópia anterior mesmo antes do TTL expirar
+    chave = (usuario_id, session.get('usuario_versao', 0))
+    dados = cache_usuarios.get_or_set(chave, lambda: carregar_usuario(usuario_id),
+                                      tags=(f'usuario:{usuario_id}',))
+
+    user = dict(dados, is_admin=session.get('is_admin', False)) if dados else None
+    g._usuario_atual = user
+    return user
+
+def iniciar_sessao(usuario_id, is_admin):
+    session['user_id'] = usuario_id
+    session['is_admin'] = is_admin
+    marcar_usuario_alterado(usuario_id)
+
+def marcar_usuario_alterado(usuario_id):
+    """Descarta o cadastro em cache (neste processo e, pela versão da sessão, nos demais)"""
+    invalidar_cache_usuario(usuario_id)
+    session['usuario_versao'] = time.time_ns()
+    g.pop('_usuario_atual', None)
+
 
 def fetch_recent_reviews(cursor, ponto_ids, limite=5):
     """Busca avaliações recentes dos clientes para uma lista de pontos turísticos."""
@@ -113,54 +368,60 @@ def attach_recent_reviews(cursor, pontos, limite=5):
         ponto['avaliacoes'] = avaliacoes_por_ponto.get(ponto['id'], [])
 
 
-def carregar_pontos_por_estado(cursor, limite=5, incluir_avaliacoes=True):
-    estados = ['RJ', 'SP', 'MG', 'ES']
-    pontos_por_estado = {}
-    todos_pontos = []
+ESTADOS_SUDESTE = ['RJ', 'SP', 'MG', 'ES']
 
-    for estado in estados:
-        cursor.execute('''
+
+def carregar_pontos_por_estado(cursor, limite=5, incluir_avaliacoes=True):
+    pontos_por_estado = {estado: [] for estado in ESTADOS_SUDESTE}
+    placeholders = ','.join(['?'] * len(ESTADOS_SUDESTE))
+
+    # Top-N de cada estado numa única consulta, usando o índice de estado
+    cursor.execute(f'''
+        SELECT id, nome, descricao, endereco, latitude, longitude, imagem, categoria,
+               horario_funcionamento, preco_entrada, telefone_contato, site_oficial, data_cadastro,
+               media_avaliacoes, total_avaliacoes, estado, cidade, categoria_filtro
+        FROM (
             SELECT pt.id, pt.nome, pt.descricao, pt.endereco, pt.latitude, pt.longitude, 
                    pt.imagem, pt.categoria, pt.horario_funcionamento, pt.preco_entrada, 
                    pt.telefone_contato, pt.site_oficial, pt.data_cadastro,
-                   COALESCE(ROUND(AVG(a.nota), 1), 0) as media_avaliacoes,
-                   COUNT(a.id) as total_avaliacoes
+                   ag.media_avaliacoes, ag.total_avaliacoes, pt.estado, pt.cidade, pt.categoria_filtro,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY pt.estado
+                       ORDER BY ag.media_avaliacoes DESC, ag.total_avaliacoes DESC, pt.nome
+                   ) AS posicao
             FROM pontos_turisticos pt
-            LEFT JOIN avaliacoes a ON pt.id = a.ponto_turistico_id
-            WHERE pt.endereco LIKE ?
-            GROUP BY pt.id, pt.nome, pt.descricao, pt.endereco, pt.latitude, pt.longitude, 
-                     pt.imagem, pt.categoria, pt.horario_funcionamento, pt.preco_entrada, 
-                     pt.telefone_contato, pt.site_oficial, pt.data_cadastro
-            ORDER BY media_avaliacoes DESC, total_avaliacoes DESC, pt.nome
-            LIMIT ?
-        ''', (f'%{estado}%', limite))
-
-        pontos_estado = cursor.fetchall()
-        pontos_mapeados = []
-        for ponto in pontos_estado:
-            ponto_dict = {
-                'id': ponto[0],
-                'nome': ponto[1],
-                'descricao': ponto[2],
-                'endereco': ponto[3],
-                'latitude': ponto[4],
-                'longitude': ponto[5],
-                'imagem': ponto[6],
-                'categoria': ponto[7],
-                'categoria_filtro': map_categoria_para_filtro(ponto[7], ponto[1], ponto[2]),
-                'horario_funcionamento': ponto[8],
-                'preco_entrada': ponto[9],
-                'telefone_contato': ponto[10],
-                'site_oficial': ponto[11],
-                'data_cadastro': ponto[12],
-                'media_avaliacoes': ponto[13],
-                'total_avaliacoes': ponto[14],
-                'avaliacoes': []
-            }
-            pontos_mapeados.append(ponto_dict)
-            todos_pontos.append(ponto_dict)
-
-        pontos_por_estado[estado] = pontos_mapeados
+            JOIN pontos_agregados ag ON ag.ponto_turistico_id = pt.id
+            WHERE pt.estado IN ({placeholders})
+        )
+        WHERE posicao <= ?
+        ORDER BY estado, posicao
+    ''', (*ESTADOS_SUDESTE, limite))
+
+    for ponto in cursor.fetchall():
+        ponto_dict = {
+            'id': ponto[0],
+            'nome': ponto[1],
+            'descricao': ponto[2],
+            'endereco': ponto[3],
+            'latitude': ponto[4],
+            'longitude': ponto[5],
+            'imagem': ponto[6],
+            'categoria': ponto[7],
+            'categoria_filtro': ponto[17] or DEFAULT_FILTER_CATEGORY,
+            'horario_funcionamento': ponto[8],
+            'preco_entrada': ponto[9],
+            'telefone_contato': ponto[10],
+            'site_oficial': ponto[11],
+            'data_cadastro': ponto[12],
+            'media_avaliacoes': ponto[13],
+            'total_avaliacoes': ponto[14],
+            'estado': ponto[15],
+            'cidade': ponto[16],
+            'avaliacoes': []
+        }
+        pontos_por_estado[ponto[15]].append(ponto_dict)
+
+    todos_pontos = [ponto for estado in ESTADOS_SUDESTE for ponto in pontos_por_estado[estado]]
 
     if incluir_avaliacoes:
         attach_recent_reviews(cursor, todos_pontos)
@@ -168,64 +429,17 @@ def carregar_pontos_por_estado(cursor, limite=5, incluir_avaliacoes=True):
     return pontos_por_estado, todos_pontos
 
 
-def normalize_text(value):
-    if not value:
-        return ''
-    normalized = unicodedata.normalize('NFD', value)
-    return ''.join(ch for ch in normalized if unicodedata.category(ch) != 'Mn').lower()
-
-
-DEFAULT_FILTER_CATEGORY = 'Cultura/Entretenimento'
-CATEGORIA_FILTRO_EXATA = {
-    'monumento': 'Religioso/Histórico',
-    'religioso': 'Religioso/Histórico',
-    'religioso historico': 'Religioso/Histórico',
-    'religioso histórico': 'Religioso/Histórico',
-    'historico': 'Religioso/Histórico',
-    'histórico': 'Religioso/Histórico',
-    'patrimonio': 'Religioso/Histórico',
-    'patrimônio': 'Religioso/Histórico',
-    'paisagem': 'Natureza/Panorâmico',
-    'paisagismo': 'Natureza/Panorâmico',
-    'paisagistico': 'Natureza/Panorâmico',
-    'parque': 'Natureza/Panorâmico',
-    'jardim botanico': 'Natureza/Panorâmico',
-    'jardim botânico': 'Natureza/Panorâmico',
-    'zoologico': 'Natureza/Panorâmico',
-    'zoológico': 'Natureza/Panorâmico',
-    'aquario': 'Natureza/Panorâmico',
-    'aquário': 'Natureza/Panorâmico',
-    'praia': 'Praia/Recreação',
-    'praia/recreacao': 'Praia/Recreação',
-    'praia/recreação': 'Praia/Recreação',
-    'balneario': 'Praia/Recreação',
-    'balneário': 'Praia/Recreação',
-    'parque tematico': 'Cultura/Entretenimento',
-    'parque temático': 'Cultura/Entretenimento',
-    'centro cultural': 'Cultura/Entretenimento',
-    'museu': 'Cultura/Entretenimento'
-}
-FILTER_CATEGORY_KEYWORDS = [
-    ('Religioso/Histórico', ['religios', 'igreja', 'santu', 'convento', 'mosteir', 'basil', 'monumento', 'monument', 'histor', 'patrimon', 'forte', 'castel', 'martir', 'catedral']),
-    ('Natureza/Panorâmico', ['parque', 'trilha', 'cachoeira', 'montanha', 'morro', 'morros', 'paisagem', 'panoram', 'mirante', 'reserva natural', 'floresta', 'serra', 'vale', 'bondinho', 'tirolesa', 'natureza', 'jardim', 'botanic', 'zoo', 'ecologic', 'ecotur', 'fauna', 'flora', 'viveiro', 'observatorio', 'planetario', 'aquar', 'museu de ciencias', 'ciência']),
-    ('Praia/Recreação', ['praia', 'mar', 'ilha', 'balne', 'recrea', 'lazer', 'orla', 'surf', 'banho de mar', 'areia']),
-    ('Cultura/Entretenimento', ['museu', 'arte', 'cultura', 'teatro', 'memorial', 'centro cultural', 'entretenimento', 'evento', 'galeria', 'cinem', 'show', 'exposi', 'historia da arte'])
-]
-
-
-def map_categoria_para_filtro(categoria, nome='', descricao=''):
-    texto_referencia = ' '.join([parte for parte in [categoria, nome, descricao] if parte])
-    if not texto_referencia:
-        return DEFAULT_FILTER_CATEGORY
-    categoria_normalizada = normalize_text(categoria)
-    if categoria_normalizada in CATEGORIA_FILTRO_EXATA:
-        return CATEGORIA_FILTRO_EXATA[categoria_normalizada]
-    normalized = normalize_text(texto_referencia)
-    for filtro, keywords in FILTER_CATEGORY_KEYWORDS:
-        for keyword in keywords:
-            if keyword in normalized:
-                return filtro
-    return DEFAULT_FILTER_CATEGORY
+def contar_pontos_por_estado(cursor):
+    """Quantidade de pontos turísticos em cada estado do Sudeste"""
+    placeholders = ','.join(['?'] * len(ESTADOS_SUDESTE))
+    cursor.execute(f'''
+        SELECT estado, COUNT(*)
+        FROM pontos_turisticos
+        WHERE estado IN ({placeholders})
+        GROUP BY estado
+    ''', ESTADOS_SUDESTE)
+    contagens = dict(cursor.fetchall())
+    return {estado: contagens.get(estado, 0) for estado in ESTADOS_SUDESTE}
 
 
 SOUTHEAST_REGEX = re.compile(r'\b(rj|rio de janeiro|sp|sao paulo|mg|minas gerais|es|espirito santo)\b', re.IGNORECASE)
@@ -243,58 +457,8 @@ def is_address_in_southeast(address):
     return bool(SOUTHEAST_REGEX.search(normalized))
 
 
-def sanitize_cep(cep):
-    if not cep:
-        return ''
-    return re.sub(r'\D', '', cep)
-
-
-def fetch_address_by_cep(cep):
-    cep_digits = sanitize_cep(cep)
-    if len(cep_digits) != 8:
-        raise ValueError("CEP inválido. Informe 8 dígitos.")
-    
-    url = f'https://viacep.com.br/ws/{cep_digits}/json/'
-    try:
-        with urlrequest.urlopen(url, timeout=5) as response:
-            if response.status != 200:
-                raise ValueError("Erro ao consultar o CEP informado.")
-            raw_data = response.read().decode('utf-8')
-    except (urlerror.URLError, TimeoutError):
-        raise ValueError("Não foi possível consultar o CEP. Tente novamente.")
-    
-    try:
-        data = json.loads(raw_data)
-    except json.JSONDecodeError:
-        raise ValueError("Resposta inválida da consulta de CEP.")
-    if data.get('erro'):
-        raise ValueError("CEP não encontrado.")
-    
-    logradouro = data.get('logradouro', '').strip()
-    bairro = data.get('bairro', '').strip()
-    localidade = data.get('localidade', '').strip()
-    uf = data.get('uf', '').strip()
-    
-    if not localidade or not uf:
-        raise ValueError("Endereço incompleto para o CEP informado.")
-    
-    partes = [logradouro, bairro]
-    partes = [parte for parte in partes if parte]
-    endereco_formatado = ', '.join(partes) if partes else ''
-    cidade_estado = f"{localidade} - {uf}"
-    
-    if endereco_formatado:
-        endereco_formatado = f"{endereco_formatado}, {cidade_estado}"
-    else:
-        endereco_formatado = cidade_estado
-    
-    return {
-        'endereco': endereco_formatado,
-        'uf': uf
-    }
-
-@app.route('/')
-def home():
+def montar_dados_home():
+    """Dados da página inicial (iguais para todos os visitantes)"""
     conn = get_connection()
     cursor = conn.cursor()
 
@@ -306,10 +470,7 @@ def home():
     cursor.execute('SELECT COUNT(*) FROM avaliacoes')
     total_avaliacoes = cursor.fetchone()[0] or 0
 
-    uf_counts = {}
-    for uf in pontos_por_estado.keys():
-        cursor.execute('SELECT COUNT(*) FROM pontos_turisticos WHERE endereco LIKE ?', (f'%{uf}%',))
-        uf_counts[uf] = cursor.fetchone()[0] or 0
+    uf_counts = contar_pontos_por_estado(cursor)
 
     conn.close()
 
@@ -319,33 +480,48 @@ def home():
         reverse=True
     )[:8]
 
-    destaque_estado = {}
-    for ponto in todos_pontos:
-        endereco = ponto.get('endereco') or ''
-        estado = None
-        if len(endereco) >= 2:
-            estado = endereco[-2:].upper()
-            if estado not in SOUTHEAST_UFS:
-                for uf in SOUTHEAST_UFS:
-                    if f"- {uf}" in endereco.upper() or f", {uf}" in endereco.upper():
-                        estado = uf
-                        break
-        if estado in SOUTHEAST_UFS and estado not in destaque_estado:
-            destaque_estado[estado] = ponto
-        if len(destaque_estado) == len(SOUTHEAST_UFS):
-            break
+    # O primeiro de cada estado já é o mais bem avaliado
+    destaque_estado = {estado: pontos[0] for estado, pontos in pontos_por_estado.items() if pontos}
+
+    return {
+        'pontos_por_estado': pontos_por_estado,
+        'pontos_destaque': pontos_destaque,
+        'pontos_destaque_estado': destaque_estado,
+        'uf_counts': uf_counts,
+        'total_pontos': total_pontos,
+        'total_avaliacoes': total_avaliacoes,
+        'total_estados': len(SOUTHEAST_UFS)
+    }
+
+
+def montar_dados_dashboard():
+    """Pontos por estado com as avaliações recentes"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    pontos_por_estado, _ = carregar_pontos_por_estado(cursor, limite=5, incluir_avaliacoes=True)
+    conn.close()
+    return pontos_por_estado
+
+
+def invalidar_cache_catalogo():
+    """Chamado quando pontos turísticos são criados, alterados ou removidos"""
+    cache_paginas.invalidar('catalogo')
+
+
+def invalidar_cache_avaliacoes():
+    """Chamado quando avaliações são criadas, alteradas ou removidas"""
+    cache_paginas.invalidar('avaliacoes')
+
+
+@app.route('/')
+def home():
+    dados = cache_paginas.get_or_set('home', montar_dados_home, tags=('catalogo', 'avaliacoes'))
 
     return render_template(
         "index.html",
         user=get_current_user(),
-        pontos_por_estado=pontos_por_estado,
-        pontos_destaque=pontos_destaque,
-        pontos_destaque_estado=destaque_estado,
-        uf_counts=uf_counts,
-        total_pontos=total_pontos,
-        total_avaliacoes=total_avaliacoes,
-        total_estados=len(SOUTHEAST_UFS),
-        current_year=datetime.now().year
+        current_year=datetime.now().year,
+        **dados
     )
 
 @app.route('/dashboard')
@@ -353,11 +529,9 @@ def dashboard():
     if not is_logged_in():
         return redirect(url_for('login'))
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    pontos_por_estado, _ = carregar_pontos_por_estado(cursor, limite=5, incluir_avaliacoes=True)
-    conn.close()
+    pontos_por_estado = cache_paginas.get_or_set(
+        'dashboard', montar_dados_dashboard, tags=('catalogo', 'avaliacoes')
+    )
 
     return render_template('dashboard.html', pontos_por_estado=pontos_por_estado, user=get_current_user())
 
@@ -371,36 +545,10 @@ def buscar_sugestoes():
     if len(termo) < 2:  # Mínimo 2 caracteres para buscar
         return jsonify([])
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT DISTINCT nome, categoria, endereco
-        FROM pontos_turisticos 
-        WHERE nome LIKE ? OR categoria LIKE ? OR endereco LIKE ?
-        ORDER BY 
-            CASE 
-                WHEN nome LIKE ? THEN 1
-                WHEN categoria LIKE ? THEN 2
-                WHEN endereco LIKE ? THEN 3
-            END,
-            nome
-        LIMIT 8
-    ''', (
-        f'%{termo}%', f'%{termo}%', f'%{termo}%',
-        f'{termo}%', f'{termo}%', f'{termo}%'
-    ))
-    
-    sugestoes = []
-    for row in cursor.fetchall():
-        sugestoes.append({
-            'nome': row[0],
-            'categoria': row[1],
-            'endereco': row[2]
-        })
+    if indice_sugestoes.expirado(app.config['SUGESTOES_RECARGA_SEGUNDOS']):
+        carregar_indice_sugestoes()
     
-    conn.close()
-    return jsonify(sugestoes)
+    return jsonify(indice_sugestoes.buscar(termo))
 
 @app.route('/pesquisar', methods=['POST'])
 def pesquisar():
@@ -408,38 +556,34 @@ def pesquisar():
         return redirect(url_for('login'))
     
     termo_pesquisa = request.form.get('pesquisa', '').strip()
+    expressao = fts_match_expression(termo_pesquisa)
     
     conn = get_connection()
     cursor = conn.cursor()
     
-    if termo_pesquisa:
-        cursor.execute('''
+    if expressao:
+        # Relevância BM25 (negativa: menor é melhor) reforçada pela média de avaliações
+        cursor.execute(f'''
             SELECT pt.id, pt.nome, pt.descricao, pt.endereco, pt.latitude, pt.longitude, 
                    pt.imagem, pt.categoria, pt.horario_funcionamento, pt.preco_entrada, 
                    pt.telefone_contato, pt.site_oficial, pt.data_cadastro,
-                   COALESCE(ROUND(AVG(a.nota), 1), 0) as media_avaliacoes,
-                   COUNT(a.id) as total_avaliacoes
-            FROM pontos_turisticos pt
-            LEFT JOIN avaliacoes a ON pt.id = a.ponto_turistico_id
-            WHERE pt.nome LIKE ? OR pt.descricao LIKE ? OR pt.categoria LIKE ?
-            GROUP BY pt.id, pt.nome, pt.descricao, pt.endereco, pt.latitude, pt.longitude, 
-                     pt.imagem, pt.categoria, pt.horario_funcionamento, pt.preco_entrada, 
-                     pt.telefone_contato, pt.site_oficial, pt.data_cadastro
-            ORDER BY media_avaliacoes DESC, total_avaliacoes DESC, pt.nome
-        ''', (f'%{termo_pesquisa}%', f'%{termo_pesquisa}%', f'%{termo_pesquisa}%'))
+                   ag.media_avaliacoes, ag.total_avaliacoes, pt.estado, pt.cidade, pt.categoria_filtro
+            FROM pontos_busca
+            JOIN pontos_turisticos pt ON pt.id = pontos_busca.rowid
+            JOIN pontos_agregados ag ON ag.ponto_turistico_id = pt.id
+            WHERE pontos_busca MATCH ?
+            ORDER BY bm25(pontos_busca, {', '.join(map(str, FTS_WEIGHTS))}) * (1 + ? * ag.media_avaliacoes / 5.0),
+                     ag.total_avaliacoes DESC, pt.nome
+        ''', (expressao, app.config['BUSCA_PESO_AVALIACAO']))
     else:
         cursor.execute('''
             SELECT pt.id, pt.nome, pt.descricao, pt.endereco, pt.latitude, pt.longitude, 
                    pt.imagem, pt.categoria, pt.horario_funcionamento, pt.preco_entrada, 
                    pt.telefone_contato, pt.site_oficial, pt.data_cadastro,
-                   COALESCE(ROUND(AVG(a.nota), 1), 0) as media_avaliacoes,
-                   COUNT(a.id) as total_avaliacoes
-            FROM pontos_turisticos pt
-            LEFT JOIN avaliacoes a ON pt.id = a.ponto_turistico_id
-            GROUP BY pt.id, pt.nome, pt.descricao, pt.endereco, pt.latitude, pt.longitude, 
-                     pt.imagem, pt.categoria, pt.horario_funcionamento, pt.preco_entrada, 
-                     pt.telefone_contato, pt.site_oficial, pt.data_cadastro
-            ORDER BY media_avaliacoes DESC, total_avaliacoes DESC, pt.nome
+                   ag.media_avaliacoes, ag.total_avaliacoes, pt.estado, pt.cidade, pt.categoria_filtro
+            FROM pontos_agregados ag
+            CROSS JOIN pontos_turisticos pt ON pt.id = ag.ponto_turistico_id
+            ORDER BY ag.media_avaliacoes DESC, ag.total_avaliacoes DESC, pt.nome
         ''')
     
     pontos_turisticos = cursor.fetchall()
@@ -456,7 +600,7 @@ def pesquisar():
             'longitude': ponto[5],
             'imagem': ponto[6],
             'categoria': ponto[7],
-            'categoria_filtro': map_categoria_para_filtro(ponto[7], ponto[1], ponto[2]),
+            'categoria_filtro': ponto[17] or DEFAULT_FILTER_CATEGORY,
             'horario_funcionamento': ponto[8],
             'preco_entrada': ponto[9],
             'telefone_contato': ponto[10],
@@ -464,6 +608,8 @@ def pesquisar():
             'data_cadastro': ponto[12],
             'media_avaliacoes': ponto[13],
             'total_avaliacoes': ponto[14],
+            'estado': ponto[15],
+            'cidade': ponto[16],
             'avaliacoes': []
         }
         pontos_mapeados.append(ponto_dict)
@@ -473,6 +619,35 @@ def pesquisar():
     
     return render_template('dashboard.html', pontos_turisticos=pontos_mapeados, user=get_current_user(), termo_pesquisa=termo_pesquisa)
 
+@app.route('/api/pontos/proximos', methods=['GET'])
+def api_pontos_proximos():
+    """Pontos perto de uma coordenada (lat/lon) ou de outro ponto (ponto=id), por raio ou k mais próximos"""
+    if not is_logged_in():
+        return jsonify([])
+
+    limite = min(max(request.args.get('limite', 10, type=int), 1), 50)
+    raio_km = request.args.get('raio', type=float)
+    ponto_id = request.args.get('ponto', type=int)
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+
+    if ponto_id is not None:
+        conn = get_connection()
+        row = conn.execute('SELECT latitude, longitude FROM pontos_turisticos WHERE id = ?', (ponto_id,)).fetchone()
+        conn.close()
+        if not row:
+            return jsonify({'erro': "Ponto turístico não encontrado!"}), 404
+        latitude, longitude = row
+    if latitude is None or longitude is None:
+        return jsonify({'erro': "Informe lat e lon ou ponto."}), 400
+    if raio_km is not None and raio_km <= 0:
+        return jsonify({'erro': "O raio deve ser positivo."}), 400
+
+    try:
+        return jsonify(pontos_proximos(latitude, longitude, raio_km=raio_km, limite=limite, excluir_id=ponto_id))
+    except ValueError as exc:
+        return jsonify({'erro': str(exc)}), 400
+
 @app.route('/avaliar', methods=['POST'])
 def avaliar():
     if not is_logged_in():
@@ -486,29 +661,28 @@ def avaliar():
         flash("Dados de avaliação inválidos!")
         return redirect(url_for('dashboard'))
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Verificar se o usuário já avaliou este ponto
-    cursor.execute('SELECT id FROM avaliacoes WHERE usuario_id = ? AND ponto_turistico_id = ?', 
-                   (session['user_id'], ponto_id))
-    
-    if cursor.fetchone():
-        # Atualizar avaliação existente
-        cursor.execute('''
-            UPDATE avaliacoes 
-            SET nota = ?, comentario = ?, data_avaliacao = CURRENT_TIMESTAMP
-            WHERE usuario_id = ? AND ponto_turistico_id = ?
-        ''', (nota, comentario, session['user_id'], ponto_id))
-    else:
-        # Inserir nova avaliação
-        cursor.execute('''
-            INSERT INTO avaliacoes (usuario_id, ponto_turistico_id, nota, comentario)
-            VALUES (?, ?, ?, ?)
-        ''', (session['user_id'], ponto_id, nota, comentario))
+    with write_transaction() as conn:
+        cursor = conn.cursor()
+        
+        # Verificar se o usuário já avaliou este ponto
+        cursor.execute('SELECT id FROM avaliacoes WHERE usuario_id = ? AND ponto_turistico_id = ?', 
+                       (session['user_id'], ponto_id))
+        
+        if cursor.fetchone():
+            # Atualizar avaliação existente
+            cursor.execute('''
+                UPDATE avaliacoes 
+                SET nota = ?, comentario = ?, data_avaliacao = CURRENT_TIMESTAMP
+                WHERE usuario_id = ? AND ponto_turistico_id = ?
+            ''', (nota, comentario, session['user_id'], ponto_id))
+        else:
+            # Inserir nova avaliação
+            cursor.execute('''
+                INSERT INTO avaliacoes (usuario_id, ponto_turistico_id, nota, comentario)
+                VALUES (?, ?, ?, ?)
+            ''', (session['user_id'], ponto_id, nota, comentario))
     
-    conn.commit()
-    conn.close()
+    invalidar_cache_avaliacoes()
     
     flash("Avaliação salva com sucesso!")
     return redirect(url_for('dashboard'))
@@ -544,22 +718,19 @@ def remover_avaliacao():
         flash("ID da avaliação não fornecido!")
         return redirect(url_for('minhas_avaliacoes'))
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Verificar se a avaliação pertence ao usuário atual
-    cursor.execute('SELECT id FROM avaliacoes WHERE id = ? AND usuario_id = ?', 
-                   (avaliacao_id, session['user_id']))
+    with write_transaction() as conn:
+        cursor = conn.cursor()
+        
+        # Remover a avaliação apenas se ela pertencer ao usuário atual
+        cursor.execute('DELETE FROM avaliacoes WHERE id = ? AND usuario_id = ?', 
+                       (avaliacao_id, session['user_id']))
+        removida = cursor.rowcount > 0
     
-    if not cursor.fetchone():
+    if not removida:
         flash("Avaliação não encontrada ou você não tem permissão para removê-la!")
-        conn.close()
         return redirect(url_for('minhas_avaliacoes'))
     
-    # Remover a avaliação
-    cursor.execute('DELETE FROM avaliacoes WHERE id = ?', (avaliacao_id,))
-    conn.commit()
-    conn.close()
+    invalidar_cache_avaliacoes()
     
     flash("Avaliação removida com sucesso!")
     return redirect(url_for('minhas_avaliacoes'))
@@ -576,15 +747,12 @@ def ponto_detalhes(ponto_id):
         flash("Ponto turístico não encontrado!")
         return redirect(url_for('dashboard'))
     
+    conn.close()
+
     user = get_current_user()
     if user:
         origem_sudeste = 1 if is_address_in_southeast(user.get('endereco')) else 0
-        cursor.execute('''
-            INSERT INTO visitas_pontos (usuario_id, ponto_turistico_id, origem_sudeste)
-            VALUES (?, ?, ?)
-        ''', (user['id'], ponto_id, origem_sudeste))
-        conn.commit()
-    conn.close()
+        buffer_visitas.registrar(user['id'], ponto_id, origem_sudeste)
 
     ponto_data = {
         'id': ponto[0],
@@ -601,7 +769,11 @@ def ponto_detalhes(ponto_id):
         'site_oficial': ponto[11]
     }
     
-    return render_template('ponto_detalhes.html', ponto=ponto_data, user=user)
+    # Vizinhos pelo índice R*Tree, sem varrer o catálogo
+    proximos = pontos_proximos(ponto_data['latitude'], ponto_data['longitude'], limite=5, excluir_id=ponto_id,
+                               raio_maximo_km=app.config['PROXIMOS_RAIO_MAXIMO_KM'])
+
+    return render_template('ponto_detalhes.html', ponto=ponto_data, user=user, pontos_proximos=proximos)
 
 @app.route('/perfil')
 def perfil():
@@ -627,10 +799,11 @@ def atualizar_perfil():
     if 'foto_perfil' in request.files:
         file = request.files['foto_perfil']
         if file and file.filename:
-            filename = secure_filename(file.filename)
-            if filename:
-                foto_perfil = f"uploads/{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            try:
+                foto_perfil = f"uploads/{processador_imagens.enviar(file.stream)}"
+            except ValueError as exc:
+                flash(str(exc))
+                return redirect(url_for('perfil'))
     
     conn = get_connection()
     cursor = conn.cursor()
@@ -650,6 +823,8 @@ def atualizar_perfil():
             conn.close()
             return redirect(url_for('perfil'))
     
+    conn.close()
+    
     # Atualizar dados
     update_fields = []
     values = []
@@ -680,18 +855,23 @@ def atualizar_perfil():
     
     if foto_perfil:
         update_fields.append('foto_perfil = ?')
+        indice_foto = len(values)
         values.append(foto_perfil)
     
     if update_fields:
         values.append(session['user_id'])
         query = f"UPDATE usuarios SET {', '.join(update_fields)} WHERE id = ?"
-        cursor.execute(query, values)
-        conn.commit()
+        with write_transaction() as write_conn:
+            # Dentro da fila de escrita: ou a troca já aconteceu, ou o UPDATE de
+            # usar_imagem_sem_variantes só roda depois desta transação
+            if foto_perfil:
+                values[indice_foto] = processador_imagens.substituto(foto_perfil)
+            write_conn.execute(query, values)
+        marcar_usuario_alterado(session['user_id'])
         flash("Perfil atualizado com sucesso!")
     else:
         flash("Nenhuma alteração foi feita.")
     
-    conn.close()
     return redirect(url_for('perfil'))
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -701,6 +881,10 @@ def login():
             return redirect(url_for('dashboard'))
         return render_template('login.html')
 
+    espera = limitador.permitir('login_ip', request.remote_addr)
+    if espera:
+        return recusar_tentativa(espera)
+
     nome = request.form.get('nome')
     senha = request.form.get('senha')
     cep_login = request.form.get('cep_login', '').strip()
@@ -709,6 +893,10 @@ def login():
         flash("Nome e senha são obrigatórios!")
         return redirect(url_for('login'))
 
+    espera = limitador.bloqueado('login_usuario', nome.lower())
+    if espera:
+        return recusar_tentativa(espera)
+
     # Verificar se é administrador (admin não precisa de CEP)
     conn = get_connection()
     cursor = conn.cursor()
@@ -717,30 +905,23 @@ def login():
         cursor.execute('SELECT id FROM usuarios WHERE nome = ?', ('admin',))
         admin = cursor.fetchone()
         if admin:
-            session['user_id'] = admin[0]
-            session['is_admin'] = True
-            # Atualizar endereço do admin apenas se CEP foi fornecido
-            if cep_login:
-                try:
-                    endereco_info = fetch_address_by_cep(cep_login)
-                    cursor.execute('UPDATE usuarios SET endereco = ? WHERE id = ?', (endereco_info['endereco'], admin[0]))
-                except ValueError:
-                    pass  # Ignora erro de CEP para admin
-            conn.commit()
+            iniciar_sessao(admin[0], True)
             conn.close()
+            # Atualizar endereço do admin apenas se CEP válido foi fornecido (em segundo plano)
+            if len(sanitize_cep(cep_login)) == 8:
+                resolvedor_enderecos.agendar(admin[0], cep_login)
             return redirect(url_for('adm'))
         else:
+            conn.close()
             # Admin não encontrado no banco, criar automaticamente
             admin_senha_hash = hash_password('0000')
-            cursor.execute('''
-                INSERT INTO usuarios (nome, email, senha, endereco, telefone, cpf)
-                VALUES ('admin', 'admin@turismo.com', ?, 'Endereço Admin', '00000000000', '00000000000')
-            ''', (admin_senha_hash,))
-            conn.commit()
-            admin_id = cursor.lastrowid
-            session['user_id'] = admin_id
-            session['is_admin'] = True
-            conn.close()
+            with write_transaction() as write_conn:
+                write_cursor = write_conn.execute('''
+                    INSERT INTO usuarios (nome, email, senha, endereco, telefone, cpf)
+                    VALUES ('admin', 'admin@turismo.com', ?, 'Endereço Admin', '00000000000', '00000000000')
+                ''', (admin_senha_hash,))
+                admin_id = write_cursor.lastrowid
+            iniciar_sessao(admin_id, True)
             return redirect(url_for('adm'))
 
     # Para usuários normais, CEP é obrigatório
@@ -749,33 +930,47 @@ def login():
         conn.close()
         return redirect(url_for('login'))
 
-    try:
-        endereco_info = fetch_address_by_cep(cep_login)
-    except ValueError as exc:
-        flash(str(exc))
+    # Só o formato é validado aqui; a consulta ao ViaCEP fica fora do caminho do login
+    if len(sanitize_cep(cep_login)) != 8:
+        flash("CEP inválido. Informe 8 dígitos.")
         conn.close()
         return redirect(url_for('login'))
-    
-    endereco_login = endereco_info['endereco']
-    
+
     # Verificar usuário normal
     cursor.execute('SELECT id, senha FROM usuarios WHERE nome = ?', (nome,))
     user = cursor.fetchone()
+    conn.close()
     
-    if user and user[1] == hash_password(senha):
-        session['user_id'] = user[0]
-        session['is_admin'] = False
-        cursor.execute('UPDATE usuarios SET endereco = ? WHERE id = ?', (endereco_login, user[0]))
-        conn.commit()
-        conn.close()
+    try:
+        senha_confere = servico_senhas.verificar(senha, user[1] if user else SENHA_FICTICIA) and user is not None
+    except FilaDeHashCheia as exc:
+        flash(str(exc))
+        return redirect(url_for('login'))
+
+    if senha_confere:
+        if servico_senhas.precisa_rehash(user[1]):
+            # Hash legado (SHA-256 sem salt) ou de custo antigo: regrava no formato atual
+            try:
+                novo_hash = servico_senhas.gerar(senha)
+            except FilaDeHashCheia:
+                novo_hash = None
+            if novo_hash:
+                with write_transaction() as write_conn:
+                    write_conn.execute('UPDATE usuarios SET senha = ? WHERE id = ? AND senha = ?',
+                                       (novo_hash, user[0], user[1]))
+        limitador.limpar('login_usuario', nome.lower())
+        iniciar_sessao(user[0], False)
+        resolvedor_enderecos.agendar(user[0], cep_login)
         return redirect(url_for('dashboard'))
     else:
-        conn.close()
+        limitador.registrar('login_usuario', nome.lower())
         flash("Usuário ou senha inválidos!")
         return redirect(url_for('login'))
 
 @app.route('/logout')
 def logout():
+    if is_logged_in():
+        invalidar_cache_usuario(session['user_id'])
     session.clear()
     return redirect(url_for('home'))
 
@@ -786,13 +981,7 @@ def recriar_pontos_sudeste():
     if not is_logged_in() or not session.get('is_admin'):
         return redirect(url_for('login'))
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Limpar pontos turísticos existentes
-    cursor.execute('DELETE FROM pontos_turisticos')
-    
-    # Inserir pontos turísticos do Sudeste
+    # Pontos turísticos do Sudeste
     pontos_sudeste = [
         # Rio de Janeiro
         ('Cristo Redentor', 'Monumento religioso mais famoso do Brasil', 'Parque Nacional da Tijuca, Rio de Janeiro - RJ', -22.9519, -43.2105, 'cristo-redentor.jpg', 'Monumento', 'Diariamente das 8h às 19h', 'R$ 65,00', '(21) 2558-1329', 'https://www.cristoredentoroficial.com.br', '2024-01-01'),
@@ -810,13 +999,25 @@ def recriar_pontos_sudeste():
         ('Pão de Açúcar', 'Morro com bondinho e vista panorâmica', 'Av. Pasteur, 520 - Urca, Rio de Janeiro - RJ', -22.9494, -43.1551, 'pao-acucar.jpg', 'Paisagem', 'Diariamente das 8h às 21h', 'R$ 120,00', '(21) 2546-8400', 'https://www.bondinho.com.br', '2024-01-01')
     ]
     
-    cursor.executemany('''
-        INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, imagem, categoria, horario_funcionamento, preco_entrada, telefone_contato, site_oficial, data_cadastro)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', pontos_sudeste)
+    # Estado e cidade derivados do endereço; categoria do filtro calculada na gravação
+    pontos_sudeste = [
+        ponto + parse_estado_cidade(ponto[2]) + (map_categoria_para_filtro(ponto[6], ponto[0], ponto[1]),)
+        for ponto in pontos_sudeste
+    ]
     
-    conn.commit()
-    conn.close()
+    with write_transaction() as conn:
+        cursor = conn.cursor()
+        
+        # Limpar pontos turísticos existentes
+        cursor.execute('DELETE FROM pontos_turisticos')
+        
+        cursor.executemany('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, imagem, categoria, horario_funcionamento, preco_entrada, telefone_contato, site_oficial, data_cadastro, estado, cidade, categoria_filtro)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', pontos_sudeste)
+    
+    carregar_indice_sugestoes()
+    invalidar_cache_catalogo()
     
     flash("Pontos turísticos do Sudeste recriados com sucesso!")
     return redirect(url_for('dashboard'))
@@ -849,35 +1050,38 @@ def adicionar_ponto():
         if 'imagem' in request.files:
             arquivo = request.files['imagem']
             if arquivo and arquivo.filename:
-                filename = secure_filename(arquivo.filename)
-                # Adicionar timestamp para evitar conflitos
-                timestamp = str(int(time.time()))
-                filename = f"{timestamp}_{filename}"
-                arquivo.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                imagem = filename
+                # Nome derivado do conteúdo; as variantes são geradas em segundo plano
+                try:
+                    imagem = processador_imagens.enviar(arquivo.stream)
+                except ValueError as exc:
+                    flash(str(exc))
+                    return redirect(url_for('adicionar_ponto'))
             else:
                 imagem = 'default.jpg'
         else:
             imagem = 'default.jpg'
         
-        # Inserir no banco de dados
-        conn = get_connection()
-        cursor = conn.cursor()
+        estado, cidade = parse_estado_cidade(endereco)
+        categoria_filtro = map_categoria_para_filtro(categoria, nome, descricao)
         
+        # Inserir no banco de dados
         try:
-            cursor.execute('''
-                INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, imagem, categoria, horario_funcionamento, preco_entrada, telefone_contato, site_oficial, data_cadastro)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (nome, descricao, endereco, float(latitude), float(longitude), imagem, categoria, horario_funcionamento, preco_entrada, telefone_contato, site_oficial, datetime.now().strftime('%Y-%m-%d')))
+            with write_transaction() as conn:
+                imagem = processador_imagens.substituto(imagem)
+                novo = conn.execute('''
+                    INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, imagem, categoria, horario_funcionamento, preco_entrada, telefone_contato, site_oficial, data_cadastro, estado, cidade, categoria_filtro)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (nome, descricao, endereco, float(latitude), float(longitude), imagem, categoria, horario_funcionamento, preco_entrada, telefone_contato, site_oficial, datetime.now().strftime('%Y-%m-%d'), estado, cidade, categoria_filtro))
             
-            conn.commit()
-            conn.close()
+            indice_sugestoes.adicionar({
+                'id': novo.lastrowid, 'nome': nome, 'categoria': categoria, 'endereco': endereco, 'cidade': cidade
+            })
+            invalidar_cache_catalogo()
             
             flash("Ponto turístico adicionado com sucesso!")
             return redirect(url_for('dashboard'))
             
         except Exception as e:
-            conn.close()
             flash(f"Erro ao adicionar ponto turístico: {str(e)}")
             return redirect(url_for('adicionar_ponto'))
     
@@ -910,44 +1114,62 @@ def editar_ponto(ponto_id):
             flash("Todos os campos obrigatórios devem ser preenchidos!")
             return redirect(url_for('editar_ponto', ponto_id=ponto_id))
         
-        # Processar upload da nova imagem (se fornecida)
-        imagem_atual = None
         cursor.execute('SELECT imagem FROM pontos_turisticos WHERE id = ?', (ponto_id,))
         resultado = cursor.fetchone()
-        if resultado:
-            imagem_atual = resultado[0]
+        if not resultado:
+            conn.close()
+            flash("Ponto turístico não encontrado!")
+            return redirect(url_for('dashboard'))
+        imagem_atual = resultado[0]
         
+        # Processar upload da nova imagem (se fornecida)
         nova_imagem = imagem_atual  # Manter imagem atual por padrão
         
         if 'imagem' in request.files:
             arquivo = request.files['imagem']
             if arquivo and arquivo.filename:
-                filename = secure_filename(arquivo.filename)
-                # Adicionar timestamp para evitar conflitos
-                timestamp = str(int(time.time()))
-                filename = f"{timestamp}_{filename}"
-                arquivo.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                nova_imagem = filename
+                # Nome derivado do conteúdo; as variantes são geradas em segundo plano
+                try:
+                    nova_imagem = processador_imagens.enviar(arquivo.stream)
+                except ValueError as exc:
+                    conn.close()
+                    flash(str(exc))
+                    return redirect(url_for('editar_ponto', ponto_id=ponto_id))
+        
+        conn.close()
+        estado, cidade = parse_estado_cidade(endereco)
+        categoria_filtro = map_categoria_para_filtro(categoria, nome, descricao)
         
         # Atualizar no banco de dados
         try:
-            cursor.execute('''
-                UPDATE pontos_turisticos 
-                SET nome = ?, descricao = ?, endereco = ?, latitude = ?, longitude = ?, 
-                    imagem = ?, categoria = ?, horario_funcionamento = ?, preco_entrada = ?, 
-                    telefone_contato = ?, site_oficial = ?
-                WHERE id = ?
-            ''', (nome, descricao, endereco, float(latitude), float(longitude), nova_imagem, 
-                  categoria, horario_funcionamento, preco_entrada, telefone_contato, site_oficial, ponto_id))
+            with write_transaction() as write_conn:
+                nova_imagem = processador_imagens.substituto(nova_imagem)
+                atualizado = write_conn.execute('''
+                    UPDATE pontos_turisticos 
+                    SET nome = ?, descricao = ?, endereco = ?, latitude = ?, longitude = ?, 
+                        imagem = ?, categoria = ?, horario_funcionamento = ?, preco_entrada = ?, 
+                        telefone_contato = ?, site_oficial = ?, estado = ?, cidade = ?, categoria_filtro = ?
+                    WHERE id = ?
+                ''', (nome, descricao, endereco, float(latitude), float(longitude), nova_imagem, 
+                      categoria, horario_funcionamento, preco_entrada, telefone_contato, site_oficial,
+                      estado, cidade, categoria_filtro, ponto_id)).rowcount
             
-            conn.commit()
-            conn.close()
+            if not atualizado:
+                # Removido por outra requisição depois da leitura acima
+                flash("Ponto turístico não encontrado!")
+                return redirect(url_for('dashboard'))
+            
+            indice_sugestoes.adicionar({
+                'id': ponto_id, 'nome': nome, 'categoria': categoria, 'endereco': endereco, 'cidade': cidade
+            })
+            invalidar_cache_catalogo()
+            if imagem_atual != nova_imagem:
+                armazem_uploads.liberar(imagem_atual)
             
             flash("Ponto turístico atualizado com sucesso!")
             return redirect(url_for('dashboard'))
             
         except Exception as e:
-            conn.close()
             flash(f"Erro ao atualizar ponto turístico: {str(e)}")
             return redirect(url_for('editar_ponto', ponto_id=ponto_id))
     
@@ -985,42 +1207,36 @@ def excluir_ponto(ponto_id):
     if not is_logged_in() or not session.get('is_admin'):
         return redirect(url_for('login'))
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
     try:
-        # Buscar dados do ponto antes de excluir
-        cursor.execute('SELECT nome, imagem FROM pontos_turisticos WHERE id = ?', (ponto_id,))
-        ponto = cursor.fetchone()
+        with write_transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Buscar dados do ponto antes de excluir
+            cursor.execute('SELECT nome, imagem FROM pontos_turisticos WHERE id = ?', (ponto_id,))
+            ponto = cursor.fetchone()
+            
+            if ponto:
+                # Excluir avaliações relacionadas primeiro (devido à foreign key)
+                cursor.execute('DELETE FROM avaliacoes WHERE ponto_turistico_id = ?', (ponto_id,))
+                
+                # Excluir o ponto turístico
+                cursor.execute('DELETE FROM pontos_turisticos WHERE id = ?', (ponto_id,))
         
         if not ponto:
             flash("Ponto turístico não encontrado!")
             return redirect(url_for('dashboard'))
         
-        # Excluir avaliações relacionadas primeiro (devido à foreign key)
-        cursor.execute('DELETE FROM avaliacoes WHERE ponto_turistico_id = ?', (ponto_id,))
+        indice_sugestoes.remover(ponto_id)
+        # A exclusão também remove as avaliações do ponto
+        cache_paginas.invalidar('catalogo', 'avaliacoes')
         
-        # Excluir o ponto turístico
-        cursor.execute('DELETE FROM pontos_turisticos WHERE id = ?', (ponto_id,))
-        
-        conn.commit()
-        conn.close()
-        
-        # Tentar excluir a imagem do sistema de arquivos (opcional)
-        if ponto[1] and ponto[1] != 'default.jpg':
-            try:
-                import os
-                imagem_path = os.path.join(app.config['UPLOAD_FOLDER'], ponto[1])
-                if os.path.exists(imagem_path):
-                    os.remove(imagem_path)
-            except:
-                pass  # Ignorar erros de exclusão de arquivo
+        # O conteúdo é compartilhado: a imagem só sai do disco se nenhum outro registro a usa
+        armazem_uploads.liberar(ponto[1])
         
         flash(f"Ponto turístico '{ponto[0]}' excluído com sucesso!")
         return redirect(url_for('dashboard'))
         
     except Exception as e:
-        conn.close()
         flash(f"Erro ao excluir ponto turístico: {str(e)}")
         return redirect(url_for('editar_ponto', ponto_id=ponto_id))
 
@@ -1028,6 +1244,10 @@ def excluir_ponto(ponto_id):
 
 @app.route('/cadastrar', methods=['POST'])
 def cadastrar():
+    espera = limitador.permitir('cadastro_ip', request.remote_addr)
+    if espera:
+        return recusar_tentativa(espera)
+
     nome = request.form.get('nome')
     email = request.form.get('email')
     senha = request.form.get('senha')
@@ -1041,25 +1261,31 @@ def cadastrar():
         flash("As senhas não coincidem!")
         return redirect(url_for('login'))
     
-    conn = get_connection()
-    cursor = conn.cursor()
+    # O hash é calculado antes da transação para não segurar a fila de escrita
+    try:
+        senha_hash = hash_password(senha)
+    except FilaDeHashCheia as exc:
+        flash(str(exc))
+        return redirect(url_for('login'))
+
+    with write_transaction() as conn:
+        cursor = conn.cursor()
+        
+        # Verificar se usuário já existe
+        cursor.execute('SELECT id FROM usuarios WHERE nome = ? OR email = ?', (nome, email))
+        ja_existe = cursor.fetchone() is not None
+        
+        if not ja_existe:
+            # Cadastrar novo usuário
+            cursor.execute('''
+                INSERT INTO usuarios (nome, email, senha) 
+                VALUES (?, ?, ?)
+            ''', (nome, email, senha_hash))
     
-    # Verificar se usuário já existe
-    cursor.execute('SELECT id FROM usuarios WHERE nome = ? OR email = ?', (nome, email))
-    if cursor.fetchone():
+    if ja_existe:
         flash("Nome de usuário ou email já cadastrado!")
-        conn.close()
         return redirect(url_for('login'))
     
-    # Cadastrar novo usuário
-    cursor.execute('''
-        INSERT INTO usuarios (nome, email, senha) 
-        VALUES (?, ?, ?)
-    ''', (nome, email, hash_password(senha)))
-    
-    conn.commit()
-    conn.close()
-    
     flash("Usuário cadastrado com sucesso! Faça login para continuar.")
     return redirect(url_for('login'))
 
@@ -1068,63 +1294,174 @@ def adm():
     if not is_logged_in() or not session.get('is_admin'):
         return redirect(url_for('login'))
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM usuarios ORDER BY data_cadastro DESC')
-    usuarios = cursor.fetchall()
-
-    cursor.execute('SELECT COUNT(DISTINCT usuario_id) FROM visitas_pontos')
-    total_visitantes = cursor.fetchone()[0] or 0
-
-    cursor.execute('SELECT COUNT(DISTINCT usuario_id) FROM visitas_pontos WHERE origem_sudeste = 1')
-    visitantes_sudeste = cursor.fetchone()[0] or 0
-
-    visitantes_outros = total_visitantes - visitantes_sudeste if total_visitantes else 0
-
-    if total_visitantes:
-        percentual_sudeste = round((visitantes_sudeste / total_visitantes) * 100, 2)
-        percentual_outros = round((visitantes_outros / total_visitantes) * 100, 2)
-    else:
-        percentual_sudeste = 0.0
-        percentual_outros = 0.0
+    # Grava as visitas pendentes e agrega só o que entrou desde a última carga
+    buffer_visitas.descarregar()
+    atualizar_rollups()
+    atualizar_sketches()
+    resumo = resumo_visitantes(aproximado=app.config['VISITANTES_APROXIMADOS'])
+
+    # Paginação por cursor (keyset): o custo depende do tamanho da página, não das tabelas
+    por_pagina = tamanho_pagina(request.args.get('por_pagina'))
+    filtro_usuario = request.args.get('usuario', type=int)
+    filtro_ponto = request.args.get('ponto', type=int)
+    filtro_nota = request.args.get('nota', type=int)
+    try:
+        usuarios_apos = decodificar_cursor(request.args.get('usuarios_apos'), tipos=(str, int))
+        avaliacoes_apos = decodificar_cursor(request.args.get('avaliacoes_apos'), tipos=(str, int))
+    except ValueError as exc:
+        flash(str(exc))
+        return redirect(url_for('adm'))
 
-    cursor.execute('''
-        SELECT a.id, u.nome AS usuario_nome, pt.nome AS ponto_nome, a.nota, a.comentario, a.data_avaliacao
-        FROM avaliacoes a
-        JOIN usuarios u ON a.usuario_id = u.id
-        JOIN pontos_turisticos pt ON a.ponto_turistico_id = pt.id
-        ORDER BY a.data_avaliacao DESC
-    ''')
-    avaliacoes_rows = cursor.fetchall()
+    conn = get_connection()
+    usuarios, usuarios_proximo = buscar_pagina(
+        conn, 'SELECT * FROM usuarios', ('data_cadastro', 'id'), (9, 0),
+        apos=usuarios_apos, limite=por_pagina
+    )
 
-    avaliacoes = []
-    for row in avaliacoes_rows:
-        data_br = row[5]
-        if data_br:
-            try:
-                data_br = datetime.strptime(row[5], '%Y-%m-%d %H:%M:%S').strftime('%d/%m/%Y %H:%M')
-            except ValueError:
-                data_br = row[5]
+    filtros, params = [], []
+    if filtro_usuario:
+        filtros.append('a.usuario_id = ?')
+        params.append(filtro_usuario)
+    if filtro_ponto:
+        filtros.append('a.ponto_turistico_id = ?')
+        params.append(filtro_ponto)
+    if filtro_nota:
+        filtros.append('a.nota = ?')
+        params.append(filtro_nota)
+    avaliacoes_rows, avaliacoes_proximo = buscar_pagina(
+        conn, '''
+            SELECT a.id, u.nome AS usuario_nome, pt.nome AS ponto_nome, a.nota, a.comentario,
+                   COALESCE(strftime('%d/%m/%Y %H:%M', a.data_avaliacao), a.data_avaliacao),
+                   a.data_avaliacao
+            FROM avaliacoes a
+            JOIN usuarios u ON a.usuario_id = u.id
+            JOIN pontos_turisticos pt ON a.ponto_turistico_id = pt.id
+        ''', ('a.data_avaliacao', 'a.id'), (6, 0),
+        filtros=filtros, params=params, apos=avaliacoes_apos, limite=por_pagina
+    )
 
-        avaliacoes.append({
+    avaliacoes = [
+        {
             'id': row[0],
             'usuario': row[1],
             'ponto': row[2],
             'nota': row[3],
             'comentario': row[4] or '',
-            'data': data_br
-        })
+            'data': row[5]
+        }
+        for row in avaliacoes_rows
+    ]
+
+    paginacao = {
+        'por_pagina': por_pagina,
+        'usuarios_proximo': usuarios_proximo,
+        'avaliacoes_proximo': avaliacoes_proximo,
+        'filtros': {'usuario': filtro_usuario, 'ponto': filtro_ponto, 'nota': filtro_nota}
+    }
 
     visit_stats = {
-        'total_visitors': total_visitantes,
-        'southeast_count': visitantes_sudeste,
-        'other_count': visitantes_outros,
-        'southeast_percentage': percentual_sudeste,
-        'other_percentage': percentual_outros
+        'total_visitors': resumo['total_visitantes'],
+        'southeast_count': resumo['visitantes_sudeste'],
+        'other_count': resumo['visitantes_outros'],
+        'southeast_percentage': resumo['percentual_sudeste'],
+        'other_percentage': resumo['percentual_outros']
     }
     conn.close()
     
-    return render_template('adm.html', usuarios=usuarios, visit_stats=visit_stats, avaliacoes=avaliacoes)
+    return render_template('adm.html', usuarios=usuarios, visit_stats=visit_stats, avaliacoes=avaliacoes,
+                           paginacao=paginacao)
+
+@app.route('/admin/estatisticas/visitas')
+def estatisticas_visitas():
+    """Visitas e visitantes distintos por período (e opcionalmente por ponto), a partir dos rollups"""
+    if not is_logged_in() or not session.get('is_admin'):
+        return redirect(url_for('login'))
+
+    hoje = datetime.utcnow().date()
+    inicio = request.args.get('inicio') or hoje.replace(day=1).isoformat()
+    fim = request.args.get('fim') or hoje.isoformat()
+    ponto_id = request.args.get('ponto', type=int)
+    try:
+        if datetime.strptime(inicio, '%Y-%m-%d') > datetime.strptime(fim, '%Y-%m-%d'):
+            raise ValueError
+    except ValueError:
+        return jsonify({'erro': "Período inválido. Use inicio e fim no formato AAAA-MM-DD."}), 400
+
+    buffer_visitas.descarregar()
+    atualizar_rollups()
+    resultado = visitas_por_periodo(inicio, fim, ponto_id)
+    if request.args.get('aproximado') == '1':
+        atualizar_sketches()
+        resultado['visitantes_estimados'] = contar_visitantes_aproximado(inicio, fim, ponto_id)
+    return jsonify(resultado)
+
+@app.route('/admin/importar', methods=['POST'])
+def importar():
+    """Importa pontos turísticos de um arquivo CSV/JSON/NDJSON (upsert pelo nome)"""
+    if not is_logged_in() or not session.get('is_admin'):
+        return redirect(url_for('login'))
+
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({'erro': "Envie o arquivo no campo 'arquivo'."}), 400
+    try:
+        formato = formato_do_arquivo(arquivo.filename, request.form.get('formato'))
+        relatorio = importar_pontos(
+            ler_registros(abrir_texto(arquivo.stream), formato),
+            simular=request.form.get('simular') == '1'
+        )
+    except (ValueError, UnicodeDecodeError) as exc:
+        return jsonify({'erro': str(exc)}), 400
+
+    if not relatorio['simulacao'] and (relatorio['inseridos'] or relatorio['atualizados']):
+        carregar_indice_sugestoes()
+        invalidar_cache_catalogo()
+    return jsonify(relatorio)
+
+@app.route('/admin/exportar/<nome>')
+def exportar(nome):
+    """Exporta avaliacoes, usuarios ou visitas em CSV/NDJSON, transmitindo em lotes"""
+    if not is_logged_in() or not session.get('is_admin'):
+        return redirect(url_for('login'))
+
+    formato = request.args.get('formato', 'csv')
+    try:
+        spec = preparar_exportacao(
+            nome,
+            formato=formato,
+            pii=request.args.get('pii') == '1',
+            desde=request.args.get('desde'),
+            ate=request.args.get('ate'),
+            apos_id=request.args.get('apos_id', 0, type=int)
+        )
+    except ValueError as exc:
+        return jsonify({'erro': str(exc)}), 400
+
+    return Response(
+        stream_with_context(gerar_exportacao(spec)),
+        mimetype=FORMATOS[formato],
+        headers={'Content-Disposition': f'attachment; filename={nome}.{formato}'}
+    )
+
+@app.route('/admin/metricas')
+def metricas():
+    """Métricas internas de desempenho (apenas admin)"""
+    if not is_logged_in() or not session.get('is_admin'):
+        return redirect(url_for('login'))
+
+    return jsonify({
+        'pool_conexoes': get_pool_stats(),
+        'fila_escrita': get_writer_stats(),
+        'cache_paginas': cache_paginas.stats(),
+        'cache_cep': cep_cache.stats(),
+        'cache_usuarios': cache_usuarios.stats(),
+        'hash_senhas': servico_senhas.stats(),
+        'limites_tentativas': limitador.stats(),
+        'imagens': processador_imagens.stats(),
+        'estaticos': manifesto_estaticos.stats(),
+        'resolucao_enderecos': resolvedor_enderecos.stats(),
+        'buffer_visitas': buffer_visitas.stats()
+    })
 
 @app.route('/cadastrarUsuario', methods=['POST'])
 def cadastrarUsuario():
@@ -1139,27 +1476,207 @@ def cadastrarUsuario():
         flash("Todos os campos são obrigatórios!")
         return redirect(url_for('adm'))
     
-    conn = get_connection()
-    cursor = conn.cursor()
+    # O hash é calculado antes da transação para não segurar a fila de escrita
+    try:
+        senha_hash = hash_password(senha)
+    except FilaDeHashCheia as exc:
+        flash(str(exc))
+        return redirect(url_for('adm'))
+
+    with write_transaction() as conn:
+        cursor = conn.cursor()
+        
+        # Verificar se usuário já existe
+        cursor.execute('SELECT id FROM usuarios WHERE nome = ? OR email = ?', (nome, email))
+        ja_existe = cursor.fetchone() is not None
+        
+        if not ja_existe:
+            # Cadastrar novo usuário
+            cursor.execute('''
+                INSERT INTO usuarios (nome, email, senha) 
+                VALUES (?, ?, ?)
+            ''', (nome, email, senha_hash))
     
-    # Verificar se usuário já existe
-    cursor.execute('SELECT id FROM usuarios WHERE nome = ? OR email = ?', (nome, email))
-    if cursor.fetchone():
+    if ja_existe:
         flash("Nome de usuário ou email já cadastrado!")
-        conn.close()
         return redirect(url_for('adm'))
     
-    # Cadastrar novo usuário
-    cursor.execute('''
-        INSERT INTO usuarios (nome, email, senha) 
-        VALUES (?, ?, ?)
-    ''', (nome, email, hash_password(senha)))
-    
-    conn.commit()
-    conn.close()
-    
     flash("Usuário cadastrado com sucesso!")
     return redirect(url_for('adm'))
 
+@app.cli.command('reconstruir-agregados')
+def reconstruir_agregados():
+    """Recalcula as médias e contagens de avaliações materializadas"""
+    with write_transaction() as conn:
+        divergentes = rebuild_rating_aggregates(conn.cursor())
+    print(f"Agregados reconstruídos ({divergentes} ponto(s) divergente(s) corrigido(s)).")
+
+@app.cli.command('reconstruir-busca')
+def reconstruir_busca():
+    """Reconstrói o índice de busca textual"""
+    with write_transaction() as conn:
+        rebuild_search_index(conn.cursor())
+    print("Índice de busca reconstruído.")
+
+@app.cli.command('reconstruir-geo')
+def reconstruir_geo():
+    """Reconstrói o índice espacial de latitude/longitude"""
+    with write_transaction() as conn:
+        rebuild_geo_index(conn.cursor())
+    print("Índice espacial reconstruído.")
+
+@app.cli.command('aquecer-ceps')
+@click.argument('arquivo', type=click.File('r', encoding='utf-8'))
+@click.option('--forcar', is_flag=True, help='Consulta novamente mesmo os CEPs ainda válidos.')
+def aquecer_ceps(arquivo, forcar):
+    """Pré-carrega o cache com os CEPs do arquivo (um por linha)"""
+    ceps = (linha.strip() for linha in arquivo if linha.strip())
+    resumo = cep_cache.pre_aquecer(ceps, forcar=forcar)
+    print(f"{resumo['consultados']} consultado(s), {resumo['ignorados']} já em cache, {resumo['falhas']} falha(s).")
+
+@app.cli.command('atualizar-estatisticas')
+@click.option('--reconstruir', is_flag=True, help='Reagrega todo o histórico de visitas.')
+def atualizar_estatisticas(reconstruir):
+    """Atualiza os rollups de visitas a partir da marca d'água"""
+    if reconstruir:
+        processadas = reconstruir_rollups()
+        reconstruir_sketches()
+    else:
+        processadas = atualizar_rollups()
+        atualizar_sketches()
+    print(f"{processadas} visita(s) agregada(s).")
+
+@app.cli.command('relatorio-hll')
+def relatorio_hll():
+    """Precisão do HyperLogLog em dados sintéticos e nos sketches do banco"""
+    print("Dados sintéticos:")
+    for linha in relatorio_precisao():
+        print(f"  p={linha['precisao']:<2} exato={linha['exato']:<7} estimado={linha['estimado']:<7} "
+              f"erro={linha['erro_relativo']:.2%} (teórico {linha['erro_padrao_teorico']:.2%}), "
+              f"{linha['bytes']} bytes")
+
+    atualizar_sketches()
+    print("Sketches do banco x contagem exata em visitas_pontos:")
+    for linha in comparar_sketches_com_exato():
+        print(f"  {linha['escopo']:<16} exato={linha['exato']:<7} estimado={linha['estimado']:<7} "
+              f"erro={linha['erro_relativo']:.2%}")
+
+@app.cli.command('reclassificar-categorias')
+def reclassificar_categorias():
+    """Recalcula categoria_filtro de todos os pontos (após mudar as tabelas de categorias.py)"""
+    with write_transaction() as conn:
+        alterados = reclassificar_pontos(conn.cursor())
+    if alterados:
+        invalidar_cache_catalogo()
+    print(f"{alterados} ponto(s) reclassificado(s).")
+
+@app.cli.command('benchmark-categorias')
+@click.option('--pontos', default=20000, show_default=True, help='Tamanho do catálogo sintético.')
+def benchmark_categorias(pontos):
+    """Compara o classificador compilado com o laço de substrings anterior"""
+    resultado = comparar_classificadores(pontos)
+    print(f"{resultado['pontos']} pontos: laço {resultado['laco_ms']} ms, "
+          f"compilado {resultado['compilado_ms']} ms ({resultado['aceleracao']}x), "
+          f"{resultado['divergencias']} divergência(s).")
+    if resultado['divergencias']:
+        raise SystemExit(1)
+
+@app.cli.command('importar-pontos')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'json', 'ndjson']), help='Padrão: extensão do arquivo.')
+@click.option('--simular', is_flag=True, help='Valida e conta, sem gravar.')
+@click.option('--lote', default=500, show_default=True, type=click.IntRange(min=1),
+              help='Registros por transação.')
+def importar_pontos_cli(arquivo, formato, simular, lote):
+    """Importa pontos turísticos de CSV/JSON/NDJSON (upsert pelo nome)"""
+    try:
+        formato = formato_do_arquivo(arquivo, formato)
+        with open(arquivo, encoding='utf-8-sig', newline='') as entrada:
+            relatorio = importar_pontos(ler_registros(entrada, formato), lote=lote, simular=simular)
+    except ValueError as exc:
+        print(exc)
+        raise SystemExit(1)
+
+    for erro in relatorio['erros']:
+        print(f"linha {erro['linha']}: {erro['erro']}")
+    prefixo = "[simulação] " if simular else ""
+    print(f"{prefixo}{relatorio['lidos']} lido(s), {relatorio['inseridos']} inserido(s), "
+          f"{relatorio['atualizados']} atualizado(s), {relatorio['invalidos']} inválido(s) "
+          f"em {relatorio['segundos']} s ({relatorio['registros_por_segundo']} registros/s).")
+    if not simular and (relatorio['inseridos'] or relatorio['atualizados']):
+        invalidar_cache_catalogo()
+
+@app.cli.command('benchmark-senhas')
+@click.option('--duracao', default=1.0, show_default=True, help='Segundos por medição.')
+def benchmark_senhas(duracao):
+    """Logins por segundo (verificações de senha) em cada esquema e custo"""
+    for linha in medir_logins_por_segundo(duracao=duracao):
+        print(f"{linha['configuracao']:<24} {linha['threads']} thread(s): "
+              f"{linha['logins_por_segundo']} logins/s")
+
+@app.cli.command('processar-imagens')
+def processar_imagens():
+    """Gera variantes para imagens enviadas antes do pipeline e atualiza as referências"""
+    pasta = app.config['UPLOAD_FOLDER']
+    conn = get_connection()
+    pontos = conn.execute(
+        "SELECT DISTINCT imagem FROM pontos_turisticos WHERE imagem IS NOT NULL AND imagem != 'default.jpg'"
+    ).fetchall()
+    fotos = conn.execute(
+        "SELECT DISTINCT foto_perfil FROM usuarios WHERE foto_perfil LIKE 'uploads/%'"
+    ).fetchall()
+    conn.close()
+
+    convertidas = 0
+    referencias = [('pontos_turisticos', 'imagem', row[0], '') for row in pontos] + \
+                  [('usuarios', 'foto_perfil', row[0], 'uploads/') for row in fotos]
+    for tabela, coluna, valor, prefixo in referencias:
+        arquivo = valor[len(prefixo):]
+        caminho = os.path.join(pasta, arquivo)
+        if nome_variante(valor, 'miniatura') != valor or not os.path.isfile(caminho):
+            continue  # já processada ou arquivo ausente
+        try:
+            novo = processador_imagens.processar_arquivo(caminho)
+        except (ValueError, OSError) as exc:
+            print(f"{arquivo}: ignorada ({exc})")
+            continue
+        with write_transaction() as write_conn:
+            write_conn.execute(f'UPDATE {tabela} SET {coluna} = ? WHERE {coluna} = ?', (prefixo + novo, valor))
+        convertidas += 1
+    invalidar_cache_catalogo()
+    cache_usuarios.limpar()
+    print(f"{convertidas} imagens convertidas.")
+
+@app.cli.command('coletar-uploads')
+@click.option('--simular', is_flag=True, help='Só relata o que seria removido.')
+@click.option('--carencia', type=int, default=None, help='Segundos de carência (padrão: UPLOADS_CARENCIA).')
+def coletar_uploads(simular, carencia):
+    """Remove da pasta de uploads os arquivos que nenhum registro referencia"""
+    armazem = armazem_uploads if carencia is None else ArmazemUploads(
+        app.config['UPLOAD_FOLDER'], carencia=carencia, variantes=armazem_uploads.variantes)
+    uso = armazem.uso()
+    relatorio = armazem.coletar(simular=simular)
+    prefixo = "[simulação] " if simular else ""
+    print(f"{uso['arquivos']} arquivo(s), {uso['bytes'] / 1024 / 1024:.1f} MB; "
+          f"{uso['referencias_deduplicadas']} referência(s) reaproveitando conteúdo já salvo.")
+    print(f"{prefixo}{relatorio['removidos']} removido(s) ({relatorio['bytes_liberados'] / 1024 / 1024:.1f} MB), "
+          f"{relatorio['em_carencia']} órfão(s) ainda em carência, {relatorio['referenciados']} em uso.")
+
+@app.cli.command('comprimir-estaticos')
+def comprimir_estaticos():
+    """Gera versões .gz (e .br, com brotli instalado) de CSS/JS/SVG para servir pré-comprimidas"""
+    print(f"{manifesto_estaticos.comprimir()} arquivo(s) comprimido(s).")
+
+@app.cli.command('verificar-planos')
+def verificar_planos():
+    """Falha se alguma consulta quente fizer varredura completa de tabela"""
+    problemas = check_query_plans()
+    if not problemas:
+        print("Todas as consultas quentes usam índices.")
+        return
+    for nome, varreduras in problemas.items():
+        print(f"{nome}: {'; '.join(varreduras)}")
+    raise SystemExit(1)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,63 @@
+import base64
+import binascii
+import json
+
+TAMANHO_PAGINA_PADRAO = 50
+TAMANHO_PAGINA_MAXIMO = 200
+
+
+def codificar_cursor(*valores):
+    """Cursor opaco (base64 de JSON) com os valores da chave de ordenação do último item"""
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, campos=2, tipos=None):
+    """Valores do cursor; tipos (ex.: (str, int)) confere cada valor com a coluna da chave"""
+    if not cursor:
+        return None
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        raise ValueError("Cursor de paginação inválido.")
+    if not isinstance(valores, list) or len(valores) != campos:
+        raise ValueError("Cursor de paginação inválido.")
+    # Só escalares chegam ao SQLite: listas ou objetos adulterados viravam erro 500 no bind
+    tipos = tipos or ((str, int, float),) * campos
+    for valor, tipo in zip(valores, tipos):
+        if isinstance(valor, bool) or not isinstance(valor, tipo):
+            raise ValueError("Cursor de paginação inválido.")
+    return valores
+
+
+def tamanho_pagina(valor, padrao=TAMANHO_PAGINA_PADRAO, maximo=TAMANHO_PAGINA_MAXIMO):
+    """Tamanho de página pedido, limitado a [1, maximo]"""
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        return padrao
+    return max(1, min(valor, maximo))
+
+
+def buscar_pagina(conn, sql, chave, posicoes_chave, filtros=(), params=(), apos=None, limite=TAMANHO_PAGINA_PADRAO):
+    """Página em ordem decrescente de chave (coluna de ordenação, id) a partir do cursor apos.
+
+    sql é o SELECT sem WHERE/ORDER BY; posicoes_chave são os índices das colunas da chave
+    em cada linha retornada, usados para montar o cursor da próxima página.
+    """
+    condicoes = list(filtros)
+    valores = list(params)
+    if apos is not None:
+        # Comparação por row value: o SQLite percorre o índice da coluna de ordenação a partir do cursor
+        condicoes.append(f'({chave[0]}, {chave[1]}) < (?, ?)')
+        valores.extend(apos)
+    where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ''
+    rows = conn.execute(
+        f'{sql}{where} ORDER BY {chave[0]} DESC, {chave[1]} DESC LIMIT ?', valores + [limite + 1]
+    ).fetchall()
+
+    proximo = None
+    if len(rows) > limite:
+        rows = rows[:limite]
+        ultimo = rows[-1]
+        proximo = codificar_cursor(*(ultimo[posicao] for posicao in posicoes_chave))
+    return rows, proximo
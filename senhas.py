@@ -0,0 +1,173 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Formatos armazenados na coluna usuarios.senha:
+#   pbkdf2_sha256$<iterações>$<salt>$<hash>
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+#   64 dígitos hexadecimais: SHA-256 sem salt (legado, trocado no próximo login)
+ESQUEMA_PADRAO = 'pbkdf2_sha256'
+PBKDF2_ITERACOES = 600000
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+TAMANHO_SALT = 16
+
+_SHA256_LEGADO = re.compile(r'^[0-9a-f]{64}$')
+
+
+class FilaDeHashCheia(RuntimeError):
+    """Há cálculos de hash demais na fila; a requisição deve ser recusada"""
+
+
+def _b64(dados):
+    return base64.b64encode(dados).decode().rstrip('=')
+
+
+def _de_b64(texto):
+    return base64.b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def gerar_hash(senha, esquema=ESQUEMA_PADRAO, iteracoes=PBKDF2_ITERACOES,
+               n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """Hash com salt aleatório no formato versionado do esquema"""
+    salt = os.urandom(TAMANHO_SALT)
+    if esquema == 'pbkdf2_sha256':
+        derivado = hashlib.pbkdf2_hmac('sha256', senha.encode(), salt, iteracoes)
+        return f'pbkdf2_sha256${iteracoes}${_b64(salt)}${_b64(derivado)}'
+    if esquema == 'scrypt':
+        derivado = hashlib.scrypt(senha.encode(), salt=salt, n=n, r=r, p=p,
+                                  maxmem=256 * n * r + 1024 * 1024)
+        return f'scrypt${n}${r}${p}${_b64(salt)}${_b64(derivado)}'
+    raise ValueError(f"Esquema de senha desconhecido: {esquema}")
+
+
+def verificar_senha(senha, armazenado):
+    """Confere a senha contra qualquer formato suportado (comparação em tempo constante)"""
+    if not senha or not armazenado:
+        return False
+    if _SHA256_LEGADO.match(armazenado):
+        return hmac.compare_digest(hashlib.sha256(senha.encode()).hexdigest(), armazenado)
+
+    partes = armazenado.split('$')
+    try:
+        if partes[0] == 'pbkdf2_sha256' and len(partes) == 4:
+            esperado = _de_b64(partes[3])
+            derivado = hashlib.pbkdf2_hmac('sha256', senha.encode(), _de_b64(partes[2]), int(partes[1]))
+        elif partes[0] == 'scrypt' and len(partes) == 6:
+            n, r, p = int(partes[1]), int(partes[2]), int(partes[3])
+            esperado = _de_b64(partes[5])
+            derivado = hashlib.scrypt(senha.encode(), salt=_de_b64(partes[4]), n=n, r=r, p=p,
+                                      maxmem=256 * n * r + 1024 * 1024, dklen=len(esperado))
+        else:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(derivado, esperado)
+
+
+def precisa_rehash(armazenado, esquema=ESQUEMA_PADRAO, iteracoes=PBKDF2_ITERACOES,
+                   n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """True se o hash é legado ou foi gerado com outro esquema/custo que o configurado"""
+    partes = (armazenado or '').split('$')
+    if esquema == 'pbkdf2_sha256':
+        return partes[0] != 'pbkdf2_sha256' or partes[1:2] != [str(iteracoes)]
+    if esquema == 'scrypt':
+        return partes[0] != 'scrypt' or partes[1:4] != [str(n), str(r), str(p)]
+    return True
+
+
+class ServicoSenhas:
+    """Calcula hashes num pool limitado de threads.
+
+    hashlib libera o GIL durante PBKDF2/scrypt, então os hashes rodam em paralelo sem
+    travar as threads que atendem requisições. A fila é limitada por max_pendentes: numa
+    rajada de logins, o excedente recebe FilaDeHashCheia em vez de se acumular.
+    """
+
+    def __init__(self, max_workers=2, max_pendentes=32, espera=5.0, esquema=ESQUEMA_PADRAO,
+                 iteracoes=PBKDF2_ITERACOES, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+        self.espera = espera
+        self.parametros = {'esquema': esquema, 'iteracoes': iteracoes, 'n': n, 'r': r, 'p': p}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='senhas')
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self._lock = threading.Lock()
+        self._contadores = {'hashes': 0, 'verificacoes': 0, 'rejeitados': 0, 'tempo_total': 0.0}
+
+    def _executar(self, funcao, *args):
+        if not self._vagas.acquire(timeout=self.espera):
+            with self._lock:
+                self._contadores['rejeitados'] += 1
+            raise FilaDeHashCheia("Muitas tentativas simultâneas. Tente novamente em instantes.")
+        inicio = time.perf_counter()
+        try:
+            return self._executor.submit(funcao, *args).result()
+        finally:
+            self._vagas.release()
+            with self._lock:
+                self._contadores['tempo_total'] += time.perf_counter() - inicio
+
+    def gerar(self, senha):
+        with self._lock:
+            self._contadores['hashes'] += 1
+        return self._executar(lambda: gerar_hash(senha, **self.parametros))
+
+    def verificar(self, senha, armazenado):
+        with self._lock:
+            self._contadores['verificacoes'] += 1
+        return self._executar(verificar_senha, senha, armazenado)
+
+    def precisa_rehash(self, armazenado):
+        return precisa_rehash(armazenado, **self.parametros)
+
+    def stats(self):
+        with self._lock:
+            contadores = dict(self._contadores)
+        total = contadores['hashes'] + contadores['verificacoes']
+        tempo_total = contadores.pop('tempo_total')
+        contadores['ms_medio'] = round(tempo_total / total * 1000, 2) if total else 0.0
+        return contadores
+
+    def encerrar(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def medir_logins_por_segundo(configuracoes=None, duracao=1.0, threads=(1, 4)):
+    """Benchmark: verificações de senha por segundo para cada esquema/custo e nº de threads"""
+    configuracoes = configuracoes or [
+        {'esquema': 'pbkdf2_sha256', 'iteracoes': 100000},
+        {'esquema': 'pbkdf2_sha256', 'iteracoes': 310000},
+        {'esquema': 'pbkdf2_sha256', 'iteracoes': 600000},
+        {'esquema': 'scrypt', 'n': 2 ** 14},
+        {'esquema': 'scrypt', 'n': 2 ** 15},
+    ]
+    resultados = []
+    for configuracao in configuracoes:
+        armazenado = gerar_hash('senha-de-teste', **configuracao)
+        for quantidade in threads:
+            fim = time.perf_counter() + duracao
+            contagem = [0] * quantidade
+
+            def trabalhar(indice):
+                while time.perf_counter() < fim:
+                    verificar_senha('senha-de-teste', armazenado)
+                    contagem[indice] += 1
+
+            inicio = time.perf_counter()
+            trabalhadores = [threading.Thread(target=trabalhar, args=(i,)) for i in range(quantidade)]
+            for trabalhador in trabalhadores:
+                trabalhador.start()
+            for trabalhador in trabalhadores:
+                trabalhador.join()
+            decorrido = time.perf_counter() - inicio
+            resultados.append({
+                'configuracao': armazenado.rsplit('$', 2)[0],
+                'threads': quantidade,
+                'logins_por_segundo': round(sum(contagem) / decorrido, 1)
+            })
+    return resultados
@@ -0,0 +1,149 @@
+import heapq
+import re
+import threading
+import time
+
+from texto import normalize_text
+
+# Campos indexados e sua prioridade na ordenação (menor aparece primeiro)
+CAMPOS_INDEXADOS = (('nome', 1), ('categoria', 2), ('cidade', 3), ('endereco', 3))
+
+# Profundidade máxima da trie; consultas mais longas são confirmadas no texto completo
+PROFUNDIDADE_MAXIMA = 24
+
+_PALAVRA = re.compile(r'\w+')
+
+
+def normalizar_chave(texto):
+    """Minúsculas, sem acentos e sem pontuação, com palavras separadas por um espaço"""
+    return ' '.join(_PALAVRA.findall(normalize_text(texto)))
+
+
+class _No:
+    __slots__ = ('filhos', 'ids', 'melhores')
+
+    def __init__(self):
+        self.filhos = {}
+        self.ids = {}  # ponto_id -> melhor prioridade entre as chaves que passam por este nó
+        self.melhores = None  # top-N já ordenado; descartado quando o nó muda
+
+
+class IndicePrefixos:
+    """Trie em memória com os prefixos de cada palavra de nome, categoria, cidade e endereço.
+
+    Cada nó guarda os pontos alcançáveis a partir dele e memoriza o seu top-N,
+    então uma busca é só a descida pelos caracteres do termo.
+    """
+
+    def __init__(self, limite=8):
+        self.limite = limite
+        self._raiz = _No()
+        self._pontos = {}  # ponto_id -> (nome normalizado, textos normalizados, sugestão, chaves)
+        self._lock = threading.RLock()
+        self.carregado_em = 0.0
+
+    @staticmethod
+    def _chaves(textos):
+        chaves = {}
+        for campo, prioridade in CAMPOS_INDEXADOS:
+            texto = textos[campo]
+            for palavra in _PALAVRA.finditer(texto):
+                chave = texto[palavra.start():palavra.start() + PROFUNDIDADE_MAXIMA]
+                if prioridade < chaves.get(chave, prioridade + 1):
+                    chaves[chave] = prioridade
+        return chaves
+
+    def adicionar(self, ponto):
+        """Indexa (ou reindexa) um ponto: dicionário com id, nome, categoria, cidade e endereco"""
+        textos = {campo: normalizar_chave(ponto.get(campo)) for campo, _ in CAMPOS_INDEXADOS}
+        chaves = self._chaves(textos)
+        sugestao = {
+            'nome': ponto.get('nome'),
+            'categoria': ponto.get('categoria'),
+            'endereco': ponto.get('endereco')
+        }
+        with self._lock:
+            self.remover(ponto['id'])
+            self._pontos[ponto['id']] = (textos['nome'], textos, sugestao, chaves)
+            for chave, prioridade in chaves.items():
+                no = self._raiz
+                for caractere in chave:
+                    no = no.filhos.setdefault(caractere, _No())
+                    if prioridade < no.ids.get(ponto['id'], prioridade + 1):
+                        no.ids[ponto['id']] = prioridade
+                        no.melhores = None
+
+    def remover(self, ponto_id):
+        """Retira um ponto do índice, podando os nós que ficarem vazios"""
+        with self._lock:
+            registro = self._pontos.pop(ponto_id, None)
+            if registro is None:
+                return
+            for chave in registro[3]:
+                caminho = [self._raiz]
+                for caractere in chave:
+                    no = caminho[-1].filhos.get(caractere)
+                    if no is None:
+                        break
+                    if no.ids.pop(ponto_id, None) is not None:
+                        no.melhores = None
+                    caminho.append(no)
+                for pai, caractere in zip(reversed(caminho[:-1]), reversed(chave[:len(caminho) - 1])):
+                    filho = pai.filhos[caractere]
+                    if filho.ids or filho.filhos:
+                        break
+                    del pai.filhos[caractere]
+
+    def reconstruir(self, pontos):
+        """Substitui todo o conteúdo do índice"""
+        with self._lock:
+            self._raiz = _No()
+            self._pontos = {}
+            for ponto in pontos:
+                self.adicionar(ponto)
+            self.carregado_em = time.monotonic()
+
+    def buscar(self, termo, limite=None):
+        """Melhores sugestões para o termo: prioridade do campo e, depois, nome"""
+        consulta = normalizar_chave(termo)
+        if not consulta:
+            return []
+
+        with self._lock:
+            no = self._raiz
+            for caractere in consulta[:PROFUNDIDADE_MAXIMA]:
+                no = no.filhos.get(caractere)
+                if no is None:
+                    return []
+            limite = limite or self.limite
+            if len(consulta) > PROFUNDIDADE_MAXIMA:
+                candidatos = [(ponto_id, prioridade) for ponto_id, prioridade in no.ids.items()
+                              if self._contem_prefixo(ponto_id, consulta)]
+                melhores = self._ordenar(candidatos, limite)
+            elif limite == self.limite:
+                if no.melhores is None:
+                    no.melhores = self._ordenar(no.ids.items(), limite)
+                melhores = no.melhores
+            else:
+                melhores = self._ordenar(no.ids.items(), limite)
+            return [dict(self._pontos[ponto_id][2]) for ponto_id in melhores]
+
+    def _ordenar(self, candidatos, limite):
+        melhores = heapq.nsmallest(limite, candidatos, key=lambda item: (item[1], self._pontos[item[0]][0]))
+        return [ponto_id for ponto_id, _ in melhores]
+
+    def _contem_prefixo(self, ponto_id, consulta):
+        textos = self._pontos[ponto_id][1]
+        for texto in textos.values():
+            inicio = texto.find(consulta)
+            while inicio != -1:
+                if inicio == 0 or texto[inicio - 1] == ' ':
+                    return True
+                inicio = texto.find(consulta, inicio + 1)
+        return False
+
+    def expirado(self, max_idade):
+        return time.monotonic() - self.carregado_em > max_idade
+
+    def __len__(self):
+        return len(self._pontos)
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+@pytest.fixture
+def banco(tmp_path):
+    """Banco SQLite temporário com o esquema e os dados iniciais"""
+    database.configure_database(path=str(tmp_path / 'turismo.db'))
+    database.init_database()
+    yield database
+    database.configure_database(path=str(tmp_path / 'descartado.db'))
+
+
+@pytest.fixture(scope='session')
+def aplicacao(tmp_path_factory):
+    """Módulo main importado num diretório temporário (ele cria o banco e os uploads no diretório atual)"""
+    anterior = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('aplicacao'))
+    try:
+        import main
+    finally:
+        os.chdir(anterior)
+    main.app.config['TESTING'] = True
+    return main
+
+
+@pytest.fixture
+def cliente(banco, aplicacao):
+    """Cliente de teste da aplicação sobre o banco temporário, com os caches em memória zerados"""
+    aplicacao.cache_paginas.limpar()
+    aplicacao.cache_usuarios.limpar()
+    aplicacao.carregar_indice_sugestoes()
+    return aplicacao.app.test_client()
+
+
+
+@pytest.fixture
+def admin(cliente, banco):
+    """Cliente com a sessão do administrador criado por init_database()"""
+    conn = banco.get_connection()
+    admin_id = conn.execute("SELECT id FROM usuarios WHERE nome = 'admin'").fetchone()[0]
+    conn.close()
+    with cliente.session_transaction() as sessao:
+        sessao['user_id'] = admin_id
+        sessao['is_admin'] = True
+    return cliente
@@ -0,0 +1,77 @@
+from database import HOT_QUERIES, explain_query_plan, rebuild_rating_aggregates
+
+
+def _agregado(conn, ponto_id):
+    return conn.execute('''
+        SELECT total_avaliacoes, soma_notas, media_avaliacoes FROM pontos_agregados WHERE ponto_turistico_id = ?
+    ''', (ponto_id,)).fetchone()
+
+
+def _usuarios(conn, quantidade):
+    conn.executemany('INSERT INTO usuarios (nome, email, senha) VALUES (?, ?, ?)',
+                     [(f'u{i}', f'u{i}@teste', 'x') for i in range(quantidade)])
+    return [row[0] for row in conn.execute("SELECT id FROM usuarios WHERE nome LIKE 'u%' ORDER BY id")]
+
+
+def test_gatilhos_mantem_os_agregados(banco):
+    with banco.write_transaction() as conn:
+        usuarios = _usuarios(conn, 3)
+        for usuario, nota in zip(usuarios, (5, 4, 4)):
+            conn.execute('INSERT INTO avaliacoes (usuario_id, ponto_turistico_id, nota) VALUES (?, 1, ?)',
+                         (usuario, nota))
+        assert _agregado(conn, 1) == (3, 13, 4.3)
+
+        conn.execute('UPDATE avaliacoes SET nota = 1 WHERE usuario_id = ?', (usuarios[0],))
+        assert _agregado(conn, 1) == (3, 9, 3.0)
+
+        # Avaliação movida para outro ponto sai de um agregado e entra no outro
+        conn.execute('UPDATE avaliacoes SET ponto_turistico_id = 2 WHERE usuario_id = ?', (usuarios[1],))
+        assert _agregado(conn, 1) == (2, 5, 2.5)
+        assert _agregado(conn, 2) == (1, 4, 4.0)
+
+        conn.execute('DELETE FROM avaliacoes WHERE ponto_turistico_id = 1')
+        assert _agregado(conn, 1) == (0, 0, 0)
+
+
+def test_ponto_novo_e_removido(banco):
+    with banco.write_transaction() as conn:
+        novo = conn.execute('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude)
+            VALUES ('Novo', 'd', 'Rua, Niterói - RJ', -22.9, -43.1)
+        ''').lastrowid
+        assert _agregado(conn, novo) == (0, 0, 0)
+        conn.execute('DELETE FROM pontos_turisticos WHERE id = ?', (novo,))
+        assert _agregado(conn, novo) is None
+
+
+def test_reconstrucao_conta_divergencias(banco):
+    with banco.write_transaction() as conn:
+        usuario = _usuarios(conn, 1)[0]
+        conn.execute('INSERT INTO avaliacoes (usuario_id, ponto_turistico_id, nota) VALUES (?, 2, 3)', (usuario,))
+        assert rebuild_rating_aggregates(conn.cursor()) == 0
+
+        conn.execute('UPDATE pontos_agregados SET total_avaliacoes = 7 WHERE ponto_turistico_id = 2')
+        conn.execute('DELETE FROM pontos_agregados WHERE ponto_turistico_id = 3')
+        assert rebuild_rating_aggregates(conn.cursor()) == 2
+        assert _agregado(conn, 2) == (1, 3, 3.0)
+        assert _agregado(conn, 3) == (0, 0, 0)
+        assert rebuild_rating_aggregates(conn.cursor()) == 0
+
+
+def test_ranking_lido_na_ordem_do_indice(banco):
+    sql, params = HOT_QUERIES['ranking_pontos']
+    # Sem estatísticas, só com as de pontos_turisticos (banco analisado antes de pontos_agregados
+    # existir: o planejador supõe a tabela sem estatísticas enorme) e com todas
+    for analisar in (None, 'ANALYZE pontos_turisticos', 'ANALYZE'):
+        if analisar:
+            conn = banco.get_connection()
+            conn.execute(analisar)
+            conn.commit()
+            conn.close()
+            banco.configure_database(path=banco._pool.path)
+        conn = banco.get_connection()
+        plano = explain_query_plan(conn, sql, params)
+        conn.close()
+        assert plano[0].startswith('SCAN ag USING COVERING INDEX idx_agregados_ranking'), plano
+        # Só o desempate por nome é ordenado à parte
+        assert 'USE TEMP B-TREE FOR ORDER BY' not in plano
@@ -0,0 +1,99 @@
+import io
+import os
+import time
+
+import pytest
+
+import armazenamento
+from armazenamento import ArmazemUploads, gravar_temporario, nome_base
+
+HASH = '0123456789abcdef'
+OUTRO = 'fedcba9876543210'
+
+
+def _criar(pasta, nome, idade=7200, conteudo=b'x' * 10):
+    caminho = pasta / nome
+    caminho.write_bytes(conteudo)
+    antigo = time.time() - idade
+    os.utime(caminho, (antigo, antigo))
+
+
+@pytest.fixture
+def pasta(tmp_path):
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    return uploads
+
+
+def _referenciar(banco, imagem):
+    with banco.write_transaction() as conn:
+        conn.execute('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, imagem)
+            VALUES (?, 'd', 'e', 0, 0, ?)
+        ''', (f'Ponto {imagem}', imagem))
+
+
+def test_gravar_temporario_calcula_o_hash(tmp_path):
+    caminho, hash_conteudo = gravar_temporario(io.BytesIO(b'conteudo'), str(tmp_path), inicio=b'um ')
+    with open(caminho, 'rb') as arquivo:
+        assert arquivo.read() == b'um conteudo'
+    outro, mesmo_hash = gravar_temporario(io.BytesIO(b'um conteudo'), str(tmp_path))
+    assert mesmo_hash == hash_conteudo and len(hash_conteudo) == armazenamento.TAMANHO_HASH
+    assert caminho != outro
+
+
+def test_nome_base():
+    assert nome_base(f'{HASH}_miniatura.webp') == f'{HASH}.webp'
+    assert nome_base(f'{HASH}.png') == f'{HASH}.png'
+    assert nome_base('foto.jpg') == 'foto.jpg'
+
+
+def test_liberar_remove_base_e_variantes_sem_listar_a_pasta(banco, pasta, monkeypatch):
+    for nome in (f'{HASH}.webp', f'{HASH}_miniatura.webp', f'{HASH}_card.webp', f'{OUTRO}.webp'):
+        _criar(pasta, nome)
+    armazem = ArmazemUploads(str(pasta), carencia=3600, variantes=('miniatura', 'card'))
+
+    def listar(*args):
+        raise AssertionError("liberar() não deve listar a pasta")
+    monkeypatch.setattr(os, 'scandir', listar)
+
+    assert armazem.liberar(f'{HASH}.webp') == 30
+    assert sorted(os.listdir(pasta)) == [f'{OUTRO}.webp']
+
+
+def test_liberar_respeita_referencias_e_carencia(banco, pasta):
+    _criar(pasta, f'{HASH}.webp')
+    _criar(pasta, f'{OUTRO}.webp', idade=0)
+    _criar(pasta, 'default.jpg')
+    armazem = ArmazemUploads(str(pasta), carencia=3600, variantes=('miniatura',))
+    _referenciar(banco, f'{HASH}.webp')
+
+    assert armazem.liberar(f'{HASH}.webp') == 0
+    assert armazem.liberar(f'{OUTRO}.webp') == 0
+    assert armazem.liberar('default.jpg') == 0
+    assert armazem.liberar('../fora.webp') == 0
+    assert armazem.liberar(f'{HASH}.png') == 0  # não existe
+    assert len(os.listdir(pasta)) == 3
+
+
+def test_coletar_orfaos(banco, pasta):
+    _criar(pasta, f'{HASH}.webp')
+    _criar(pasta, f'{HASH}_miniatura.webp')
+    _criar(pasta, f'{OUTRO}.webp')
+    _criar(pasta, f'{OUTRO}_antiga.webp')  # variante de uma configuração anterior
+    _criar(pasta, 'aaaaaaaaaaaaaaaa.png', idade=0)
+    _criar(pasta, '.envio-abandonado')
+    _referenciar(banco, f'{HASH}.webp')
+    armazem = ArmazemUploads(str(pasta), carencia=3600, variantes=('miniatura',))
+
+    simulado = armazem.coletar(simular=True)
+    assert simulado['removidos'] == 3 and simulado['simulacao']
+    assert len(os.listdir(pasta)) == 6
+
+    relatorio = armazem.coletar()
+    assert relatorio['arquivos'] == 6
+    assert relatorio['referenciados'] == 2
+    assert relatorio['em_carencia'] == 1
+    assert relatorio['removidos'] == 3
+    assert relatorio['bytes_liberados'] == 30
+    assert sorted(os.listdir(pasta)) == sorted([f'{HASH}.webp', f'{HASH}_miniatura.webp', 'aaaaaaaaaaaaaaaa.png'])
@@ -0,0 +1,55 @@
+from database import FTS_WEIGHTS, fts_match_expression
+
+PESOS = ', '.join(map(str, FTS_WEIGHTS))
+
+
+def _buscar(conn, termo):
+    return [row[0] for row in conn.execute(f'''
+        SELECT pt.nome FROM pontos_busca
+        JOIN pontos_turisticos pt ON pt.id = pontos_busca.rowid
+        WHERE pontos_busca MATCH ?
+        ORDER BY bm25(pontos_busca, {PESOS}), pt.nome
+    ''', (fts_match_expression(termo),))]
+
+
+def test_expressao_de_busca():
+    assert fts_match_expression('São  Conrado!') == '"sao"* "conrado"*'
+    assert fts_match_expression('praia', colunas=('nome',)) == '{nome} : ("praia"*)'
+    assert fts_match_expression(' ?! ') is None
+    # Aspas digitadas não escapam da expressão
+    assert fts_match_expression('"cristo" OR') == '"cristo"* "or"*'
+
+
+def test_busca_ignora_acentos_e_aceita_prefixo(banco):
+    conn = banco.get_connection()
+    assert _buscar(conn, 'pao de acucar') == ['Pão de Açúcar']
+    assert _buscar(conn, 'PÃO AÇÚ') == ['Pão de Açúcar']
+    assert _buscar(conn, 'botan') == ['Jardim Botânico']
+    assert _buscar(conn, 'inexistentexyz') == []
+    conn.close()
+
+
+def test_nome_pesa_mais_que_descricao(banco):
+    with banco.write_transaction() as conn:
+        conn.execute('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude)
+            VALUES ('Mirante', 'Vista para o Museu do Amanhã e a baía.', 'Centro, Rio de Janeiro - RJ', -22.9, -43.2)
+        ''')
+        conn.execute('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude)
+            VALUES ('Museu Nacional', 'Acervo de história natural.', 'São Cristóvão, Rio de Janeiro - RJ', -22.9, -43.2)
+        ''')
+    conn = banco.get_connection()
+    assert _buscar(conn, 'museu') == ['Museu Nacional', 'Mirante']
+    conn.close()
+
+
+def test_gatilhos_mantem_o_indice(banco):
+    with banco.write_transaction() as conn:
+        conn.execute("UPDATE pontos_turisticos SET nome = 'Lapa Boêmia' WHERE nome = 'Lapa'")
+        conn.execute("DELETE FROM pontos_turisticos WHERE nome = 'Jardim Botânico'")
+    conn = banco.get_connection()
+    assert _buscar(conn, 'boemia') == ['Lapa Boêmia']
+    assert _buscar(conn, 'botanico') == []
+    conn.execute("INSERT INTO pontos_busca (pontos_busca) VALUES ('integrity-check')")
+    conn.close()
@@ -0,0 +1,41 @@
+import time
+
+from cache import CacheLRU
+
+
+def test_descarte_lru():
+    cache = CacheLRU(max_itens=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expiracao():
+    cache = CacheLRU(ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+
+
+def test_invalidacao_por_tag_remove_so_dependentes():
+    cache = CacheLRU()
+    cache.set('pagina', 1, tags=('catalogo',))
+    cache.set('outra', 2, tags=('avaliacoes',))
+    cache.invalidar('catalogo')
+    assert cache.get('pagina') is None
+    assert cache.get('outra') == 2
+
+
+def test_valor_calculado_antes_da_invalidacao_nao_e_gravado():
+    cache = CacheLRU()
+
+    def fabrica():
+        cache.invalidar('catalogo')
+        return 'antigo'
+
+    assert cache.get_or_set('pagina', fabrica, tags=('catalogo',)) == 'antigo'
+    assert cache.get('pagina') is None
@@ -0,0 +1,30 @@
+import pytest
+
+from categorias import (DEFAULT_FILTER_CATEGORY, _classificar_por_laco, _catalogo_sintetico,
+                        map_categoria_para_filtro)
+from texto import normalize_text
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    ('São Paulo', 'sao paulo'),
+    ('AÇÚCAR', 'acucar'),
+    ('ascii', 'ascii'),
+    ('', ''),
+    (None, ''),
+])
+def test_normalize_text(valor, esperado):
+    assert normalize_text(valor) == esperado
+
+
+def test_palavra_chave_no_nome():
+    assert map_categoria_para_filtro('Outro', 'Praia de Ipanema') == 'Praia/Recreação'
+
+
+def test_sem_informacao_usa_padrao():
+    assert map_categoria_para_filtro('', '', '') == DEFAULT_FILTER_CATEGORY
+
+
+def test_regex_compilada_concorda_com_o_laco_de_referencia():
+    for categoria, nome, descricao in _catalogo_sintetico(2000, 3):
+        assert map_categoria_para_filtro(categoria, nome, descricao) == \
+            _classificar_por_laco(categoria, nome, descricao)
@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cep import CacheCEP, CEPNaoEncontrado, CircuitoAberto, DisjuntorCircuito, fetch_address_by_cep, sanitize_cep
+
+ENDERECO = {'logradouro': 'Praça da Sé', 'bairro': 'Sé', 'localidade': 'São Paulo', 'uf': 'SP'}
+
+
+class _ViaCEPFalso(BaseHTTPRequestHandler):
+    """Responde conforme o modo no caminho: /<cep>/<modo>"""
+
+    def do_GET(self):
+        self.server.chamadas += 1
+        modo = self.path.rsplit('/', 1)[-1]
+        if modo == 'derruba':
+            # Fecha a conexão sem resposta: RemoteDisconnected no cliente
+            self.close_connection = True
+            return
+        if modo == 'incompleto':
+            self.send_response(200)
+            self.send_header('Content-Length', '1000')
+            self.end_headers()
+            self.wfile.write(b'{"logra')
+            self.close_connection = True
+            return
+        corpo = json.dumps({'erro': True} if modo == 'inexistente' else ENDERECO).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def viacep():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _ViaCEPFalso)
+    servidor.chamadas = 0
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{servidor.server_address[1]}/{{cep}}'
+    servidor.url = lambda modo: base + '/' + modo
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_sanitize_cep():
+    assert sanitize_cep('01001-000') == '01001000'
+    assert sanitize_cep(None) == ''
+
+
+def test_consulta_e_formata(viacep):
+    assert fetch_address_by_cep('01001-000', url=viacep.url('ok')) == {
+        'endereco': 'Praça da Sé, Sé, São Paulo - SP', 'uf': 'SP'}
+
+
+@pytest.mark.parametrize('modo', ['derruba', 'incompleto'])
+def test_conexao_derrubada_vira_value_error(viacep, modo):
+    with pytest.raises(ValueError) as erro:
+        fetch_address_by_cep('01001000', url=viacep.url(modo), timeout=2)
+    assert not isinstance(erro.value, CEPNaoEncontrado)
+
+
+def test_cache_positivo_e_negativo(banco, viacep):
+    cache = CacheCEP(url=viacep.url('ok'))
+    assert cache.consultar('01001000')['uf'] == 'SP'
+    assert cache.consultar('01001-000')['uf'] == 'SP'
+    assert cache.stats()['upstream_requests'] == 1
+
+    cache.url = viacep.url('inexistente')
+    for _ in range(2):
+        with pytest.raises(CEPNaoEncontrado):
+            cache.consultar('99999999')
+    stats = cache.stats()
+    assert stats['upstream_requests'] == 2 and stats['negative_hits'] == 1
+    cache.encerrar()
+
+
+def test_disjuntor_abre_e_libera_uma_sondagem():
+    disjuntor = DisjuntorCircuito(limite_falhas=2, tempo_recuperacao=0.05)
+    disjuntor.registrar_falha()
+    assert disjuntor.permitir()
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == 'aberto' and not disjuntor.permitir()
+    time.sleep(0.06)
+    assert disjuntor.permitir()
+    assert not disjuntor.permitir()  # só uma sondagem por vez
+    disjuntor.registrar_sucesso()
+    assert disjuntor.estado == 'fechado'
+
+
+def test_sondagem_com_conexao_derrubada_nao_trava_o_disjuntor(banco, viacep):
+    disjuntor = DisjuntorCircuito(limite_falhas=1, tempo_recuperacao=0.05)
+    cache = CacheCEP(url=viacep.url('derruba'), timeout=2, disjuntor=disjuntor)
+    with pytest.raises(ValueError):
+        cache.consultar('01001000')
+    with pytest.raises(CircuitoAberto):
+        cache.consultar('01001000')
+
+    time.sleep(0.06)
+    # A sondagem do estado meio aberto falha com a conexão derrubada...
+    with pytest.raises(ValueError) as erro:
+        cache.consultar('01001000')
+    assert not isinstance(erro.value, CircuitoAberto)
+
+    # ...e, passado o tempo de recuperação, uma nova sondagem é liberada e fecha o circuito
+    time.sleep(0.06)
+    cache.url = viacep.url('ok')
+    assert cache.consultar('01001000')['uf'] == 'SP'
+    assert disjuntor.estado == 'fechado'
+    cache.encerrar()
@@ -0,0 +1,100 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from database import SerializedWriter
+
+
+@pytest.fixture
+def escritor(tmp_path):
+    escritor = SerializedWriter(str(tmp_path / 'escrita.db'), timeout=2)
+    with escritor.transaction() as conn:
+        conn.execute('CREATE TABLE t (x INTEGER)')
+    yield escritor
+    escritor.close()
+
+
+def _valores(escritor):
+    with escritor.transaction() as conn:
+        return [row[0] for row in conn.execute('SELECT x FROM t ORDER BY rowid')]
+
+
+def test_init_database_ativa_wal(banco):
+    conn = banco.get_connection()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    conn.close()
+
+
+def test_escritas_concorrentes_sao_serializadas(escritor):
+    def gravar(inicio):
+        for valor in range(inicio, inicio + 50):
+            with escritor.transaction() as conn:
+                atual = conn.execute('SELECT COUNT(*) FROM t').fetchone()[0]
+                conn.execute('INSERT INTO t VALUES (?)', (atual,))
+
+    threads = [threading.Thread(target=gravar, args=(i * 50,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Ler e gravar na mesma transação nunca se intercala com outra thread
+    assert _valores(escritor) == list(range(200))
+    assert escritor.stats()['transactions'] == 202
+
+
+def test_erro_desfaz_a_transacao(escritor):
+    with pytest.raises(RuntimeError):
+        with escritor.transaction() as conn:
+            conn.execute('INSERT INTO t VALUES (1)')
+            raise RuntimeError('falhou')
+    assert _valores(escritor) == []
+    assert escritor.stats()['rollbacks'] == 1
+
+
+def test_transacao_aninhada_nao_espera_o_proprio_lock(escritor):
+    inicio = time.monotonic()
+    with escritor.transaction() as externa:
+        externa.execute('INSERT INTO t VALUES (1)')
+        with escritor.transaction() as interna:
+            assert interna is externa
+            interna.execute('INSERT INTO t VALUES (2)')
+        with pytest.raises(RuntimeError):
+            with escritor.transaction() as interna:
+                interna.execute('INSERT INTO t VALUES (3)')
+                raise RuntimeError('falhou')
+    assert time.monotonic() - inicio < 1
+    # O erro interno desfaz só o savepoint; a externa confirma o resto
+    assert _valores(escritor) == [1, 2]
+
+
+def test_erro_na_externa_desfaz_a_aninhada(escritor):
+    with pytest.raises(RuntimeError):
+        with escritor.transaction() as conn:
+            with escritor.transaction() as interna:
+                interna.execute('INSERT INTO t VALUES (1)')
+            raise RuntimeError('falhou')
+    assert _valores(escritor) == []
+
+
+def test_outra_thread_espera_ate_o_timeout(escritor):
+    escritor.timeout = 0.1
+    ocupado, liberar = threading.Event(), threading.Event()
+
+    def segurar():
+        with escritor.transaction():
+            ocupado.set()
+            liberar.wait(5)
+
+    thread = threading.Thread(target=segurar)
+    thread.start()
+    ocupado.wait(5)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            with escritor.transaction():
+                pass
+    finally:
+        liberar.set()
+        thread.join()
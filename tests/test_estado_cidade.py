@@ -0,0 +1,39 @@
+import pytest
+
+from database import backfill_estado_cidade, parse_estado_cidade
+
+
+@pytest.mark.parametrize('endereco, esperado', [
+    ('Av. Pasteur, 520 - Urca, Rio de Janeiro - RJ', ('RJ', 'Rio de Janeiro')),
+    ('Praça da Liberdade, Belo Horizonte – mg', ('MG', 'Belo Horizonte')),
+    ('Rua X, 10, Vitória, ES', ('ES', 'Vitória')),
+    ('Rua das Flores, Santos SP', ('SP', None)),
+    ('Rua A, 10, São Paulo', ('SP', None)),
+    # "es" minúsculo dentro de palavras não é sigla
+    ('Rua Esperança, centro', (None, None)),
+    ('Rua B, Cidade - XX', (None, None)),
+    ('', (None, None)),
+    (None, (None, None)),
+])
+def test_parse_estado_cidade(endereco, esperado):
+    assert parse_estado_cidade(endereco) == esperado
+
+
+def test_backfill_preenche_os_pontos_existentes(banco):
+    with banco.write_transaction() as conn:
+        conn.execute('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude)
+            VALUES ('Teatro', 'd', 'Rua da Bahia, Belo Horizonte - MG', -19.9, -43.9)
+        ''')
+        conn.execute('UPDATE pontos_turisticos SET estado = NULL, cidade = NULL')
+        backfill_estado_cidade(conn.cursor())
+        linhas = dict(conn.execute('SELECT nome, estado || ":" || cidade FROM pontos_turisticos').fetchall())
+    assert linhas['Teatro'] == 'MG:Belo Horizonte'
+    assert linhas['Cristo Redentor'] == 'RJ:Rio de Janeiro'
+
+
+def test_filtro_por_estado_usa_o_indice(banco):
+    conn = banco.get_connection()
+    plano = banco.explain_query_plan(conn, 'SELECT id FROM pontos_turisticos WHERE estado = ?', ('RJ',))
+    conn.close()
+    assert plano == ['SEARCH pontos_turisticos USING COVERING INDEX idx_pontos_estado (estado=?)']
@@ -0,0 +1,64 @@
+import gzip
+import os
+
+from estaticos import ManifestoEstaticos
+
+HASH = '0123456789abcdef'
+
+
+def _manifesto(tmp_path, revalidar=False):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'estilo.css').write_text('body { color: red; }')
+    (tmp_path / 'uploads').mkdir()
+    (tmp_path / 'uploads' / f'{HASH}.webp').write_bytes(b'RIFF variante')
+    return ManifestoEstaticos(str(tmp_path), revalidar=revalidar)
+
+
+def test_url_com_impressao_e_imutavel(tmp_path):
+    manifesto = _manifesto(tmp_path)
+    url = manifesto.url('css/estilo.css')
+    impressao = manifesto.impressao('css/estilo.css')
+    assert url == f'css/estilo.{impressao}.css'
+    assert manifesto.resolver(url) == ('css/estilo.css', True)
+    assert manifesto.resolver('css/estilo.css') == ('css/estilo.css', False)
+
+
+def test_impressao_antiga_nao_e_imutavel(tmp_path):
+    manifesto = _manifesto(tmp_path)
+    assert manifesto.resolver('css/estilo.000000000000.css') == ('css/estilo.css', False)
+
+
+def test_uploads_tambem_levam_a_impressao_dos_proprios_bytes(tmp_path):
+    manifesto = _manifesto(tmp_path, revalidar=True)
+    arquivo = f'uploads/{HASH}.webp'
+    # O nome vem do envio original: sem impressão, não pode ser cacheado como imutável
+    assert manifesto.resolver(arquivo) == (arquivo, False)
+    url = manifesto.url(arquivo)
+    assert url != arquivo
+    assert manifesto.resolver(url) == (arquivo, True)
+
+    # Variante regerada com outra configuração: mesmo nome, bytes novos, URL nova
+    caminho = tmp_path / 'uploads' / f'{HASH}.webp'
+    caminho.write_bytes(b'RIFF variante com outra qualidade')
+    os.utime(caminho, ns=(1, 1))
+    assert manifesto.url(arquivo) != url
+    assert manifesto.resolver(url) == (arquivo, False)
+
+
+def test_arquivo_inexistente_ou_fora_da_pasta(tmp_path):
+    manifesto = _manifesto(tmp_path)
+    assert manifesto.url('css/nao-existe.css') == 'css/nao-existe.css'
+    assert manifesto.impressao('../fora.css') is None
+    assert manifesto.resolver('../fora.000000000000.css') == ('../fora.000000000000.css', False)
+
+
+def test_pre_comprimido(tmp_path):
+    manifesto = _manifesto(tmp_path)
+    assert manifesto.comprimir() == 0  # pequeno demais: o .gz não compensa
+    caminho = tmp_path / 'css' / 'grande.css'
+    caminho.write_text('body { color: red; }\n' * 200)
+    assert manifesto.comprimir() >= 1
+    assert gzip.decompress((tmp_path / 'css' / 'grande.css.gz').read_bytes()) == caminho.read_bytes()
+    assert manifesto.pre_comprimido('css/grande.css', {'gzip'}) == ('css/grande.css.gz', 'gzip')
+    assert manifesto.pre_comprimido('css/grande.css', set()) == (None, None)
+    assert manifesto.pre_comprimido(f'uploads/{HASH}.webp', {'gzip'}) == (None, None)
@@ -0,0 +1,49 @@
+from estatisticas import (atualizar_rollups, atualizar_sketches, contar_visitantes_aproximado,
+                          reconstruir_rollups, resumo_visitantes, visitas_por_periodo)
+
+
+def _visitas(banco, registros):
+    with banco.write_transaction() as conn:
+        conn.executemany('''
+            INSERT INTO visitas_pontos (usuario_id, ponto_turistico_id, origem_sudeste, data_visita)
+            VALUES (?, ?, ?, ?)
+        ''', registros)
+
+
+def _exato(banco, sql, params=()):
+    conn = banco.get_connection()
+    valor = conn.execute(sql, params).fetchone()[0]
+    conn.close()
+    return valor
+
+
+def test_rollups_em_lotes_batem_com_a_contagem_exata(banco):
+    _visitas(banco, [(1 + i % 7, 1 + i % 3, i % 2, f'2025-01-{1 + i % 5:02d} 10:00:00') for i in range(200)])
+    atualizar_rollups(lote=37)
+
+    periodo = visitas_por_periodo('2025-01-01', '2025-01-05')
+    exato = _exato(banco, '''
+        SELECT COUNT(DISTINCT usuario_id) FROM visitas_pontos
+        WHERE date(data_visita) BETWEEN '2025-01-01' AND '2025-01-05'
+    ''')
+    assert periodo['visitantes'] == exato
+    assert resumo_visitantes()['total_visitantes'] == _exato(
+        banco, 'SELECT COUNT(DISTINCT usuario_id) FROM visitas_pontos')
+
+    reconstruir_rollups()
+    assert visitas_por_periodo('2025-01-01', '2025-01-05') == periodo
+
+
+def test_rollups_incrementais_nao_contam_em_dobro(banco):
+    _visitas(banco, [(1, 1, 1, '2025-02-01 10:00:00')] * 3)
+    atualizar_rollups()
+    primeiro = visitas_por_periodo('2025-02-01', '2025-02-01')
+    atualizar_rollups()
+    assert visitas_por_periodo('2025-02-01', '2025-02-01') == primeiro
+
+
+def test_sketches_aproximam_visitantes_distintos(banco):
+    _visitas(banco, [(i, 1, 1, '2025-03-01 10:00:00') for i in range(1, 501)])
+    atualizar_sketches(lote=128)
+    exato = _exato(banco, 'SELECT COUNT(DISTINCT usuario_id) FROM visitas_pontos')
+    assert abs(contar_visitantes_aproximado() - exato) / exato < 0.05
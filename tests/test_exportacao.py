@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+
+import pytest
+
+from exportacao import gerar_exportacao, preparar_exportacao
+
+
+def _usuarios(banco, quantidade):
+    with banco.write_transaction() as conn:
+        conn.executemany('INSERT INTO usuarios (nome, email, senha) VALUES (?, ?, ?)',
+                         [(f'u{i}', f'u{i}@x.com', 'x') for i in range(quantidade)])
+
+
+def test_csv_em_lotes_igual_a_leitura_completa(banco):
+    _usuarios(banco, 25)
+    spec = preparar_exportacao('usuarios', 'csv')
+    texto = ''.join(gerar_exportacao(spec, tamanho_lote=7))
+    linhas = list(csv.reader(io.StringIO(texto)))
+    conn = banco.get_connection()
+    esperado = conn.execute('SELECT id, nome, data_cadastro FROM usuarios ORDER BY id').fetchall()
+    conn.close()
+    assert linhas[0] == ['id', 'nome', 'data_cadastro']
+    assert [tuple(linha) for linha in linhas[1:]] == [tuple(str(v) for v in row) for row in esperado]
+
+
+def test_dados_pessoais_so_com_pii(banco):
+    _usuarios(banco, 1)
+    sem = preparar_exportacao('usuarios', 'ndjson')
+    com = preparar_exportacao('usuarios', 'ndjson', pii=True)
+    assert 'email' not in json.loads(next(gerar_exportacao(sem)).splitlines()[0])
+    registro = json.loads(next(gerar_exportacao(com)).splitlines()[0])
+    assert 'email' in registro and 'senha' not in registro
+
+
+def test_retomar_pelo_ultimo_id(banco):
+    _usuarios(banco, 10)
+    conn = banco.get_connection()
+    ids = [row[0] for row in conn.execute('SELECT id FROM usuarios ORDER BY id')]
+    conn.close()
+    spec = preparar_exportacao('usuarios', 'ndjson', apos_id=ids[4])
+    recebidos = [json.loads(linha)['id'] for pedaco in gerar_exportacao(spec) for linha in pedaco.splitlines()]
+    assert recebidos == ids[5:]
+
+
+@pytest.mark.parametrize('argumentos', [
+    {'nome': 'senhas'},
+    {'nome': 'usuarios', 'formato': 'xml'},
+    {'nome': 'usuarios', 'desde': '31/12/2024'},
+])
+def test_parametros_invalidos(argumentos):
+    with pytest.raises(ValueError):
+        preparar_exportacao(**argumentos)
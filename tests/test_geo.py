@@ -0,0 +1,109 @@
+import math
+import random
+
+import pytest
+
+import geo
+from geo import RAIO_TERRA_KM, caixa_envolvente, haversine_km, pontos_proximos
+
+
+def _destino(lat, lon, distancia_km, rumo_graus):
+    """Ponto a distancia_km de (lat, lon) no rumo dado, pela esfera do haversine"""
+    phi, lam = math.radians(lat), math.radians(lon)
+    delta, theta = distancia_km / RAIO_TERRA_KM, math.radians(rumo_graus)
+    phi2 = math.asin(math.sin(phi) * math.cos(delta) + math.cos(phi) * math.sin(delta) * math.cos(theta))
+    lam2 = lam + math.atan2(math.sin(theta) * math.sin(delta) * math.cos(phi),
+                            math.cos(delta) - math.sin(phi) * math.sin(phi2))
+    return math.degrees(phi2), (math.degrees(lam2) + 540) % 360 - 180
+
+
+def test_haversine_um_grau_de_latitude():
+    assert haversine_km(0, 0, 1, 0) == pytest.approx(math.radians(1) * RAIO_TERRA_KM)
+
+
+def test_caixa_contem_o_circulo():
+    gerador = random.Random(1)
+    for _ in range(300):
+        lat, lon = gerador.uniform(-80, 80), gerador.uniform(-170, 170)
+        raio = gerador.choice([0.5, 5, 50, 500, 2000])
+        min_lat, max_lat, min_lon, max_lon = caixa_envolvente(lat, lon, raio)
+        for rumo in range(0, 360, 5):
+            # Um pouco dentro do raio: deve sempre passar pelo filtro da caixa
+            plat, plon = _destino(lat, lon, raio * 0.99999, rumo)
+            assert min_lat <= plat <= max_lat
+            assert min_lon <= plon <= max_lon or (min_lon, max_lon) == (-180.0, 180.0)
+
+
+def test_ponto_na_borda_do_raio_e_encontrado(banco):
+    with banco.write_transaction() as conn:
+        conn.execute('DELETE FROM pontos_turisticos')
+        plat, plon = _destino(-22.9, -43.2, 9.999, 0)
+        conn.execute('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, categoria)
+            VALUES ('Borda', 'd', 'e', ?, ?, 'Praia')
+        ''', (plat, plon))
+    assert [p['nome'] for p in pontos_proximos(-22.9, -43.2, raio_km=10)] == ['Borda']
+
+
+def test_k_vizinhos_iguais_a_forca_bruta(banco):
+    gerador = random.Random(2)
+    with banco.write_transaction() as conn:
+        conn.execute('DELETE FROM pontos_turisticos')
+        conn.executemany('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, categoria)
+            VALUES (?, 'd', 'e', ?, ?, 'Praia')
+        ''', [(f'P{i}', gerador.uniform(-25, -20), gerador.uniform(-46, -40)) for i in range(200)])
+        todos = conn.execute('SELECT nome, latitude, longitude FROM pontos_turisticos').fetchall()
+    esperado = sorted(todos, key=lambda p: haversine_km(-22.9, -43.2, p[1], p[2]))[:10]
+    assert [p['nome'] for p in pontos_proximos(-22.9, -43.2, limite=10)] == [p[0] for p in esperado]
+
+
+def test_coordenadas_invalidas():
+    with pytest.raises(ValueError):
+        pontos_proximos(91, 0)
+
+
+@pytest.fixture
+def consultas(monkeypatch):
+    """Quantas consultas ao R*Tree o k-vizinhos fez"""
+    chamadas = []
+    original = geo._candidatos
+
+    def contar(cursor, latitude, longitude, raio_km, excluir_id):
+        chamadas.append(raio_km)
+        return original(cursor, latitude, longitude, raio_km, excluir_id)
+
+    monkeypatch.setattr(geo, '_candidatos', contar)
+    return chamadas
+
+
+def test_catalogo_menor_que_o_limite_para_de_crescer(banco, consultas):
+    # Os 5 pontos iniciais ficam no Rio: sobram 4 vizinhos para o Cristo Redentor
+    proximos = pontos_proximos(-22.9519, -43.2105, limite=5, excluir_id=1)
+    assert len(proximos) == 4
+    assert len(consultas) <= 4 and max(consultas) < 100
+
+
+def test_caixa_com_todos_os_pontos_inclui_os_de_fora_do_circulo(banco, consultas):
+    with banco.write_transaction() as conn:
+        conn.execute('DELETE FROM pontos_turisticos')
+        # No canto da caixa de 5 km, mas a mais de 5 km do centro
+        plat, plon = _destino(-22.9, -43.2, 6.5, 45)
+        conn.execute('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, categoria)
+            VALUES ('Canto', 'd', 'e', ?, ?, 'Praia')
+        ''', (plat, plon))
+    assert [p['nome'] for p in pontos_proximos(-22.9, -43.2, limite=3)] == ['Canto']
+    assert consultas == [geo.RAIO_INICIAL_KM]
+
+
+def test_raio_maximo_do_k_vizinhos(banco, consultas):
+    with banco.write_transaction() as conn:
+        conn.execute('''
+            INSERT INTO pontos_turisticos (nome, descricao, endereco, latitude, longitude, categoria)
+            VALUES ('Longe', 'd', 'Av. Paulista, São Paulo - SP', -23.56, -46.65, 'Cultura')
+        ''')
+    proximos = pontos_proximos(-22.9519, -43.2105, limite=10, excluir_id=1, raio_maximo_km=50)
+    assert 'Longe' not in [p['nome'] for p in proximos] and len(proximos) == 4
+    assert max(consultas) == 50
+    assert 'Longe' in [p['nome'] for p in pontos_proximos(-22.9519, -43.2105, limite=10, excluir_id=1)]
@@ -0,0 +1,48 @@
+import pytest
+
+from hyperloglog import HyperLogLog
+
+
+def test_estimativa_dentro_do_erro_esperado():
+    sketch = HyperLogLog(12)
+    for valor in range(50000):
+        sketch.adicionar(valor)
+    assert abs(sketch.estimar() - 50000) / 50000 < 0.05
+
+
+def test_cardinalidade_pequena_usa_contagem_linear():
+    sketch = HyperLogLog(12)
+    for valor in range(20):
+        sketch.adicionar(valor)
+        sketch.adicionar(valor)
+    assert sketch.estimar() == 20
+
+
+def test_mesclar_equivale_a_uniao():
+    a, b, uniao = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+    for valor in range(3000):
+        a.adicionar(valor)
+        uniao.adicionar(valor)
+    for valor in range(2000, 6000):
+        b.adicionar(valor)
+        uniao.adicionar(valor)
+    assert a.mesclar(b).registros == uniao.registros
+
+
+def test_mesclar_precisoes_diferentes():
+    with pytest.raises(ValueError):
+        HyperLogLog(10).mesclar(HyperLogLog(12))
+
+
+def test_serializacao_ida_e_volta():
+    sketch = HyperLogLog(12)
+    for valor in range(1000):
+        sketch.adicionar(f'usuario-{valor}')
+    copia = HyperLogLog.desserializar(sketch.serializar())
+    assert copia.precisao == 12
+    assert copia.registros == sketch.registros
+
+
+def test_precisao_invalida():
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
@@ -0,0 +1,89 @@
+import io
+import os
+import threading
+
+import pytest
+
+import imagens
+from imagens import ProcessadorImagens, detectar_formato, nome_variante
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+def test_detectar_formato_pelos_bytes():
+    assert detectar_formato(b'\xff\xd8\xff\xe0') == 'jpg'
+    assert detectar_formato(PNG[:16]) == 'png'
+    assert detectar_formato(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'webp'
+    with pytest.raises(ValueError):
+        detectar_formato(b'<svg xmlns="')
+
+
+def test_nome_variante():
+    assert nome_variante('0123456789abcdef.webp', 'miniatura') == '0123456789abcdef_miniatura.webp'
+    assert nome_variante('uploads/0123456789abcdef.webp', 'card') == 'uploads/0123456789abcdef_card.webp'
+    assert nome_variante('0123456789abcdef.webp', 'completa') == '0123456789abcdef.webp'
+    # Nomes fora do pipeline (ou originais mantidos) não têm variantes
+    assert nome_variante('0123456789abcdef.png', 'miniatura') == '0123456789abcdef.png'
+    assert nome_variante('foto.jpg', 'miniatura') == 'foto.jpg'
+
+
+@pytest.fixture
+def variantes_falham(monkeypatch):
+    def falhar(origem, pasta, hash_conteudo):
+        raise OSError('codificador indisponível')
+
+    monkeypatch.setattr(imagens, 'Image', object())
+    monkeypatch.setattr(ProcessadorImagens, '_validar', lambda self, caminho: None)
+    monkeypatch.setattr(imagens, 'gerar_variantes', falhar)
+
+
+def test_falha_nas_variantes_mantem_o_original(tmp_path, variantes_falham):
+    trocas = []
+    avisado = threading.Event()
+
+    def ao_falhar(nome, substituto):
+        trocas.append((nome, substituto))
+        avisado.set()
+
+    processador = ProcessadorImagens(str(tmp_path), max_workers=1, ao_falhar=ao_falhar)
+    nome = processador.enviar(io.BytesIO(PNG))
+    assert avisado.wait(5)
+    processador.encerrar()
+
+    hash_conteudo = nome.split('.')[0]
+    assert trocas == [(nome, f'{hash_conteudo}.png')]
+    # O envio não se perde: o temporário virou o arquivo definitivo
+    assert sorted(os.listdir(tmp_path)) == [f'{hash_conteudo}.png']
+    assert (tmp_path / f'{hash_conteudo}.png').read_bytes() == PNG
+    assert processador.substituto(nome) == f'{hash_conteudo}.png'
+    assert processador.substituto(f'uploads/{nome}') == f'uploads/{hash_conteudo}.png'
+    assert processador.substituto('outro.webp') == 'outro.webp'
+    assert processador.stats()['falhas'] == 1
+
+
+def test_reenvio_apos_falha_usa_o_original(tmp_path, variantes_falham):
+    avisado = threading.Event()
+    processador = ProcessadorImagens(str(tmp_path), max_workers=1, ao_falhar=lambda *args: avisado.set())
+    processador.enviar(io.BytesIO(PNG))
+    assert avisado.wait(5)
+
+    nome = processador.enviar(io.BytesIO(PNG))
+    processador.encerrar()
+    assert nome.endswith('.png')
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_variantes_geradas(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    fluxo = io.BytesIO()
+    Image.new('RGB', (2000, 1000), 'red').save(fluxo, 'PNG')
+    fluxo.seek(0)
+
+    processador = ProcessadorImagens(str(tmp_path), max_workers=1)
+    nome = processador.enviar(fluxo)
+    processador.encerrar()
+
+    arquivos = sorted(os.listdir(tmp_path))
+    assert arquivos == sorted([nome] + [nome_variante(nome, v) for v in ('miniatura', 'card')])
+    with Image.open(tmp_path / nome_variante(nome, 'miniatura')) as miniatura:
+        assert max(miniatura.size) == 320
@@ -0,0 +1,85 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+from importacao import formato_do_arquivo, importar_pontos, ler_registros, validar_ponto
+
+VALIDO = {
+    'nome': 'Marco Zero', 'descricao': 'Ponto de referência', 'endereco': 'Praça, Rio de Janeiro - RJ',
+    'latitude': -22.9, 'longitude': -43.2, 'categoria': 'Monumento'
+}
+
+
+def test_coordenadas_zero_sao_validas():
+    ponto = validar_ponto(dict(VALIDO, latitude=0, longitude=0.0))
+    assert (ponto['latitude'], ponto['longitude']) == (0.0, 0.0)
+
+
+def test_virgula_decimal():
+    ponto = validar_ponto(dict(VALIDO, latitude='-22,9', longitude='-43,2'))
+    assert ponto['latitude'] == -22.9
+
+
+def test_opcional_zero_e_preservado():
+    assert validar_ponto(dict(VALIDO, preco_entrada=0))['preco_entrada'] == '0'
+    assert validar_ponto(VALIDO)['preco_entrada'] is None
+
+
+@pytest.mark.parametrize('alteracao', [
+    {'nome': None},
+    {'categoria': '  '},
+    {'latitude': 'norte'},
+    {'longitude': 181},
+])
+def test_registros_invalidos(alteracao):
+    with pytest.raises(ValueError):
+        validar_ponto(dict(VALIDO, **alteracao))
+
+
+def test_registro_que_nao_e_objeto():
+    with pytest.raises(ValueError):
+        validar_ponto(['lista'])
+
+
+def test_ndjson_linha_quebrada_vira_registro_invalido():
+    arquivo = io.StringIO(json.dumps(VALIDO) + '\n{quebrado\n')
+    assert [registro is None for _, registro in ler_registros(arquivo, 'ndjson')] == [False, True]
+
+
+def test_formato_pela_extensao():
+    assert formato_do_arquivo('pontos.jsonl') == 'ndjson'
+    with pytest.raises(ValueError):
+        formato_do_arquivo('pontos.xlsx')
+
+
+def test_importa_em_lotes_com_upsert_por_nome(banco):
+    registros = [(i, dict(VALIDO, nome=f'Ponto {i % 7}', latitude=0)) for i in range(20)]
+    registros.append((21, dict(VALIDO, nome=None)))
+    relatorio = importar_pontos(registros, lote=6)
+    assert relatorio['validos'] == 20 and relatorio['invalidos'] == 1
+    assert relatorio['inseridos'] == 7
+    assert relatorio['inseridos'] + relatorio['atualizados'] <= 20
+    conn = banco.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM pontos_turisticos WHERE nome LIKE 'Ponto %'").fetchone()[0] == 7
+    conn.close()
+
+
+def test_simulacao_nao_grava(banco):
+    relatorio = importar_pontos([(1, dict(VALIDO, nome='Simulado'))], simular=True)
+    assert relatorio['inseridos'] == 1
+    conn = banco.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM pontos_turisticos WHERE nome = 'Simulado'").fetchone()[0] == 0
+    conn.close()
+
+
+def test_lote_maior_que_o_limite_de_variaveis(banco):
+    # Limite baixo na conexão de escrita: um único IN (...) com o lote inteiro estouraria
+    with banco.write_transaction() as conn:
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 600)
+    registros = [(i, dict(VALIDO, nome=f'Ponto {i}')) for i in range(1200)]
+    assert importar_pontos(registros[:300], lote=1200)['inseridos'] == 300
+    relatorio = importar_pontos(registros, lote=1200)
+    assert relatorio['lotes'] == 1
+    assert (relatorio['inseridos'], relatorio['atualizados']) == (900, 300)
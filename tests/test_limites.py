@@ -0,0 +1,52 @@
+from limites import ArmazemMemoria, ArmazemSQLite, BaldeFichas, LimitadorTaxa, _estimar
+
+
+def test_janela_deslizante_pondera_a_janela_anterior():
+    armazem = ArmazemMemoria()
+    for _ in range(10):
+        armazem.incrementar('k', 10, 100.0)
+    # Metade da janela seguinte: metade da contagem anterior ainda pesa
+    assert _estimar(*armazem.consultar('k', 10, 115.0), 10, 115.0) == 5.0
+    # Duas janelas depois: zerado
+    assert _estimar(*armazem.consultar('k', 10, 125.0), 10, 125.0) == 0.0
+
+
+def test_permitir_recusa_acima_do_limite():
+    limitador = LimitadorTaxa({'login': (3, 60)})
+    resultados = [limitador.permitir('login', '1.2.3.4') for _ in range(5)]
+    assert resultados[:3] == [0, 0, 0]
+    assert all(espera > 0 for espera in resultados[3:])
+    assert limitador.permitir('login', '5.6.7.8') == 0
+    assert limitador.stats()['recusas']['login'] == 2
+
+
+def test_bloqueado_so_consulta():
+    limitador = LimitadorTaxa({'falhas': (2, 60)})
+    assert limitador.bloqueado('falhas', 'ana') == 0
+    limitador.registrar('falhas', 'ana')
+    limitador.registrar('falhas', 'ana')
+    assert limitador.bloqueado('falhas', 'ana') > 0
+    limitador.limpar('falhas', 'ana')
+    assert limitador.bloqueado('falhas', 'ana') == 0
+
+
+def test_balde_de_fichas():
+    balde = BaldeFichas(capacidade=2, por_segundo=1.0)
+    assert [balde.consumir('x', agora=t) for t in (0, 0, 0)] == [0, 0, 2]
+    assert balde.consumir('x', agora=1.0) == 0
+
+
+def test_armazem_sqlite_compartilhado(tmp_path):
+    caminho = str(tmp_path / 'limites.db')
+    a = LimitadorTaxa({'r': (4, 60)}, ArmazemSQLite(caminho))
+    b = LimitadorTaxa({'r': (4, 60)}, ArmazemSQLite(caminho))
+    resultados = [(a if i % 2 else b).permitir('r', 'k') for i in range(6)]
+    assert resultados[:4] == [0, 0, 0, 0]
+    assert all(resultados[4:])
+
+
+def test_armazem_memoria_limita_chaves():
+    armazem = ArmazemMemoria(max_chaves=2)
+    for chave in 'abc':
+        armazem.incrementar(chave, 60, 0.0)
+    assert armazem.stats()['chaves'] == 2
@@ -0,0 +1,62 @@
+import base64
+import json
+
+import pytest
+
+from paginacao import buscar_pagina, codificar_cursor, decodificar_cursor, tamanho_pagina
+
+
+def _cursor_bruto(valor):
+    return base64.urlsafe_b64encode(json.dumps(valor).encode()).decode().rstrip('=')
+
+
+def test_cursor_ida_e_volta():
+    assert decodificar_cursor(codificar_cursor('2025-01-01 10:00:00', 42), tipos=(str, int)) == \
+        ['2025-01-01 10:00:00', 42]
+
+
+def test_cursor_vazio():
+    assert decodificar_cursor('') is None
+    assert decodificar_cursor(None) is None
+
+
+@pytest.mark.parametrize('cursor', [
+    'nao-e-base64!!',
+    _cursor_bruto({'a': 1}),
+    _cursor_bruto([1]),
+    _cursor_bruto([{'a': 1}, [2]]),
+    _cursor_bruto([None, 1]),
+    _cursor_bruto([True, 1]),
+])
+def test_cursor_adulterado(cursor):
+    with pytest.raises(ValueError):
+        decodificar_cursor(cursor)
+
+
+def test_tipos_das_colunas_da_chave():
+    with pytest.raises(ValueError):
+        decodificar_cursor(codificar_cursor(1, '2'), tipos=(str, int))
+
+
+@pytest.mark.parametrize('valor, esperado', [(None, 50), ('abc', 50), ('0', 1), ('10', 10), ('9999', 200)])
+def test_tamanho_pagina(valor, esperado):
+    assert tamanho_pagina(valor) == esperado
+
+
+def test_paginas_percorrem_a_ordem_completa(banco):
+    with banco.write_transaction() as conn:
+        # Datas repetidas: o id desempata
+        conn.executemany('INSERT INTO usuarios (nome, email, senha, data_cadastro) VALUES (?, ?, ?, ?)',
+                         [(f'p{i}', f'p{i}@x.com', 'x', f'2025-01-0{1 + i % 3}') for i in range(23)])
+    conn = banco.get_connection()
+    esperado = [row[0] for row in conn.execute('SELECT id FROM usuarios ORDER BY data_cadastro DESC, id DESC')]
+    vistos, apos = [], None
+    while True:
+        rows, proximo = buscar_pagina(conn, 'SELECT id, data_cadastro FROM usuarios', ('data_cadastro', 'id'),
+                                      (1, 0), apos=apos, limite=5)
+        vistos.extend(row[0] for row in rows)
+        if proximo is None:
+            break
+        apos = decodificar_cursor(proximo, tipos=(str, int))
+    conn.close()
+    assert vistos == esperado
@@ -0,0 +1,93 @@
+import pytest
+
+from database import check_query_plans, full_scans, get_schema_version, is_full_scan, migrate
+
+
+@pytest.mark.parametrize('detalhe', [
+    'SCAN pontos_turisticos',
+    'SCAN pt',
+    'SCAN TABLE pontos_turisticos',
+    'SCAN TABLE pontos_turisticos AS pt',
+])
+def test_varredura_completa_nos_dois_formatos(detalhe):
+    assert is_full_scan(detalhe)
+
+
+@pytest.mark.parametrize('detalhe', [
+    'SCAN pontos_turisticos USING COVERING INDEX idx_pontos_categoria',
+    'SCAN TABLE pontos_turisticos USING INDEX idx_pontos_categoria',
+    'SCAN TABLE avaliacoes AS a USING COVERING INDEX idx_avaliacoes_ponto',
+    'SEARCH pontos_turisticos USING INDEX idx_pontos_categoria (categoria=?)',
+    'SCAN SUBQUERY 1',
+    'SCAN CONSTANT ROW',
+    'SCAN g VIRTUAL TABLE INDEX 2:D1B0D3B2',
+    'USE TEMP B-TREE FOR ORDER BY',
+])
+def test_nao_sao_varreduras_completas(detalhe):
+    assert not is_full_scan(detalhe)
+
+
+@pytest.mark.parametrize('detalhe', [
+    'SCAN u USING COVERING INDEX sqlite_autoindex_usuarios_1',
+    'SCAN TABLE usuarios AS u USING INDEX idx_usuarios_cadastro',
+])
+def test_indice_inteiro_no_laco_interno_e_varredura(detalhe):
+    assert not is_full_scan(detalhe)
+    assert is_full_scan(detalhe, interno=True)
+
+
+def test_laco_interno_sem_restricao(banco):
+    conn = banco.get_connection()
+    sql = '''
+        SELECT a.id, u.nome FROM avaliacoes a CROSS JOIN usuarios u
+        WHERE a.ponto_turistico_id = ? AND u.nome LIKE ?
+    '''
+    assert full_scans(conn, sql, (1, '%a%')) == ['SCAN u USING COVERING INDEX sqlite_autoindex_usuarios_1']
+    conn.close()
+
+
+def _povoar(conn, usuarios, avaliacoes):
+    inicio = conn.execute('SELECT COALESCE(MAX(id), 0) FROM usuarios').fetchone()[0] + 1
+    conn.executemany('INSERT INTO usuarios (nome, email, senha) VALUES (?, ?, ?)',
+                     [(f'u{i}', f'u{i}@teste', 'x') for i in range(inicio, inicio + usuarios)])
+    ids = [row[0] for row in conn.execute('SELECT id FROM usuarios ORDER BY id DESC LIMIT ?', (usuarios,))]
+    pontos = [row[0] for row in conn.execute('SELECT id FROM pontos_turisticos')]
+    conn.executemany('''
+        INSERT OR IGNORE INTO avaliacoes (usuario_id, ponto_turistico_id, nota, data_avaliacao)
+        VALUES (?, ?, ?, ?)
+    ''', [(ids[i % len(ids)], pontos[i % len(pontos)], i % 5 + 1, f'2024-01-{i % 28 + 1:02d} 10:00:00')
+          for i in range(avaliacoes)])
+    conn.commit()
+
+
+def test_estatisticas_defasadas_sao_removidas(banco):
+    # Banco migrado quando a versão 2 ainda rodava ANALYZE com as tabelas quase vazias
+    # (um usuário com duas avaliações: usuario_id parece não filtrar nada)
+    conn = banco.get_connection()
+    _povoar(conn, usuarios=1, avaliacoes=2)
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA user_version = 11')
+    conn.commit()
+    conn.close()
+    banco.configure_database(path=banco._pool.path)
+
+    conn = banco.get_connection()
+    _povoar(conn, usuarios=3000, avaliacoes=15000)
+    assert check_query_plans(conn) != {}
+    conn.close()
+
+    conn = banco.get_connection()
+    migrate(conn)
+    assert get_schema_version(conn) >= 12
+    conn.close()
+    banco.configure_database(path=banco._pool.path)
+    assert check_query_plans() == {}
+
+
+def test_consultas_quentes_usam_indices(banco):
+    assert check_query_plans() == {}
+
+
+def test_detecta_varredura_real(banco):
+    consultas = {'sem_indice': ('SELECT * FROM pontos_turisticos WHERE descricao = ?', ('x',))}
+    assert list(check_query_plans(queries=consultas)) == ['sem_indice']
@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+
+import pytest
+from flask import Flask
+
+import database
+from database import ConnectionPool
+
+
+def test_conexao_devolvida_e_reaproveitada(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=2)
+    conn = pool.acquire()
+    original = conn._conn
+    conn.close()
+    conn.close()  # fechar de novo não devolve duas vezes
+
+    outra = pool.acquire()
+    assert outra._conn is original
+    outra.close()
+    stats = pool.stats()
+    assert (stats['hits'], stats['misses'], stats['size'], stats['idle']) == (1, 1, 1, 1)
+    assert stats['hit_ratio'] == 0.5
+    pool.close_all()
+    assert pool.stats()['size'] == 0
+
+
+def test_conexao_devolvida_nao_pode_ser_usada(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'))
+    conn = pool.acquire()
+    conn.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+
+
+def test_transacao_pendente_descartada_ao_devolver(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=1)
+    conn = pool.acquire()
+    conn.execute('CREATE TABLE t (x)')
+    conn.commit()
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.close()
+
+    conn = pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    conn.close()
+
+
+def test_pool_esgotado_espera_e_expira(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=1, timeout=0.2)
+    conn = pool.acquire()
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+
+    # Quem espera recebe a conexão assim que ela é devolvida
+    threading.Timer(0.05, conn.close).start()
+    outra = pool.acquire()
+    outra.close()
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['waits'] == 2
+    assert stats['size'] == 1
+
+
+def test_pragmas_aplicados_por_conexao(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), pragmas={'synchronous': 'full', 'busy_timeout': 1234})
+    conn = pool.acquire()
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 2
+    assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 1234
+    assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2
+    conn.close()
+    with pytest.raises(ValueError):
+        ConnectionPool(str(tmp_path / 'pool.db'), pragmas={'journal_mode': 'rapido'})
+
+
+def test_conexao_do_contexto_da_aplicacao(banco):
+    app = Flask(__name__)
+    app.config['DATABASE'] = banco._pool.path
+    database.init_app(app)
+    with app.app_context():
+        conn = banco.get_connection()
+        assert banco.get_connection() is conn
+        conn.close()  # vinculada ao contexto: continua emprestada até o teardown
+        assert conn.execute('SELECT COUNT(*) FROM pontos_turisticos').fetchone()[0] > 0
+        assert banco.get_pool_stats()['in_use'] == 1
+    assert banco.get_pool_stats()['in_use'] == 0
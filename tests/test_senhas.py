@@ -0,0 +1,86 @@
+import hashlib
+import threading
+
+import pytest
+
+from senhas import FilaDeHashCheia, ServicoSenhas, gerar_hash, precisa_rehash, verificar_senha
+
+# Custos baixos: os testes conferem o formato, não a força do hash
+RAPIDO = {'iteracoes': 1000}
+
+
+def test_pbkdf2_com_salt():
+    a = gerar_hash('segredo', **RAPIDO)
+    b = gerar_hash('segredo', **RAPIDO)
+    assert a.startswith('pbkdf2_sha256$1000$')
+    assert a != b
+    assert verificar_senha('segredo', a)
+    assert not verificar_senha('errada', a)
+
+
+def test_scrypt():
+    armazenado = gerar_hash('segredo', esquema='scrypt', n=2 ** 10)
+    assert armazenado.startswith('scrypt$1024$8$1$')
+    assert verificar_senha('segredo', armazenado)
+    assert not verificar_senha('errada', armazenado)
+
+
+def test_sha256_legado_ainda_confere():
+    legado = hashlib.sha256(b'segredo').hexdigest()
+    assert verificar_senha('segredo', legado)
+    assert not verificar_senha('errada', legado)
+
+
+@pytest.mark.parametrize('armazenado', ['', None, 'pbkdf2_sha256$x$y', 'scrypt$a$b$c$d$e', 'texto qualquer'])
+def test_formatos_invalidos_nao_conferem(armazenado):
+    assert not verificar_senha('segredo', armazenado)
+
+
+def test_esquema_desconhecido():
+    with pytest.raises(ValueError):
+        gerar_hash('segredo', esquema='md5')
+
+
+def test_precisa_rehash():
+    assert precisa_rehash(hashlib.sha256(b'x').hexdigest())
+    assert precisa_rehash(gerar_hash('x', iteracoes=1000), iteracoes=2000)
+    assert not precisa_rehash(gerar_hash('x', iteracoes=1000), iteracoes=1000)
+    assert precisa_rehash(gerar_hash('x', iteracoes=1000), esquema='scrypt')
+
+
+def test_servico_recusa_quando_a_fila_esta_cheia():
+    servico = ServicoSenhas(max_workers=1, max_pendentes=1, espera=0.01, **RAPIDO)
+    liberar = threading.Event()
+    ocupado = threading.Thread(target=servico._executar, args=(liberar.wait,))
+    ocupado.start()
+    try:
+        with pytest.raises(FilaDeHashCheia):
+            servico.gerar('segredo')
+    finally:
+        liberar.set()
+        ocupado.join()
+    assert servico.verificar('segredo', servico.gerar('segredo'))
+    assert servico.stats()['rejeitados'] == 1
+    servico.encerrar()
+
+
+def test_admin_recebe_hash_no_esquema_configurado(banco):
+    parametros = {'esquema': 'scrypt', 'n': 2 ** 10}
+    banco.init_database(parametros_senha=parametros)
+    conn = banco.get_connection()
+    armazenado = conn.execute("SELECT senha FROM usuarios WHERE nome = 'admin'").fetchone()[0]
+    conn.close()
+    assert armazenado.startswith('scrypt$1024$')
+    assert verificar_senha('0000', armazenado)
+    assert not precisa_rehash(armazenado, **parametros)
+
+
+def test_login_com_nome_desconhecido_tambem_verifica_hash(cliente, aplicacao, monkeypatch):
+    verificados = []
+    monkeypatch.setattr(aplicacao.servico_senhas, 'verificar',
+                        lambda senha, armazenado: verificados.append(armazenado) or True)
+    resposta = cliente.post('/login', data={'nome': 'ninguem', 'senha': 'qualquer', 'cep_login': '01001000'})
+    assert resposta.status_code == 302
+    assert verificados == [aplicacao.SENHA_FICTICIA]
+    with cliente.session_transaction() as sessao:
+        assert 'user_id' not in sessao
@@ -0,0 +1,87 @@
+from sugestoes import IndicePrefixos, PROFUNDIDADE_MAXIMA
+
+
+def _indice():
+    indice = IndicePrefixos(limite=8)
+    indice.reconstruir([
+        {'id': 1, 'nome': 'Cristo Redentor', 'categoria': 'Monumento', 'cidade': 'Rio de Janeiro', 'endereco': 'Alto da Boa Vista'},
+        {'id': 2, 'nome': 'Pão de Açúcar', 'categoria': 'Mirante', 'cidade': 'Rio de Janeiro', 'endereco': 'Urca'},
+        {'id': 3, 'nome': 'Praia de Copacabana', 'categoria': 'Praia', 'cidade': 'Rio de Janeiro', 'endereco': 'Copacabana'},
+    ])
+    return indice
+
+
+def test_busca_por_prefixo_ignora_acentos_e_caixa():
+    assert [s['nome'] for s in _indice().buscar('PAO')] == ['Pão de Açúcar']
+
+
+def test_prefixo_de_palavra_interna():
+    assert [s['nome'] for s in _indice().buscar('redent')] == ['Cristo Redentor']
+
+
+def test_nome_tem_prioridade_sobre_outros_campos():
+    nomes = [s['nome'] for s in _indice().buscar('p')]
+    assert nomes == ['Pão de Açúcar', 'Praia de Copacabana']
+
+
+def test_remover_e_reindexar():
+    indice = _indice()
+    indice.remover(1)
+    assert indice.buscar('cristo') == []
+    indice.adicionar({'id': 2, 'nome': 'Bondinho', 'categoria': 'Mirante', 'cidade': 'Rio de Janeiro', 'endereco': 'Urca'})
+    assert indice.buscar('pao') == []
+    assert [s['nome'] for s in indice.buscar('bond')] == ['Bondinho']
+    assert len(indice) == 2
+
+
+def test_consulta_mais_longa_que_a_trie():
+    indice = IndicePrefixos()
+    nome = 'a' * PROFUNDIDADE_MAXIMA + 'bcdef'
+    indice.adicionar({'id': 1, 'nome': nome, 'categoria': '', 'cidade': '', 'endereco': ''})
+    indice.adicionar({'id': 2, 'nome': 'a' * PROFUNDIDADE_MAXIMA + 'xyz', 'categoria': '', 'cidade': '', 'endereco': ''})
+    assert [s['nome'] for s in indice.buscar(nome)] == [nome]
+
+
+def test_limite_de_sugestoes():
+    indice = IndicePrefixos(limite=2)
+    indice.reconstruir([{'id': i, 'nome': f'Museu {i}', 'categoria': '', 'cidade': '', 'endereco': ''} for i in range(5)])
+    assert len(indice.buscar('museu')) == 2
+    assert len(indice.buscar('museu', limite=4)) == 4
+
+
+def _dados_ponto(**campos):
+    dados = {'nome': 'Ponto Fantasma', 'descricao': 'd', 'endereco': 'Rua A, Niterói - RJ',
+             'latitude': '-22.9', 'longitude': '-43.1', 'categoria': 'Praia/Recreação'}
+    dados.update(campos)
+    return dados
+
+
+def test_editar_ponto_inexistente_nao_entra_no_indice(admin, aplicacao):
+    resposta = admin.post('/admin/editar_ponto/9999', data=_dados_ponto())
+    assert resposta.status_code == 302 and resposta.location.endswith('/dashboard')
+    with admin.session_transaction() as sessao:
+        assert sessao['_flashes'] == [('message', 'Ponto turístico não encontrado!')]
+    assert aplicacao.indice_sugestoes.buscar('fantasma') == []
+
+
+def test_editar_ponto_removido_durante_a_edicao(admin, aplicacao, banco, monkeypatch):
+    parse_original = aplicacao.parse_estado_cidade
+
+    def remover_antes_de_gravar(endereco):
+        # Outra requisição apaga o ponto entre a leitura e o UPDATE
+        with banco.write_transaction() as conn:
+            conn.execute('DELETE FROM pontos_turisticos WHERE id = 5')
+        return parse_original(endereco)
+
+    monkeypatch.setattr(aplicacao, 'parse_estado_cidade', remover_antes_de_gravar)
+    resposta = admin.post('/admin/editar_ponto/5', data=_dados_ponto())
+    assert resposta.location.endswith('/dashboard')
+    with admin.session_transaction() as sessao:
+        assert sessao['_flashes'] == [('message', 'Ponto turístico não encontrado!')]
+    assert aplicacao.indice_sugestoes.buscar('fantasma') == []
+
+
+def test_editar_ponto_atualiza_o_indice(admin, aplicacao):
+    resposta = admin.post('/admin/editar_ponto/5', data=_dados_ponto())
+    assert resposta.location.endswith('/dashboard')
+    assert [s['nome'] for s in aplicacao.indice_sugestoes.buscar('fantasma')] == ['Ponto Fantasma']
@@ -0,0 +1,58 @@
+import pytest
+from flask import session
+
+
+@pytest.fixture
+def usuario(cliente, banco):
+    with banco.write_transaction() as conn:
+        return conn.execute("INSERT INTO usuarios (nome, email, senha) VALUES ('Ana', 'ana@teste', 'x')").lastrowid
+
+
+def _renomear(banco, usuario_id, nome):
+    # Alteração feita por outro processo: o cache deste não fica sabendo
+    with banco.write_transaction() as conn:
+        conn.execute('UPDATE usuarios SET nome = ? WHERE id = ?', (nome, usuario_id))
+
+
+def _nome_atual(aplicacao, usuario_id, versao):
+    with aplicacao.app.test_request_context():
+        session['user_id'] = usuario_id
+        session['usuario_versao'] = versao
+        return aplicacao.get_current_user()['nome']
+
+
+def test_consulta_uma_vez_por_requisicao(aplicacao, usuario):
+    with aplicacao.app.test_request_context():
+        session['user_id'] = usuario
+        primeiro = aplicacao.get_current_user()
+        assert aplicacao.get_current_user() is primeiro
+        assert 'senha' not in primeiro
+    assert aplicacao.cache_usuarios.stats()['misses'] == 1
+    assert aplicacao.cache_usuarios.stats()['hits'] == 0
+
+
+def test_nova_versao_na_sessao_ignora_a_copia_em_cache(aplicacao, banco, usuario):
+    assert _nome_atual(aplicacao, usuario, versao=1) == 'Ana'
+    _renomear(banco, usuario, 'Ana Maria')
+    # Mesma versão: a cópia em cache ainda vale até o TTL
+    assert _nome_atual(aplicacao, usuario, versao=1) == 'Ana'
+    # Login ou perfil atualizado em outro processo gravou outra versão na sessão
+    assert _nome_atual(aplicacao, usuario, versao=2) == 'Ana Maria'
+
+
+def test_alteracao_neste_processo_invalida_o_cache(aplicacao, banco, usuario):
+    assert _nome_atual(aplicacao, usuario, versao=1) == 'Ana'
+    _renomear(banco, usuario, 'Ana Clara')
+    with aplicacao.app.test_request_context():
+        session['user_id'] = usuario
+        session['usuario_versao'] = 1
+        assert aplicacao.get_current_user()['nome'] == 'Ana'
+        aplicacao.marcar_usuario_alterado(usuario)
+        assert session['usuario_versao'] != 1
+        # O memo da requisição também é descartado
+        assert aplicacao.get_current_user()['nome'] == 'Ana Clara'
+
+
+def test_sem_sessao(aplicacao, cliente):
+    with aplicacao.app.test_request_context():
+        assert aplicacao.get_current_user() is None
@@ -0,0 +1,45 @@
+import contextlib
+
+import visitas
+from visitas import BufferVisitas
+
+
+@contextlib.contextmanager
+def _banco_fora_do_ar():
+    raise RuntimeError("banco indisponível")
+    yield
+
+
+def test_grava_em_lote(banco):
+    buffer = BufferVisitas(tamanho_lote=1000, intervalo=60, max_pendentes=10000)
+    for usuario in range(1, 11):
+        buffer.registrar(usuario, 1, 1)
+    assert buffer.stats()['queue_depth'] == 10
+    assert buffer.descarregar() == 10
+    buffer.encerrar()
+    conn = banco.get_connection()
+    assert conn.execute('SELECT COUNT(*) FROM visitas_pontos WHERE ponto_turistico_id = 1').fetchone()[0] >= 10
+    conn.close()
+
+
+def test_fila_limitada_e_sem_gravacoes_repetidas_com_banco_fora(banco, monkeypatch):
+    buffer = BufferVisitas(tamanho_lote=1000, intervalo=60, max_pendentes=5)
+    monkeypatch.setattr(visitas, 'write_transaction', _banco_fora_do_ar)
+    for usuario in range(1, 21):
+        buffer.registrar(usuario, 1, 1)
+    stats = buffer.stats()
+    assert stats['queue_depth'] == 5
+    assert stats['dropped'] == 15
+    # Uma tentativa na hora; as seguintes esperam o intervalo em vez de martelar o banco
+    assert stats['inline_flushes'] == 1
+    assert stats['flush_errors'] == 1
+
+    monkeypatch.undo()
+    assert buffer.descarregar() == 5
+    buffer.encerrar()
+    conn = banco.get_connection()
+    usuarios = [row[0] for row in conn.execute(
+        'SELECT usuario_id FROM visitas_pontos WHERE ponto_turistico_id = 1 ORDER BY id DESC LIMIT 5')]
+    conn.close()
+    # As mais antigas foram descartadas: ficam as 5 últimas
+    assert sorted(usuarios) == [16, 17, 18, 19, 20]
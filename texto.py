@@ -0,0 +1,21 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# Bloco "Combining Diacritical Marks": todos da categoria Mn
+_DIACRITICOS = re.compile('[\u0300-\u036f]+')
+
+
+@lru_cache(maxsize=4096)
+def normalize_text(value):
+    """Remove acentos e converte para minúsculas (memoizado: os mesmos textos se repetem muito)"""
+    if not value:
+        return ''
+    if value.isascii():
+        return value.lower()
+    normalized = unicodedata.normalize('NFD', value)
+    # Caminho rápido para texto latino: sobrando só ASCII, não há outras marcas a remover
+    sem_diacriticos = _DIACRITICOS.sub('', normalized)
+    if sem_diacriticos.isascii():
+        return sem_diacriticos.lower()
+    return ''.join(ch for ch in normalized if unicodedata.category(ch) != 'Mn').lower()
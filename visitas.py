@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from database import write_transaction
+
+logger = logging.getLogger(__name__)
+
+INSERT_VISITAS = '''
+    INSERT INTO visitas_pontos (usuario_id, ponto_turistico_id, origem_sudeste, data_visita)
+    VALUES (?, ?, ?, ?)
+'''
+
+
+def agora_utc():
+    """Data/hora UTC no mesmo formato de CURRENT_TIMESTAMP do SQLite"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class BufferVisitas:
+    """Acumula as visitas em memória e grava em lote (executemany) numa única transação.
+
+    O lote é gravado quando atinge tamanho_lote eventos ou quando passam intervalo
+    segundos desde a primeira visita pendente. Se max_pendentes for atingido, quem registra
+    a visita grava o lote na hora, a menos que uma gravação já esteja em andamento ou a
+    última tenha falhado há menos de intervalo segundos. A fila nunca passa de max_pendentes:
+    com o banco fora do ar, as visitas mais antigas são descartadas (e contadas).
+    """
+
+    def __init__(self, tamanho_lote=200, intervalo=2.0, max_pendentes=10000):
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.max_pendentes = max_pendentes
+        self._pendentes = []
+        self._primeiro_em = None
+        self._cond = threading.Condition()
+        self._gravacao = threading.Lock()
+        self._falhou_em = None
+        self._encerrado = False
+        self._contadores = {
+            'enqueued': 0,
+            'flushed': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'inline_flushes': 0,
+            'dropped': 0
+        }
+        self._latencia_total = 0.0
+        self._latencia_maxima = 0.0
+        self._latencia_ultima = 0.0
+        self._thread = threading.Thread(target=self._loop, name='visitas-flush', daemon=True)
+        self._thread.start()
+
+    def registrar(self, usuario_id, ponto_id, origem_sudeste):
+        """Enfileira uma visita; não toca no disco no caminho normal"""
+        evento = (usuario_id, ponto_id, origem_sudeste, agora_utc())
+        with self._cond:
+            encerrado = self._encerrado
+            if not encerrado:
+                self._pendentes.append(evento)
+                self._contadores['enqueued'] += 1
+                if self._primeiro_em is None:
+                    # Primeira visita do lote: a thread passa a contar o intervalo
+                    self._primeiro_em = time.monotonic()
+                    self._cond.notify()
+                elif len(self._pendentes) >= self.tamanho_lote:
+                    self._cond.notify()
+                self._limitar()
+            gravar_agora = (len(self._pendentes) >= self.max_pendentes and not self._gravacao.locked()
+                            and not self._aguardando_nova_tentativa())
+            if gravar_agora:
+                self._contadores['inline_flushes'] += 1
+        if encerrado:
+            # Depois do encerramento não há thread de gravação: grava direto
+            self._gravar([evento])
+        elif gravar_agora:
+            self.descarregar(esperar=False)
+
+    def _limitar(self):
+        """Descarta as visitas mais antigas acima de max_pendentes (chamar com _cond adquirido)"""
+        excedente = len(self._pendentes) - self.max_pendentes
+        if excedente > 0:
+            del self._pendentes[:excedente]
+            self._contadores['dropped'] += excedente
+
+    def _aguardando_nova_tentativa(self):
+        return self._falhou_em is not None and time.monotonic() - self._falhou_em < self.intervalo
+
+    def descarregar(self, esperar=True):
+        """Grava imediatamente tudo o que estiver pendente; retorna o número de visitas gravadas.
+
+        Com esperar=False desiste (retorna 0) se outra gravação já estiver em andamento.
+        """
+        if not self._gravacao.acquire(blocking=esperar):
+            return 0
+        try:
+            with self._cond:
+                lote, self._pendentes = self._pendentes, []
+                self._primeiro_em = None
+            if not lote:
+                return 0
+            if not self._gravar(lote):
+                # Devolve o lote à frente da fila para a próxima tentativa
+                with self._cond:
+                    self._pendentes[:0] = lote
+                    self._limitar()
+                    self._falhou_em = time.monotonic()
+                    if self._primeiro_em is None:
+                        self._primeiro_em = time.monotonic()
+                return 0
+            with self._cond:
+                self._falhou_em = None
+            return len(lote)
+        finally:
+            self._gravacao.release()
+
+    def _gravar(self, lote):
+        inicio = time.perf_counter()
+        try:
+            with write_transaction() as conn:
+                conn.executemany(INSERT_VISITAS, lote)
+        except Exception:
+            logger.exception("Falha ao gravar %d visitas", len(lote))
+            with self._cond:
+                self._contadores['flush_errors'] += 1
+            return False
+        duracao = time.perf_counter() - inicio
+        with self._cond:
+            self._contadores['flushed'] += len(lote)
+            self._contadores['flushes'] += 1
+            self._latencia_total += duracao
+            self._latencia_ultima = duracao
+            self._latencia_maxima = max(self._latencia_maxima, duracao)
+        return True
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._encerrado:
+                    if len(self._pendentes) >= self.tamanho_lote:
+                        break
+                    if self._primeiro_em is None:
+                        self._cond.wait()
+                        continue
+                    restante = self._primeiro_em + self.intervalo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+                if self._encerrado:
+                    return
+            if self.descarregar() == 0 and self._pendentes:
+                # O banco recusou o lote; espera um intervalo antes de tentar de novo
+                time.sleep(self.intervalo)
+
+    def encerrar(self, timeout=5):
+        """Para a thread de gravação e grava o que restou na fila"""
+        with self._cond:
+            self._encerrado = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.descarregar()
+
+    def stats(self):
+        with self._cond:
+            contadores = dict(self._contadores)
+            contadores['queue_depth'] = len(self._pendentes)
+            flushes = contadores['flushes']
+            contadores['flush_ms_last'] = round(self._latencia_ultima * 1000, 3)
+            contadores['flush_ms_avg'] = round(self._latencia_total / flushes * 1000, 3) if flushes else 0.0
+            contadores['flush_ms_max'] = round(self._latencia_maxima * 1000, 3)
+            return contadores